@@ -2,12 +2,169 @@ from __future__ import annotations
 
 import asyncio
 from argparse import ArgumentParser, Namespace
+from typing import Any, Coroutine, Dict, Hashable, List, Optional
 
 from pybotters import WebSocketQueue
 
-from src.libs.aws.kinesis import Kinesis
-from src.libs.exchange import load_exchange
-from src.libs.utils import Candle, HealthCheck, LogManager, trace
+from src.libs.aws import Kinesis, LocalKinesisClient, RecordCodec
+from src.libs.aws.record_codec import RECORD_COMPRESSIONS, RECORD_FORMATS
+from src.libs.exchange import Exchange, load_exchanges
+from src.libs.replay import FrameRecorder
+from src.libs.replay.capture import DEFAULT_MAX_BYTES as CAPTURE_MAX_BYTES
+from src.libs.replay.capture import DEFAULT_MAX_SECONDS as CAPTURE_MAX_SECONDS
+from src.libs.sink import JsonLinesSink, Sink
+from src.libs.utils import (
+    BookFeatures,
+    BoundedQueue,
+    Candle,
+    HealthCheck,
+    Instrument,
+    LogManager,
+    OrderBook,
+    load_instruments,
+    trace,
+)
+from src.libs.utils.bounded_queue import QUEUE_POLICIES
+from src.libs.utils.health_check import DEFAULT_MAX_AGES
+from src.libs.utils.json_decoder import JSON_DECODERS
+from src.libs.utils.metrics import instrument_labels
+from src.libs.utils.spool import DEFAULT_MAX_BYTES, Spool
+
+
+def candle_key(record: Dict[str, Any]) -> Hashable:
+    """
+    出力キューの coalesce で同一視するキー（同じ足の再送や特徴量は最新のものだけを残す）
+
+    Args:
+        record (Dict[str, Any]): ローソク足または板の特徴量
+
+    Returns:
+        Hashable: レコードの種類と足の開始時刻
+    """
+    return record.get("type"), record["timestamp"]
+
+
+def build_pipeline(
+    instrument: Instrument,
+    args: Namespace,
+    sink: Sink,
+    trade_queue: WebSocketQueue,
+    orderbook: Optional[OrderBook] = None,
+) -> List[Coroutine]:
+    """
+    銘柄ごとの Candle → Sink パイプラインを構築する
+
+    板情報がある場合は、板の特徴量もローソク足と同じキューに出力する。
+
+    Args:
+        instrument (Instrument): 銘柄
+        args (Namespace): コマンドライン引数
+        sink (Sink): 共有する出力先
+        trade_queue (WebSocketQueue): 銘柄の約定データが流れるキュー
+        orderbook (Optional[OrderBook], optional): 銘柄の板情報
+
+    Returns:
+        List[Coroutine]: パイプラインを構成するタスク
+    """
+    candlestick_queue = BoundedQueue(
+        args.candle_queue_size,
+        args.candle_queue_policy,
+        candle_key if args.candle_queue_policy == "coalesce" else None,
+    )
+    candle = Candle(
+        trade_queue,
+        candlestick_queue,
+        args.frequency,
+        allowed_lateness=args.allowed_lateness,
+        emit_empty=args.emit_empty,
+        late_policy=args.late_policy,
+        amend_delay=args.amend_delay,
+        tags=instrument.tags,
+        latency_fields=args.latency_fields,
+    )
+    labels = instrument_labels(instrument.tags)
+    candlestick_queue.expose_metrics(*labels, "candle")
+    if isinstance(trade_queue, BoundedQueue):
+        trade_queue.expose_metrics(*labels, "trade")
+
+    tasks = [
+        candle.generate(),
+        sink.consume(candlestick_queue, instrument.tags),
+    ]
+    if orderbook is not None:
+        features = BookFeatures(
+            orderbook, candlestick_queue, args.frequency, depth=args.book_depth
+        )
+        tasks.append(features.generate())
+    return tasks
+
+
+def build_sink(args: Namespace, stream_name: str) -> Sink:
+    """
+    --sink に対応する出力先を作成する
+
+    ``kinesis`` は AWS の Kinesis、``local_kinesis`` はプロセス内の LocalKinesisClient に
+    同じバッチ・再送・スプールの処理で送信する。Kinesis のレコードの形式は
+    --record_format と --record_compression で選ぶ。``jsonl`` は --output に書き込む。
+
+    Args:
+        args (Namespace): コマンドライン引数
+        stream_name (str): Kinesisストリームの名前
+
+    Returns:
+        Sink: 出力先
+    """
+    if args.sink == "jsonl":
+        return JsonLinesSink(args.output)
+
+    spool = (
+        Spool(args.spool_dir, max_bytes=args.spool_max_bytes)
+        if args.spool_dir
+        else None
+    )
+    client = (
+        LocalKinesisClient(
+            shards=args.local_shards,
+            latency=args.local_latency,
+            jitter=args.local_jitter,
+        )
+        if args.sink == "local_kinesis"
+        else None
+    )
+    return Kinesis(
+        linger=args.linger,
+        max_in_flight=args.max_in_flight,
+        spool=spool,
+        replay_rate=args.replay_rate,
+        client=client,
+        stream_name=stream_name,
+        rate_limit=not args.no_rate_limit,
+        codec=RecordCodec(args.record_format, args.record_compression),
+    )
+
+
+def build_orderbooks(
+    instruments: List[Instrument], exchanges: List[Exchange]
+) -> Dict[str, OrderBook]:
+    """
+    設定の銘柄ごとに、その銘柄を購読する取引所クラスの板情報を返す
+
+    Args:
+        instruments (List[Instrument]): 設定の銘柄
+        exchanges (List[Exchange]): 接続先ごとの取引所クラス
+
+    Returns:
+        Dict[str, OrderBook]: 銘柄名をキーとする板情報（板を購読していない銘柄は含まない）
+    """
+    orderbooks: Dict[str, OrderBook] = {}
+    for instrument in instruments:
+        for exchange in exchanges:
+            book = exchange.orderbooks.get(instrument.symbol.upper())
+            names = [subscribed.name for subscribed in exchange.instruments]
+            if book is not None and instrument.name in names:
+                orderbooks[instrument.name] = book
+                break
+    return orderbooks
 
 
 @trace
@@ -19,45 +176,158 @@ async def main(args: Namespace) -> None:
         args: コマンドライン引数
     """
     stream_name = "cryptra-collector"
-    tags = {
-        "exchange": args.exchange.lower(),
-        "contract": args.contract.lower(),
-        "symbol": args.symbol.lower(),
-    }
+    if args.config:
+        instruments = load_instruments(args.config)
+    else:
+        instruments = [Instrument(args.exchange, args.contract, args.symbol)]
 
-    trade_queue = WebSocketQueue()
-    candlestick_queue = WebSocketQueue()
+    sink = build_sink(args, stream_name)
+    health_check = HealthCheck(
+        {
+            "frame": args.max_frame_age,
+            "trade": args.max_trade_age,
+            "candle": args.max_candle_age,
+            "publish": args.max_publish_age,
+        }
+    )
+    trade_queues: Dict[str, WebSocketQueue] = {
+        instrument.name: BoundedQueue(args.trade_queue_size, args.trade_queue_policy)
+        for instrument in instruments
+    }
 
-    exchange = load_exchange(args, trade_queue)
-    candle = Candle(trade_queue, candlestick_queue, args.frequency)
-    kinesis = Kinesis(candlestick_queue)
-    health_check = HealthCheck()
+    # 同じ接続先の銘柄は1つのWebSocket接続にまとめる
+    exchanges = load_exchanges(
+        instruments, trade_queues, args.json_decoder, args.orderbook
+    )
+    recorder = (
+        FrameRecorder(
+            args.capture_dir,
+            max_bytes=args.capture_max_bytes,
+            max_seconds=args.capture_seconds,
+        )
+        if args.capture_dir
+        else None
+    )
+    for exchange in exchanges:
+        exchange.recorder = recorder
+        exchange.ws_base_url = args.ws_base_url
+    orderbooks = build_orderbooks(instruments, exchanges)
 
-    tasks = [
-        exchange.subscribe(),
-        candle.generate(),
-        kinesis.publish(stream_name, tags),
-        health_check.start(),
-    ]
+    tasks = [health_check.start()]
+    for instrument in instruments:
+        HealthCheck.instrument(instrument.name)
+        tasks.extend(
+            build_pipeline(
+                instrument,
+                args,
+                sink,
+                trade_queues[instrument.name],
+                orderbooks.get(instrument.name),
+            )
+        )
+    for exchange in exchanges:
+        tasks.append(exchange.subscribe())
 
-    await asyncio.gather(*(asyncio.create_task(task) for task in tasks))
+    try:
+        await asyncio.gather(*(asyncio.create_task(task) for task in tasks))
+    finally:
+        if recorder is not None:
+            recorder.close()
+        await sink.close()
 
 
 if __name__ == "__main__":
     try:
         parser = ArgumentParser()
-        parser.add_argument("exchange", type=str)
-        parser.add_argument("contract", type=str)
-        parser.add_argument("symbol", type=str)
+        parser.add_argument("exchange", type=str, nargs="?")
+        parser.add_argument("contract", type=str, nargs="?")
+        parser.add_argument("symbol", type=str, nargs="?")
+        parser.add_argument("--config", type=str, default=None)
         parser.add_argument("--frequency", type=int, default=1)
+        parser.add_argument("--allowed_lateness", type=float, default=None)
+        parser.add_argument("--emit_empty", action="store_true")
+        parser.add_argument(
+            "--late_policy", type=str, default="drop", choices=["drop", "amend"]
+        )
+        parser.add_argument("--amend_delay", type=float, default=0.0)
+        parser.add_argument(
+            "--json_decoder", type=str, default="auto", choices=JSON_DECODERS
+        )
+        parser.add_argument("--latency_fields", action="store_true")
+        parser.add_argument("--orderbook", action="store_true")
+        parser.add_argument("--book_depth", type=int, default=5)
+        parser.add_argument("--trade_queue_size", type=int, default=10000)
+        parser.add_argument(
+            "--trade_queue_policy",
+            type=str,
+            default="drop_oldest",
+            choices=[p for p in QUEUE_POLICIES if p != "coalesce"],
+        )
+        parser.add_argument("--candle_queue_size", type=int, default=1000)
+        parser.add_argument(
+            "--candle_queue_policy", type=str, default="block", choices=QUEUE_POLICIES
+        )
+        parser.add_argument(
+            "--max_frame_age", type=float, default=DEFAULT_MAX_AGES["frame"]
+        )
+        parser.add_argument(
+            "--max_trade_age", type=float, default=DEFAULT_MAX_AGES["trade"]
+        )
+        parser.add_argument(
+            "--max_candle_age", type=float, default=DEFAULT_MAX_AGES["candle"]
+        )
+        parser.add_argument(
+            "--max_publish_age", type=float, default=DEFAULT_MAX_AGES["publish"]
+        )
+        parser.add_argument("--capture_dir", type=str, default=None)
+        parser.add_argument("--capture_max_bytes", type=int, default=CAPTURE_MAX_BYTES)
+        parser.add_argument(
+            "--capture_seconds", type=float, default=CAPTURE_MAX_SECONDS
+        )
+        parser.add_argument(
+            "--ws_base_url", type=str, default=None, help="e.g. ws://localhost:8765"
+        )
+        parser.add_argument(
+            "--sink",
+            type=str,
+            default="kinesis",
+            choices=["kinesis", "local_kinesis", "jsonl"],
+        )
+        parser.add_argument("--output", type=str, default="-", help="for --sink jsonl")
+        parser.add_argument("--local_shards", type=int, default=1)
+        parser.add_argument("--local_latency", type=float, default=0.02)
+        parser.add_argument("--local_jitter", type=float, default=0.0)
+        parser.add_argument("--linger", type=float, default=1.0)
+        parser.add_argument("--max_in_flight", type=int, default=4)
+        parser.add_argument("--no_rate_limit", action="store_true")
+        parser.add_argument(
+            "--record_format", type=str, default="json", choices=RECORD_FORMATS
+        )
+        parser.add_argument(
+            "--record_compression",
+            type=str,
+            default="none",
+            choices=RECORD_COMPRESSIONS,
+        )
+        parser.add_argument("--spool_dir", type=str, default=None)
+        parser.add_argument("--spool_max_bytes", type=int, default=DEFAULT_MAX_BYTES)
+        parser.add_argument("--replay_rate", type=float, default=500.0)
         parser.add_argument(
             "--log_level",
             type=str,
             default="INFO",
             choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
         )
+        parser.add_argument("--trace_sample_rate", type=int, default=1)
+        parser.add_argument("--trace_methods", type=str, default="")
         args: Namespace = parser.parse_args()
-        log_manager = LogManager(args.log_level.upper())
+        if not args.config and not (args.exchange and args.contract and args.symbol):
+            parser.error("exchange, contract and symbol are required without --config")
+        log_manager = LogManager(
+            args.log_level.upper(),
+            trace_sample_rate=args.trace_sample_rate,
+            trace_methods=[m for m in args.trace_methods.split(",") if m],
+        )
         logger = log_manager.get_logger(__name__)
 
         logger.info(f"Starting with args: {args}")
@@ -1,5 +1,13 @@
 from typing import Tuple
 
 from .kinesis import Kinesis
+from .local_kinesis import LocalKinesisClient
+from .rate_limiter import ShardRateLimiter
+from .record_codec import RecordCodec
 
-__all__: Tuple[str, ...] = ("Kinesis",)
+__all__: Tuple[str, ...] = (
+    "Kinesis",
+    "LocalKinesisClient",
+    "RecordCodec",
+    "ShardRateLimiter",
+)
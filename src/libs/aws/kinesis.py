@@ -1,64 +1,838 @@
 from __future__ import annotations
 
-from json import dumps
+import asyncio
+import struct
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from os import getenv
-from typing import Dict, List
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from zlib import crc32
 
 import boto3
 from pybotters import WebSocketQueue
 
-from src.libs.utils.health_check import HealthCheck
+from src.libs.aws.rate_limiter import ShardRateLimiter
+from src.libs.aws.record_codec import RecordCodec, RecordEncoder, decode_record
+from src.libs.sink import Sink
+from src.libs.utils.candle import CandleRecord
+from src.libs.utils.health_check import HealthCheck, InstrumentHealth
 from src.libs.utils.logger import LogManager, add_logging
+from src.libs.utils.metrics import (
+    INSTRUMENT_LABELS,
+    PIPELINE_LATENCY,
+    STAGE_PUBLISH,
+    STAGE_TOTAL,
+    Counter,
+    Gauge,
+    Histogram,
+    instrument_labels,
+)
+from src.libs.utils.spool import Spool
+
+# PutRecords API の制限値
+MAX_BATCH_RECORDS = 500
+MAX_BATCH_BYTES = 5 * 1024 * 1024
+MAX_RECORD_BYTES = 1024 * 1024
+
+# スプールに保存するレコードのヘッダ（ストリーム名、パーティションキー、送信元銘柄の長さ）
+SPOOL_HEADER = struct.Struct("<HHH")
+REPLAY_BACKOFF_MIN = 0.1
+REPLAY_BACKOFF_MAX = 30.0
+
+# 遅延の計測に使うレコードの時刻（確定時刻、最後の約定時刻。UNIX秒）
+Stamp = Optional[Tuple[float, Optional[float]]]
+
+RECORDS = Counter(
+    "collector_kinesis_records_total", "Records queued for Kinesis", INSTRUMENT_LABELS
+)
+PUBLISHED_RECORDS = Counter(
+    "collector_kinesis_published_records_total",
+    "Records acknowledged by Kinesis",
+    INSTRUMENT_LABELS,
+)
+PUT_SECONDS = Histogram(
+    "collector_kinesis_put_seconds", "PutRecords call latency", ("stream",)
+)
+PUT_ERRORS = Counter(
+    "collector_kinesis_put_errors_total", "PutRecords calls that raised", ("stream",)
+)
+FAILED_RECORDS = Counter(
+    "collector_kinesis_failed_records_total",
+    "Records rejected in PutRecords responses",
+    ("stream",),
+)
+SPOOLED_RECORDS = Counter(
+    "collector_kinesis_spooled_records_total",
+    "Records written to the spool",
+    ("stream",),
+)
+IN_FLIGHT = Gauge("collector_kinesis_in_flight", "PutRecords requests in flight")
+SPOOL_RECORDS = Gauge("collector_spool_records", "Records waiting in the spool")
+
+# close していないインスタンス。ゲージは関数を1回だけ登録し、インスタンスの合計を公開する
+_INSTANCES: weakref.WeakSet[Kinesis] = weakref.WeakSet()
+IN_FLIGHT.labels().set_function(
+    lambda: sum(kinesis.in_flight for kinesis in _INSTANCES)
+)
+SPOOL_RECORDS.labels().set_function(
+    lambda: sum(
+        kinesis._spool.records for kinesis in _INSTANCES if kinesis._spool is not None
+    )
+)
+
+
+def _encode_spooled(stream_name: str, entry: Dict[str, Any], owner: str) -> bytes:
+    stream = stream_name.encode("utf-8")
+    key = entry["PartitionKey"].encode("utf-8")
+    owner_bytes = owner.encode("utf-8")
+    header = SPOOL_HEADER.pack(len(stream), len(key), len(owner_bytes))
+    return b"".join((header, stream, key, owner_bytes, entry["Data"]))
+
+
+def _decode_spooled(payload: bytes) -> Tuple[str, Dict[str, Any], str]:
+    stream_len, key_len, owner_len = SPOOL_HEADER.unpack_from(payload)
+    offset = SPOOL_HEADER.size
+    stream_name = payload[offset : offset + stream_len].decode("utf-8")
+    offset += stream_len
+    key = payload[offset : offset + key_len].decode("utf-8")
+    offset += key_len
+    owner = payload[offset : offset + owner_len].decode("utf-8")
+    offset += owner_len
+    return stream_name, {"Data": payload[offset:], "PartitionKey": key}, owner
+
+
+class _Lane:
+    """
+    送信順序を保証する単位。同じパーティションキーのレコードは常に同じレーンに入る。
+
+    バッファには1つのストリームのレコードだけを入れる。
+
+    Attributes:
+        stream_name (Optional[str]): 送信待ちのレコードの送信先のストリームの名前
+        buffer (List[Dict[str, Any]]): 送信待ちのレコード
+        owners (List[str]): 送信待ちレコードの送信元銘柄
+        stamps (List[Stamp]): 送信待ちレコードの遅延の計測用の時刻
+        buffer_bytes (int): 送信待ちレコードの合計サイズ
+        buffer_since (Optional[float]): バッファに最初のレコードが入った時刻
+        lock (asyncio.Lock): 送信を直列化するロック
+        pending (Deque[asyncio.Task]): 送信中または送信待ちのバッチ
+    """
+
+    def __init__(self) -> None:
+        self.stream_name: Optional[str] = None
+        self.buffer: List[Dict[str, Any]] = []
+        self.owners: List[str] = []
+        self.stamps: List[Stamp] = []
+        self.buffer_bytes = 0
+        self.buffer_since: Optional[float] = None
+        self.lock = asyncio.Lock()
+        self.pending: Deque[asyncio.Task] = deque()
 
 
 @add_logging
-class Kinesis:
+class Kinesis(Sink):
     """
     Kinesisクラスは、AWS Kinesisストリームとのインターフェースを提供する。
 
+    Sink として使う場合は、コンストラクタで指定した stream_name に書き込む。
+    レコードは codec（既定は JSON）でバイト列に変換し、タグは銘柄ごとに1度だけ
+    エンコードしたものを付ける。subscribe は decode_record で元の辞書に戻す。
+    client を指定すると boto3 のクライアントの代わりに使う（LocalKinesisClient など）。
+
+    パーティションキーはタグの値を ``-`` で連結した銘柄名で、銘柄ごとに同じシャードに
+    書き込まれ、シャードが増えれば銘柄単位で負荷が分散する。
+    レコードはパーティションキーごとのレーンに蓄積され、件数・サイズ・滞留時間の
+    いずれかが上限に達した時点で PutRecords によりまとめて送信される。
+    boto3 の呼び出しはスレッドプールで実行し、イベントループをブロックしない。
+    同一レーンの送信は直列化されるため、パーティションキー単位の順序は保たれる。
+    1つのインスタンスを複数銘柄の publish で共有できる。
+
+    rate_limit が有効な場合は、ListShards で調べたシャードごとに ShardRateLimiter で
+    送信レートを制限する。ProvisionedThroughputExceededException で拒否された
+    レコードは、そのシャードの上限を下げたうえで max_retries に数えずに
+    max_throttled_retries 回まで再送する。
+
+    spool を指定すると、再送しても送信できなかったレコードをディスクに保存し、
+    送信先の復旧後に保存した順で replay_rate 件/秒を上限に再送する。
+    スプールが空になるまでは、新しいレコードも順序を保つためにスプールに追記する。
+
+    PutRecords の所要時間と失敗、銘柄ごとの送信レコード数はメトリクスに記録する。
+    CandleRecord は送信できた時点で、確定からの経過と最後の約定時刻からの経過を
+    遅延として記録する（スプールから再送したレコードは対象外）。
+
     Attributes:
+        stream_name (Optional[str]): Sink として書き込むストリームの名前
         _queue_in (WebSocketQueue): 入力データのキュー
         _client (boto3.client): Kinesisクライアント
         _logger (logging.Logger): ロガー
+        _executor (ThreadPoolExecutor): boto3 呼び出し用のスレッドプール
+        _lanes (List[_Lane]): 送信レーン
+        _in_flight (int): 実行中のPutRecordsリクエスト数
+        _spool (Optional[Spool]): 送信できなかったレコードの保存先
+        _codec (RecordCodec): レコードの形式
+        _encoders (Dict[str, RecordEncoder]): 送信元銘柄ごとのエンコード関数
+        _limiters (Dict[str, ShardRateLimiter]): ストリームごとの送信レートの制限
+        _shards_listed (Dict[str, float]): ストリームごとに ListShards を呼んだ時刻
     """
 
-    def __init__(self, queue_in: WebSocketQueue):
+    def __init__(
+        self,
+        queue_in: Optional[WebSocketQueue] = None,
+        max_batch_records: int = MAX_BATCH_RECORDS,
+        max_batch_bytes: int = MAX_BATCH_BYTES,
+        linger: float = 1.0,
+        max_retries: int = 3,
+        retry_backoff: float = 0.1,
+        max_in_flight: int = 4,
+        max_pending_batches: int = 2,
+        spool: Optional[Spool] = None,
+        replay_rate: float = 500.0,
+        replay_interval: float = 1.0,
+        client: Optional[Any] = None,
+        stream_name: Optional[str] = None,
+        rate_limit: bool = True,
+        shard_refresh: float = 300.0,
+        max_throttled_retries: int = 20,
+        codec: Optional[RecordCodec] = None,
+    ):
         """
         Kinesisクラスのコンストラクタ。
 
         Args:
-            region_name (str): AWSリージョン名
-            queue_in (WebSocketQueue): 入力キュー
+            queue_in (Optional[WebSocketQueue]): 入力キュー。publish 時に指定する場合は省略可
+            max_batch_records (int): 1回のPutRecordsで送信する最大レコード数
+            max_batch_bytes (int): 1回のPutRecordsで送信する最大バイト数
+            linger (float): レコードをバッファに滞留させる最大秒数
+            max_retries (int): 失敗したレコードを再送する最大回数
+            retry_backoff (float): 再送時の初回待機秒数（指数的に増加）
+            max_in_flight (int): 同時に実行するPutRecordsリクエストの最大数
+            max_pending_batches (int): レーンごとに保持する未完了バッチの最大数
+            spool (Optional[Spool]): 送信できなかったレコードの保存先
+            replay_rate (float): スプールから再送する最大レコード数（件/秒）
+            replay_interval (float): スプールが空の間に確認する間隔（秒）
+            client (Optional[Any]): Kinesisクライアント。省略時は AWS_REGION の boto3 クライアント
+            stream_name (Optional[str]): Sink として書き込むストリームの名前
+            rate_limit (bool): シャードごとに送信レートを制限するか
+            shard_refresh (float): ListShards でシャードを調べ直す間隔（秒）
+            max_throttled_retries (int): スロットリングのみで失敗したレコードを再送する最大回数
+            codec (Optional[RecordCodec]): レコードの形式。省略時は圧縮なしの JSON
         """
         self._queue_in = queue_in
+        self.stream_name = stream_name
         self._region_name = getenv("AWS_REGION", "")
-        self._client = boto3.client("kinesis", region_name=self._region_name)
+        self._client = (
+            client
+            if client is not None
+            else boto3.client("kinesis", region_name=self._region_name)
+        )
         self._logger = LogManager.get_logger(__name__)
 
-    async def publish(self, stream_name: str, tags: Dict) -> None:
+        self._max_batch_records = min(max_batch_records, MAX_BATCH_RECORDS)
+        self._max_batch_bytes = min(max_batch_bytes, MAX_BATCH_BYTES)
+        self._linger = linger
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._max_pending_batches = max_pending_batches
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="kinesis"
+        )
+        self._lanes = [_Lane() for _ in range(max_in_flight)]
+        self._buffer_event = asyncio.Event()
+        self._in_flight = 0
+        self._linger_task: Optional[asyncio.Task] = None
+        self._publishers = 0
+        self._spool = spool
+        self._replay_rate = replay_rate
+        self._replay_interval = replay_interval
+        self._replay_task: Optional[asyncio.Task] = None
+        # 送信元銘柄ごとのレコード数のメトリクスと最終時刻（publish / write で登録する）
+        self._records: Dict[str, Any] = {}
+        self._published: Dict[str, Any] = {}
+        self._healths: Dict[str, InstrumentHealth] = {}
+        self._latency: Dict[str, Tuple[Any, Any]] = {}
+        self._codec = codec if codec is not None else RecordCodec()
+        self._encoders: Dict[str, RecordEncoder] = {}
+        self._rate_limit = rate_limit
+        self._shard_refresh = shard_refresh
+        self._max_throttled_retries = max_throttled_retries
+        self._limiters: Dict[str, ShardRateLimiter] = {}
+        self._shards_listed: Dict[str, float] = {}
+        _INSTANCES.add(self)
+
+    @property
+    def in_flight(self) -> int:
+        """
+        実行中のPutRecordsリクエスト数
+
+        Returns:
+            int: 実行中のリクエスト数
+        """
+        return self._in_flight
+
+    async def publish(
+        self,
+        stream_name: str,
+        tags: Dict,
+        queue_in: Optional[WebSocketQueue] = None,
+    ) -> None:
         """
         レコードをKinesisストリームに送信する。
 
+        送信できた時刻はタグの値を ``-`` で連結した銘柄名ごとに記録する。
+
         Args:
             stream_name (str): Kinesisストリームの名前
             tags (Dict): レコードに追加するタグ
+            queue_in (Optional[WebSocketQueue]): 入力キュー。省略時はコンストラクタで指定したキュー
 
         Returns:
             None
         """
-        async for record in self._queue_in:
-            record.update(tags)
+        queue = queue_in if queue_in is not None else self._queue_in
+        owner, records = self._register(tags)
+        self._start()
+        self._publishers += 1
+        try:
+            async for record in queue:
+                await self._write(stream_name, record, owner, records)
+        finally:
+            self._publishers -= 1
+            if self._publishers == 0:
+                self._stop()
+            await self.flush(stream_name)
+
+    async def consume(self, queue: WebSocketQueue, tags: Dict[str, str]) -> None:
+        """
+        キューのレコードを stream_name に送信する（Sink の実装、publish と同じ）。
+
+        Args:
+            queue (WebSocketQueue): 入力キュー
+            tags (Dict[str, str]): レコードに追加するタグ
+        """
+        await self.publish(self.stream_name, tags, queue)
+
+    async def write(self, record: Dict[str, Any], tags: Dict[str, str]) -> None:
+        """
+        1件のレコードを stream_name のレーンに追加する（Sink の実装）。
+
+        Args:
+            record (Dict[str, Any]): レコード
+            tags (Dict[str, str]): レコードに追加するタグ
+        """
+        owner, records = self._register(tags)
+        self._start()
+        await self._write(self.stream_name, record, owner, records)
+
+    async def close(self) -> None:
+        """送信待ちのレコードを送信し、バックグラウンドのタスクとスレッドプールを止める。"""
+        await self.flush()
+        self._stop()
+        self._executor.shutdown(wait=True)
+        _INSTANCES.discard(self)
+
+    def _register(self, tags: Dict) -> Tuple[str, Any]:
+        """
+        送信元銘柄のメトリクスと最終時刻、タグをエンコードした関数を登録する。
+
+        Args:
+            tags (Dict): レコードに追加するタグ
+
+        Returns:
+            Tuple[str, Any]: 送信元銘柄と、キューに入れたレコード数のカウンタ
+        """
+        owner = "-".join(str(value) for value in tags.values())
+        if owner not in self._records:
+            labels = instrument_labels(tags)
+            self._records[owner] = RECORDS.labels(*labels)
+            self._published[owner] = PUBLISHED_RECORDS.labels(*labels)
+            self._healths[owner] = HealthCheck.instrument(owner)
+            self._encoders[owner] = self._codec.encoder(tags)
+            self._latency[owner] = (
+                PIPELINE_LATENCY.labels(*labels, STAGE_PUBLISH),
+                PIPELINE_LATENCY.labels(*labels, STAGE_TOTAL),
+            )
+        return owner, self._records[owner]
+
+    def _start(self) -> None:
+        """滞留時間の監視とスプールの再送を開始する。"""
+        if self._linger_task is None:
+            self._linger_task = asyncio.create_task(self._linger_loop())
+        if self._spool is not None and self._replay_task is None:
+            self._replay_task = asyncio.create_task(self._replay_loop())
+
+    def _stop(self) -> None:
+        """滞留時間の監視とスプールの再送を止める。"""
+        if self._linger_task is not None:
+            self._linger_task.cancel()
+            self._linger_task = None
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            self._replay_task = None
+
+    async def _write(
+        self, stream_name: str, record: Dict[str, Any], owner: str, records: Any
+    ) -> None:
+        """
+        レコードを送信元銘柄のタグとともにエントリに変換し、レーンに追加する。
+
+        Args:
+            stream_name (str): Kinesisストリームの名前
+            record (Dict[str, Any]): レコード（変更しない）
+            owner (str): 送信元銘柄（パーティションキー）
+            records (Any): キューに入れたレコード数のカウンタ
+        """
+        stamp: Stamp = None
+        if isinstance(record, CandleRecord) and record.closed_time is not None:
+            stamp = (record.closed_time, record.event_time)
+        entry = {
+            "Data": self._encoders[owner](record),
+            "PartitionKey": owner or "default",
+        }
+        records.inc()
+        await self._append(stream_name, entry, owner, stamp)
+
+    def _lane_for(self, partition_key: str) -> _Lane:
+        """
+        パーティションキーに対応するレーンを返す。
+
+        Args:
+            partition_key (str): パーティションキー
+
+        Returns:
+            _Lane: レーン
+        """
+        return self._lanes[crc32(partition_key.encode("utf-8")) % len(self._lanes)]
+
+    async def _append(
+        self,
+        stream_name: str,
+        entry: Dict[str, Any],
+        owner: str = "",
+        stamp: Stamp = None,
+    ) -> None:
+        """
+        レコードをレーンのバッファに追加し、上限に達した場合は送信する。
+
+        バッファに別のストリームのレコードがある場合は、先にそれを送信する。
+
+        Args:
+            stream_name (str): Kinesisストリームの名前
+            entry (Dict[str, Any]): PutRecordsのエントリ
+            owner (str): レコードの送信元銘柄
+            stamp (Stamp): 遅延の計測用の時刻
+        """
+        size = len(entry["Data"]) + len(entry["PartitionKey"].encode("utf-8"))
+        if size > MAX_RECORD_BYTES:
+            self._logger.error(f"Record too large for Kinesis ({size} bytes), dropped")
+            return
+
+        lane = self._lane_for(entry["PartitionKey"])
+        if lane.buffer and (
+            lane.stream_name != stream_name
+            or lane.buffer_bytes + size > self._max_batch_bytes
+        ):
+            await self._flush_lane(lane)
+
+        if not lane.buffer:
+            lane.stream_name = stream_name
+            lane.buffer_since = time.monotonic()
+            self._buffer_event.set()
+        lane.buffer.append(entry)
+        lane.owners.append(owner)
+        lane.stamps.append(stamp)
+        lane.buffer_bytes += size
+
+        if len(lane.buffer) >= self._max_batch_records:
+            await self._flush_lane(lane)
+
+    async def _linger_loop(self) -> None:
+        """バッファの滞留時間が上限を超えたレーンを、それぞれのストリームに送信する。"""
+        while True:
+            await self._buffer_event.wait()
+            waiting = [lane for lane in self._lanes if lane.buffer_since is not None]
+            if not waiting:
+                self._buffer_event.clear()
+                continue
+            now = time.monotonic()
+            oldest = min(lane.buffer_since for lane in waiting)
+            delay = oldest + self._linger - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            for lane in waiting:
+                since = lane.buffer_since
+                if since is not None and since + self._linger <= now:
+                    await self._flush_lane(lane)
+
+    async def _flush_lane(self, lane: _Lane) -> None:
+        """
+        レーンのバッファをそのストリームへの送信タスクとして登録する。
+
+        未完了のバッチが上限を超えている場合は、古いバッチの完了を待つ。
+
+        Args:
+            lane (_Lane): 送信するレーン
+        """
+        if not lane.buffer:
+            return
+        stream_name = lane.stream_name
+        entries, owners, stamps = lane.buffer, lane.owners, lane.stamps
+        lane.buffer, lane.owners, lane.stamps = [], [], []
+        lane.buffer_bytes = 0
+        lane.buffer_since = None
+
+        # バッファの取り出しとタスク生成の間で待機しないことで、バッチの順序を保つ
+        lane.pending.append(
+            asyncio.create_task(self._send(stream_name, lane, entries, owners, stamps))
+        )
+
+        while lane.pending and lane.pending[0].done():
+            lane.pending.popleft()
+        while len(lane.pending) > self._max_pending_batches:
+            await lane.pending.popleft()
+
+    async def flush(self, stream_name: Optional[str] = None) -> None:
+        """
+        レーンのバッファを送信し、全レーンの送信の完了を待つ。
+
+        Args:
+            stream_name (Optional[str]): 送信するストリームの名前。省略時は全てのストリーム
+        """
+        for lane in self._lanes:
+            if stream_name is None or lane.stream_name == stream_name:
+                await self._flush_lane(lane)
+        for lane in self._lanes:
+            while lane.pending:
+                await lane.pending.popleft()
+        if self._spool is not None:
+            self._spool.flush()
+
+    async def _send(
+        self,
+        stream_name: str,
+        lane: _Lane,
+        entries: List[Dict[str, Any]],
+        owners: List[str],
+        stamps: Optional[List[Stamp]] = None,
+    ) -> None:
+        """
+        レーンの順序を保ったままPutRecordsを実行する。
+
+        Args:
+            stream_name (str): Kinesisストリームの名前
+            lane (_Lane): 送信するレーン
+            entries (List[Dict[str, Any]]): PutRecordsのエントリ
+            owners (List[str]): 各エントリの送信元銘柄
+            stamps (Optional[List[Stamp]]): 各エントリの遅延の計測用の時刻
+        """
+        async with lane.lock:
+            if self._spool is not None and not self._spool.is_empty:
+                self._spool_entries(stream_name, entries, owners)
+                return
+            entries, owners = await self._put_records(
+                stream_name, entries, owners, stamps
+            )
+            if entries and self._spool is not None:
+                self._spool_entries(stream_name, entries, owners)
+
+    def _spool_entries(
+        self, stream_name: str, entries: List[Dict[str, Any]], owners: List[str]
+    ) -> None:
+        """
+        エントリをスプールに保存する。
+
+        Args:
+            stream_name (str): Kinesisストリームの名前
+            entries (List[Dict[str, Any]]): PutRecordsのエントリ
+            owners (List[str]): 各エントリの送信元銘柄
+        """
+        for entry, owner in zip(entries, owners, strict=True):
+            self._spool.append(_encode_spooled(stream_name, entry, owner))
+        SPOOLED_RECORDS.labels(stream_name).inc(len(entries))
+        self._logger.debug(
+            f"Spooled {len(entries)} records ({self._spool.records} pending)"
+        )
+
+    async def _replay_loop(self) -> None:
+        """
+        スプールのレコードを保存した順に再送する。
+
+        送信に失敗した場合は、失敗したレコード以降を残して待機時間を延ばしながら再試行する。
+        """
+        backoff = REPLAY_BACKOFF_MIN
+        while True:
+            if self._spool.is_empty:
+                await asyncio.sleep(self._replay_interval)
+                continue
+
+            # 送信を待つ間の追記で古いセグメントが削除されると、読み出し位置からの
+            # 件数では位置を求められないため、各レコードの位置を先に読み出しておく
+            payloads, positions = self._spool.peek_positions(self._max_batch_records)
+            stream_name, entries, owners = "", [], []
+            batch_bytes = 0
+            for payload in payloads:
+                record_stream, entry, owner = _decode_spooled(payload)
+                size = len(entry["Data"]) + len(entry["PartitionKey"].encode("utf-8"))
+                if entries and (
+                    record_stream != stream_name
+                    or batch_bytes + size > self._max_batch_bytes
+                ):
+                    break
+                stream_name = record_stream
+                entries.append(entry)
+                owners.append(owner)
+                batch_bytes += size
+
+            sent = await self._replay_batch(stream_name, entries, owners)
+            if sent > 0:
+                self._spool.commit(positions[sent - 1])
+            if sent == len(entries):
+                backoff = REPLAY_BACKOFF_MIN
+                await asyncio.sleep(len(entries) / self._replay_rate)
+                continue
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, REPLAY_BACKOFF_MAX)
+
+    async def _replay_batch(
+        self, stream_name: str, entries: List[Dict[str, Any]], owners: List[str]
+    ) -> int:
+        """
+        スプールのレコードを1回だけPutRecordsで送信する。
+
+        Args:
+            stream_name (str): Kinesisストリームの名前
+            entries (List[Dict[str, Any]]): PutRecordsのエントリ
+            owners (List[str]): 各エントリの送信元銘柄
+
+        Returns:
+            int: 先頭から連続して送信できたレコード数
+        """
+        limiter = await self._limiter_for(stream_name)
+        shard_ids = await limiter.acquire(entries) if limiter is not None else []
+        try:
+            response = await self._call_put_records(stream_name, entries)
+        except Exception as e:
+            self._logger.warning(f"Failed to replay spooled records: {e}")
+            return 0
+
+        if limiter is not None:
+            limiter.record_results(shard_ids, response["Records"])
+        sent = len(entries)
+        for i, result in enumerate(response["Records"]):
+            if "ErrorCode" in result:
+                sent = i
+                break
+        self._count_published(owners[:sent])
+        if sent:
+            self._logger.info(
+                f"Replayed {sent} spooled records ({self._spool.records - sent} pending)"
+            )
+        return sent
+
+    async def _limiter_for(self, stream_name: str) -> Optional[ShardRateLimiter]:
+        """
+        ストリームの送信レートの制限を返し、shard_refresh ごとにシャードを調べ直す。
+
+        ListShards に失敗した場合は、全てのレコードを1つのシャードとして制限する。
+
+        Args:
+            stream_name (str): Kinesisストリームの名前
+
+        Returns:
+            Optional[ShardRateLimiter]: 送信レートの制限。rate_limit が無効な場合は None
+        """
+        if not self._rate_limit:
+            return None
+        limiter = self._limiters.get(stream_name)
+        if limiter is None:
+            limiter = self._limiters[stream_name] = ShardRateLimiter(stream_name)
+        now = time.monotonic()
+        listed = self._shards_listed.get(stream_name)
+        if listed is not None and now - listed < self._shard_refresh:
+            return limiter
+        # 他のレーンが同時に ListShards を呼ばないよう、呼ぶ前に時刻を記録する
+        self._shards_listed[stream_name] = now
+        try:
+            shards = await asyncio.get_running_loop().run_in_executor(
+                self._executor, partial(self._list_shards, stream_name)
+            )
+        except Exception as e:
+            self._logger.warning(f"Failed to list shards of {stream_name}: {e}")
+            return limiter
+        limiter.set_shards(shards)
+        self._logger.debug(f"{stream_name} has {len(shards)} shards")
+        return limiter
+
+    def _list_shards(self, stream_name: str) -> List[Dict[str, Any]]:
+        """
+        ListShards を次のページがなくなるまで呼び出す。
+
+        Args:
+            stream_name (str): Kinesisストリームの名前
+
+        Returns:
+            List[Dict[str, Any]]: シャード
+        """
+        response = self._client.list_shards(StreamName=stream_name)
+        shards = list(response["Shards"])
+        while response.get("NextToken"):
+            response = self._client.list_shards(NextToken=response["NextToken"])
+            shards.extend(response["Shards"])
+        return shards
+
+    async def _call_put_records(
+        self, stream_name: str, entries: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        スレッドプールでPutRecordsを1回呼び出し、所要時間と失敗をメトリクスに記録する。
+
+        Args:
+            stream_name (str): Kinesisストリームの名前
+            entries (List[Dict[str, Any]]): PutRecordsのエントリ
+
+        Returns:
+            Dict[str, Any]: PutRecordsのレスポンス
+
+        Raises:
+            Exception: PutRecordsの呼び出しで発生した例外
+        """
+        loop = asyncio.get_running_loop()
+        self._in_flight += 1
+        start = time.perf_counter()
+        try:
+            response = await loop.run_in_executor(
+                self._executor,
+                partial(
+                    self._client.put_records, StreamName=stream_name, Records=entries
+                ),
+            )
+        except Exception:
+            PUT_ERRORS.labels(stream_name).inc()
+            raise
+        finally:
+            self._in_flight -= 1
+            PUT_SECONDS.labels(stream_name).observe(time.perf_counter() - start)
+        failed = response.get("FailedRecordCount", 0)
+        if failed:
+            FAILED_RECORDS.labels(stream_name).inc(failed)
+        return response
+
+    def _count_published(
+        self, owners: List[str], stamps: Optional[List[Stamp]] = None
+    ) -> None:
+        """
+        送信できたレコード数と時刻、遅延を送信元銘柄ごとに記録する。
+
+        Args:
+            owners (List[str]): 送信できたレコードの送信元銘柄
+            stamps (Optional[List[Stamp]]): 送信できたレコードの遅延の計測用の時刻
+        """
+        for owner in owners:
+            counter = self._published.get(owner)
+            if counter is not None:
+                counter.inc()
+        if stamps:
+            acked = time.time()
+            for owner, stamp in zip(owners, stamps, strict=True):
+                latency = self._latency.get(owner)
+                if stamp is None or latency is None:
+                    continue
+                closed, event = stamp
+                latency[0].observe(acked - closed)
+                if event is not None:
+                    latency[1].observe(acked - event)
+        now = time.monotonic()
+        for owner in set(owners):
+            health = self._healths.get(owner)
+            if health is not None:
+                health.last_publish = now
+                health.unpublished_since = None
+
+    async def _put_records(
+        self,
+        stream_name: str,
+        entries: List[Dict[str, Any]],
+        owners: List[str],
+        stamps: Optional[List[Stamp]] = None,
+    ) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        PutRecordsを実行し、失敗したエントリのみを再送する。
+
+        スロットリングのみで失敗した場合は、送信レートの制限で待ってから
+        max_retries とは別に max_throttled_retries 回まで再送する。それ以外の失敗は
+        retry_backoff から倍々に待って max_retries 回まで再送する。どちらかの上限に
+        達した場合は残りを返し、レーンのロックを解放する（呼び出し元がスプールに保存する）。
+
+        Args:
+            stream_name (str): Kinesisストリームの名前
+            entries (List[Dict[str, Any]]): PutRecordsのエントリ
+            owners (List[str]): 各エントリの送信元銘柄
+            stamps (Optional[List[Stamp]]): 各エントリの遅延の計測用の時刻
+
+        Returns:
+            Tuple[List[Dict[str, Any]], List[str]]: 再送しても送信できなかったエントリと送信元銘柄
+        """
+        if stamps is None:
+            stamps = [None] * len(entries)
+        limiter = await self._limiter_for(stream_name)
+        attempt = 0
+        throttled_attempt = 0
+        while attempt <= self._max_retries:
+            shard_ids = await limiter.acquire(entries) if limiter is not None else []
             try:
-                response = self._client.put_record(
-                    StreamName=stream_name,
-                    Data=dumps(record).encode("utf-8"),
-                    PartitionKey="default",
-                )
-                self._logger.debug(f"Published to Kinesis: {response}")
-                await HealthCheck.set_health_status(True)
+                response = await self._call_put_records(stream_name, entries)
             except Exception as e:
                 self._logger.error(f"Failed to publish to Kinesis: {e}")
-                await HealthCheck.set_health_status(False)
+                attempt += 1
+                await self._retry_wait(attempt)
+                continue
+
+            self._logger.debug(f"Published to Kinesis: {response}")
+            results = response["Records"]
+            throttled = limiter.record_results(shard_ids, results) if limiter else 0
+            failed = [i for i, result in enumerate(results) if "ErrorCode" in result]
+            published = [
+                i for i, result in enumerate(results) if "ErrorCode" not in result
+            ]
+            self._count_published(
+                [owners[i] for i in published], [stamps[i] for i in published]
+            )
+            if not failed:
+                return [], []
+            entries = [entries[i] for i in failed]
+            owners = [owners[i] for i in failed]
+            stamps = [stamps[i] for i in failed]
+            if throttled == len(failed):
+                throttled_attempt += 1
+                if throttled_attempt > self._max_throttled_retries:
+                    break
+                self._logger.debug(
+                    f"{throttled} records throttled, retrying "
+                    f"({throttled_attempt}/{self._max_throttled_retries})"
+                )
+                continue
+            attempt += 1
+            self._logger.warning(
+                f"{len(entries)} records failed, retrying ({attempt}/{self._max_retries})"
+            )
+            await self._retry_wait(attempt)
+
+        self._logger.error(f"Failed to publish {len(entries)} records to Kinesis")
+        return entries, owners
+
+    async def _retry_wait(self, attempt: int) -> None:
+        """
+        attempt 回目の再送の前に待つ（最後の再送の後は待たない）。
+
+        Args:
+            attempt (int): 失敗した回数
+        """
+        if attempt <= self._max_retries:
+            await asyncio.sleep(self._retry_backoff * 2 ** (attempt - 1))
 
     def get_shard_iterator(
         self, stream_name: str, shard_id: str, iterator_type: str = "LATEST"
@@ -103,6 +877,8 @@ class Kinesis:
         """
         Kinesisストリームを購読し、データを取得する。
 
+        レコードの Data は書き込んだときの形式によらず decode_record で辞書に戻す。
+
         Args:
             stream_name (str): Kinesisストリームの名前
             shard_id (str): シャードID
@@ -110,8 +886,8 @@ class Kinesis:
             limit (int): 取得するレコードの最大数
 
         Returns:
-            List[Dict]: 取得したレコード
+            List[Dict]: 取得したレコード（Data はタグを含む辞書）
         """
         shard_iterator = self.get_shard_iterator(stream_name, shard_id, iterator_type)
         records = self.get_records(shard_iterator, limit)
-        return records
+        return [{**record, "Data": decode_record(record["Data"])} for record in records]
@@ -0,0 +1,383 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from src.libs.aws.rate_limiter import (
+    MAX_HASH_KEY,
+    SHARD_BYTES_PER_SECOND,
+    SHARD_RECORDS_PER_SECOND,
+    THROTTLED,
+    hash_key,
+)
+
+# PutRecords API の制限値
+MAX_PUT_RECORDS = 500
+MAX_PUT_BYTES = 5 * 1024 * 1024
+MAX_RECORD_BYTES = 1024 * 1024
+
+
+def _client_error(code: str, message: str, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+class _Shard:
+    """
+    シャードの状態
+
+    書き込みの上限は、1秒分を容量とするトークンバケットで判定する。
+
+    Attributes:
+        shard_id (str): シャードID
+        starting_hash_key (int): ハッシュキーの範囲の下限
+        ending_hash_key (int): ハッシュキーの範囲の上限
+        records (Deque[Dict[str, Any]]): 保持しているレコード（古いものから破棄する）
+        sequence (int): 最後に割り当てたシーケンス番号
+        record_tokens (float): 書き込めるレコード数
+        byte_tokens (float): 書き込めるバイト数
+        refilled (float): トークンを補充した時刻
+    """
+
+    __slots__ = (
+        "shard_id",
+        "starting_hash_key",
+        "ending_hash_key",
+        "records",
+        "sequence",
+        "record_tokens",
+        "byte_tokens",
+        "refilled",
+    )
+
+    def __init__(
+        self,
+        index: int,
+        count: int,
+        retain: int,
+        records: float,
+        bytes_: float,
+        now: float,
+    ) -> None:
+        width = (MAX_HASH_KEY + 1) // count
+        self.shard_id = f"shardId-{index:012d}"
+        self.starting_hash_key = width * index
+        self.ending_hash_key = (
+            MAX_HASH_KEY if index == count - 1 else width * (index + 1) - 1
+        )
+        self.records: Deque[Dict[str, Any]] = deque(maxlen=retain)
+        self.sequence = 0
+        self.record_tokens = records
+        self.byte_tokens = bytes_
+        self.refilled = now
+
+
+class LocalKinesisClient:
+    """
+    boto3 の Kinesis クライアントの代わりに使うプロセス内のストリーム
+
+    PutRecord / PutRecords をシャードのハッシュキーの範囲に振り分け、シャードごとの
+    書き込みの上限（既定は実際の Kinesis と同じ 1000件/秒・1MiB/秒）を超えたレコードを
+    ProvisionedThroughputExceededException で拒否する。PutRecords は拒否した
+    レコードだけを ErrorCode 付きで返し、PutRecord は ClientError を送出する。
+    呼び出しごとに latency（+ 0〜jitter）秒だけ待つため、スレッドプールからの
+    呼び出しで送信の並列度とバッチの効果を確認できる。
+
+    ストリームは初回の呼び出しで shards 個のシャードで作成する。
+
+    Attributes:
+        shards (int): 作成するストリームのシャード数
+        latency (float): 呼び出しごとの待ち時間（秒）
+        jitter (float): 待ち時間に加える乱数の上限（秒）
+        calls (int): PutRecord / PutRecords の呼び出し回数
+        accepted (int): 書き込んだレコード数
+        throttled (int): 上限を超えて拒否したレコード数
+        _streams (Dict[str, List[_Shard]]): ストリーム名とシャードの対応表
+    """
+
+    def __init__(
+        self,
+        shards: int = 1,
+        records_per_second: float = SHARD_RECORDS_PER_SECOND,
+        bytes_per_second: float = SHARD_BYTES_PER_SECOND,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        retain: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        seed: int = 0,
+    ) -> None:
+        """
+        Args:
+            shards (int, optional): 作成するストリームのシャード数
+            records_per_second (float, optional): シャードごとの書き込みの上限（件/秒）
+            bytes_per_second (float, optional): シャードごとの書き込みの上限（バイト/秒）
+            latency (float, optional): 呼び出しごとの待ち時間（秒）
+            jitter (float, optional): 待ち時間に加える乱数の上限（秒）
+            retain (int, optional): シャードごとに保持するレコード数
+            clock (Callable[[], float], optional): 上限の判定に使う時刻（秒）を返す関数
+            sleep (Callable[[float], None], optional): 待ち時間に使う関数
+            seed (int, optional): 乱数の種
+        """
+        self.shards = shards
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self.accepted = 0
+        self.throttled = 0
+        self._records_per_second = records_per_second
+        self._bytes_per_second = bytes_per_second
+        self._retain = retain
+        self._clock = clock
+        self._sleep = sleep
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._streams: Dict[str, List[_Shard]] = {}
+
+    def create_stream(self, StreamName: str, ShardCount: int) -> None:  # noqa: N803
+        """
+        ストリームを作成する
+
+        Args:
+            StreamName (str): ストリームの名前
+            ShardCount (int): シャード数
+        """
+        with self._lock:
+            self._create(StreamName, ShardCount)
+
+    def _create(self, stream_name: str, count: int) -> List[_Shard]:
+        now = self._clock()
+        shards = [
+            _Shard(
+                i,
+                count,
+                self._retain,
+                self._records_per_second,
+                self._bytes_per_second,
+                now,
+            )
+            for i in range(count)
+        ]
+        self._streams[stream_name] = shards
+        return shards
+
+    def _shards(self, stream_name: str) -> List[_Shard]:
+        shards = self._streams.get(stream_name)
+        if shards is None:
+            shards = self._create(stream_name, self.shards)
+        return shards
+
+    def _wait(self) -> None:
+        delay = self.latency + (
+            self._rng.uniform(0, self.jitter) if self.jitter else 0.0
+        )
+        if delay > 0:
+            self._sleep(delay)
+
+    def _put(
+        self, stream_name: str, shards: List[_Shard], record: Dict[str, Any], now: float
+    ) -> Dict[str, Any]:
+        """
+        1件のレコードをシャードに書き込む（ロックを取って呼び出す）
+
+        Returns:
+            Dict[str, Any]: PutRecords のレコードごとの結果
+        """
+        explicit = record.get("ExplicitHashKey")
+        key = (
+            int(explicit) if explicit is not None else hash_key(record["PartitionKey"])
+        )
+        width = (MAX_HASH_KEY + 1) // len(shards)
+        shard = shards[min(key // width, len(shards) - 1)]
+
+        elapsed = now - shard.refilled
+        if elapsed > 0:
+            shard.record_tokens = min(
+                self._records_per_second,
+                shard.record_tokens + elapsed * self._records_per_second,
+            )
+            shard.byte_tokens = min(
+                self._bytes_per_second,
+                shard.byte_tokens + elapsed * self._bytes_per_second,
+            )
+            shard.refilled = now
+        size = len(record["Data"]) + len(record["PartitionKey"].encode("utf-8"))
+        if shard.record_tokens < 1 or shard.byte_tokens < size:
+            self.throttled += 1
+            return {
+                "ErrorCode": THROTTLED,
+                "ErrorMessage": f"Rate exceeded for shard {shard.shard_id} in stream {stream_name}.",
+            }
+        shard.record_tokens -= 1
+        shard.byte_tokens -= size
+        shard.sequence += 1
+        sequence_number = str(shard.sequence)
+        shard.records.append(
+            {
+                "SequenceNumber": sequence_number,
+                "ApproximateArrivalTimestamp": time.time(),
+                "Data": record["Data"],
+                "PartitionKey": record["PartitionKey"],
+            }
+        )
+        self.accepted += 1
+        return {"SequenceNumber": sequence_number, "ShardId": shard.shard_id}
+
+    def put_record(
+        self,
+        StreamName: str,  # noqa: N803
+        Data: bytes,  # noqa: N803
+        PartitionKey: str,  # noqa: N803
+        ExplicitHashKey: Optional[str] = None,  # noqa: N803
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        PutRecord と同じく1件のレコードを書き込む
+
+        Returns:
+            Dict[str, Any]: ShardId と SequenceNumber
+
+        Raises:
+            ClientError: 上限を超えた場合（ProvisionedThroughputExceededException）、
+                またはレコードが大きすぎる場合（ValidationException）
+        """
+        self._wait()
+        record = {"Data": Data, "PartitionKey": PartitionKey}
+        if ExplicitHashKey is not None:
+            record["ExplicitHashKey"] = ExplicitHashKey
+        if len(Data) + len(PartitionKey.encode("utf-8")) > MAX_RECORD_BYTES:
+            raise _client_error(
+                "ValidationException", "Record is too large", "PutRecord"
+            )
+        with self._lock:
+            self.calls += 1
+            result = self._put(
+                StreamName, self._shards(StreamName), record, self._clock()
+            )
+        if "ErrorCode" in result:
+            raise _client_error(
+                result["ErrorCode"], result["ErrorMessage"], "PutRecord"
+            )
+        return result
+
+    def put_records(
+        self,
+        StreamName: str,  # noqa: N803
+        Records: List[Dict[str, Any]],  # noqa: N803
+    ) -> Dict[str, Any]:
+        """
+        PutRecords と同じく複数のレコードを書き込む
+
+        Returns:
+            Dict[str, Any]: FailedRecordCount と、レコードごとの結果
+
+        Raises:
+            ClientError: 件数・サイズが PutRecords の制限を超える場合（ValidationException）
+        """
+        self._wait()
+        size = sum(
+            len(r["Data"]) + len(r["PartitionKey"].encode("utf-8")) for r in Records
+        )
+        if not Records or len(Records) > MAX_PUT_RECORDS or size > MAX_PUT_BYTES:
+            raise _client_error(
+                "ValidationException",
+                f"{len(Records)} records ({size} bytes) exceed PutRecords limits",
+                "PutRecords",
+            )
+        with self._lock:
+            self.calls += 1
+            shards = self._shards(StreamName)
+            now = self._clock()
+            results = [self._put(StreamName, shards, record, now) for record in Records]
+        return {
+            "FailedRecordCount": sum("ErrorCode" in result for result in results),
+            "Records": results,
+        }
+
+    def list_shards(self, StreamName: str, **kwargs: Any) -> Dict[str, Any]:  # noqa: N803
+        """
+        ListShards と同じくシャードとハッシュキーの範囲を返す
+
+        Returns:
+            Dict[str, Any]: Shards
+        """
+        with self._lock:
+            shards = self._shards(StreamName)
+        return {
+            "Shards": [
+                {
+                    "ShardId": shard.shard_id,
+                    "HashKeyRange": {
+                        "StartingHashKey": str(shard.starting_hash_key),
+                        "EndingHashKey": str(shard.ending_hash_key),
+                    },
+                    "SequenceNumberRange": {"StartingSequenceNumber": "1"},
+                }
+                for shard in shards
+            ]
+        }
+
+    def get_shard_iterator(
+        self,
+        StreamName: str,  # noqa: N803
+        ShardId: str,  # noqa: N803
+        ShardIteratorType: str,  # noqa: N803
+        **kwargs: Any,
+    ) -> Dict[str, str]:
+        """
+        GetShardIterator と同じく読み出し位置を返す（TRIM_HORIZON または LATEST）
+
+        Returns:
+            Dict[str, str]: ShardIterator
+        """
+        with self._lock:
+            shard = self._find(StreamName, ShardId)
+            if ShardIteratorType == "TRIM_HORIZON" and shard.records:
+                position = int(shard.records[0]["SequenceNumber"])
+            else:
+                position = shard.sequence + 1
+        return {"ShardIterator": f"{StreamName}|{ShardId}|{position}"}
+
+    def get_records(self, ShardIterator: str, Limit: int = 10000) -> Dict[str, Any]:  # noqa: N803
+        """
+        GetRecords と同じく読み出し位置からレコードを返す
+
+        Returns:
+            Dict[str, Any]: Records と NextShardIterator
+        """
+        stream_name, shard_id, position = ShardIterator.rsplit("|", 2)
+        start = int(position)
+        with self._lock:
+            shard = self._find(stream_name, shard_id)
+            records = [r for r in shard.records if int(r["SequenceNumber"]) >= start][
+                :Limit
+            ]
+        if records:
+            start = int(records[-1]["SequenceNumber"]) + 1
+        return {
+            "Records": records,
+            "NextShardIterator": f"{stream_name}|{shard_id}|{start}",
+            "MillisBehindLatest": 0,
+        }
+
+    def _find(self, stream_name: str, shard_id: str) -> _Shard:
+        for shard in self._shards(stream_name):
+            if shard.shard_id == shard_id:
+                return shard
+        raise _client_error(
+            "ResourceNotFoundException",
+            f"Shard {shard_id} not found",
+            "GetShardIterator",
+        )
+
+    def stats(self) -> Tuple[int, int, int]:
+        """
+        呼び出し回数、書き込んだレコード数、拒否したレコード数を返す
+
+        Returns:
+            Tuple[int, int, int]: calls, accepted, throttled
+        """
+        with self._lock:
+            return self.calls, self.accepted, self.throttled
@@ -0,0 +1,283 @@
+import asyncio
+import time
+from bisect import bisect_right
+from hashlib import md5
+from typing import Any, Callable, Dict, List
+
+from src.libs.utils.metrics import Counter, Gauge
+
+# Kinesis のシャードごとの書き込みの上限
+SHARD_RECORDS_PER_SECOND = 1000
+SHARD_BYTES_PER_SECOND = 1024 * 1024
+MAX_HASH_KEY = 2**128 - 1
+
+THROTTLED = "ProvisionedThroughputExceededException"
+# ListShards で取得する前に全てのハッシュキーを割り当てるシャード
+UNKNOWN_SHARD = "unknown"
+
+SHARD_RATE = Gauge(
+    "collector_kinesis_shard_rate",
+    "Adaptive PutRecords limit per shard in records per second",
+    ("stream", "shard"),
+)
+THROTTLED_RECORDS = Counter(
+    "collector_kinesis_throttled_records_total",
+    "Records rejected with ProvisionedThroughputExceededException",
+    ("stream", "shard"),
+)
+
+
+def hash_key(partition_key: str) -> int:
+    """
+    パーティションキーをハッシュキー（MD5 の128ビット整数）に変換する
+
+    Args:
+        partition_key (str): パーティションキー
+
+    Returns:
+        int: ハッシュキー
+    """
+    return int.from_bytes(md5(partition_key.encode("utf-8")).digest(), "big")
+
+
+class AdaptiveTokenBucket:
+    """
+    上限を AIMD（加算増加・乗算減少）で調整するトークンバケット
+
+    容量は1秒分（rate）。reserve はトークンが足りない場合も先に消費し、
+    不足分が補充されるまでの秒数を返す（呼び出し側が待つ）。
+
+    Attributes:
+        rate (float): 現在の上限（1秒あたり）
+        max_rate (float): 上限の最大値
+        min_rate (float): 上限の最小値
+        tokens (float): 残りのトークン（負の場合は前借り）
+        updated (float): トークンを補充した時刻
+    """
+
+    __slots__ = ("rate", "max_rate", "min_rate", "tokens", "updated")
+
+    def __init__(self, max_rate: float, min_rate: float, now: float) -> None:
+        self.rate = max_rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.tokens = max_rate
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """
+        トークンを消費し、待つべき秒数を返す
+
+        Args:
+            amount (float): 消費するトークン
+            now (float): 現在時刻（秒）
+
+        Returns:
+            float: 不足分が補充されるまでの秒数（足りている場合は0）
+        """
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def decrease(self, factor: float) -> None:
+        """
+        上限を factor 倍に下げ、残りのトークンを捨てる（スロットリングされた場合）
+
+        Args:
+            factor (float): 倍率（0〜1）
+        """
+        self.rate = max(self.min_rate, self.rate * factor)
+        self.tokens = min(self.tokens, 0.0)
+
+    def increase(self, step: float) -> None:
+        """
+        上限を step だけ上げる（スロットリングされなかった場合）
+
+        Args:
+            step (float): 増分
+        """
+        self.rate = min(self.max_rate, self.rate + step)
+
+
+class _ShardBuckets:
+    """シャードのレコード数とバイト数のバケット"""
+
+    __slots__ = ("records", "bytes")
+
+    def __init__(
+        self, records: AdaptiveTokenBucket, bytes_: AdaptiveTokenBucket
+    ) -> None:
+        self.records = records
+        self.bytes = bytes_
+
+
+class ShardRateLimiter:
+    """
+    シャードごとの PutRecords の送信レートを制限する
+
+    パーティションキーは ListShards のハッシュキーの範囲でシャードに対応づける。
+    送信前に acquire でシャードごとのレコード数とバイト数のトークンを消費して待ち、
+    応答の ProvisionedThroughputExceededException をシャードごとに record_results に
+    渡すと、そのシャードの上限を decrease 倍に下げる。スロットリングされずに送信
+    できたシャードは上限の increase 倍（最大値に対する割合）ずつ戻す。
+
+    Attributes:
+        stream_name (str): ストリームの名前（メトリクスのラベル）
+        _starts (List[int]): ハッシュキーの範囲の下限（昇順）
+        _shard_ids (List[str]): _starts に対応するシャードID
+        _buckets (Dict[str, _ShardBuckets]): シャードIDとバケットの対応表
+        _shard_of (Dict[str, str]): パーティションキーとシャードIDのキャッシュ
+    """
+
+    def __init__(
+        self,
+        stream_name: str = "",
+        records_per_second: float = SHARD_RECORDS_PER_SECOND,
+        bytes_per_second: float = SHARD_BYTES_PER_SECOND,
+        decrease: float = 0.5,
+        increase: float = 0.05,
+        min_fraction: float = 0.05,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            stream_name (str, optional): ストリームの名前（メトリクスのラベル）
+            records_per_second (float, optional): シャードごとの上限の最大値（件/秒）
+            bytes_per_second (float, optional): シャードごとの上限の最大値（バイト/秒）
+            decrease (float, optional): スロットリングされた場合に上限に掛ける倍率
+            increase (float, optional): 送信できた場合に上限に加える最大値に対する割合
+            min_fraction (float, optional): 上限の最小値の最大値に対する割合
+            clock (Callable[[], float], optional): 現在時刻（秒）を返す関数
+        """
+        self.stream_name = stream_name
+        self._records_per_second = records_per_second
+        self._bytes_per_second = bytes_per_second
+        self._decrease = decrease
+        self._increase = increase
+        self._min_fraction = min_fraction
+        self._clock = clock
+        self._starts: List[int] = [0]
+        self._shard_ids: List[str] = [UNKNOWN_SHARD]
+        self._buckets: Dict[str, _ShardBuckets] = {}
+        self._shard_of: Dict[str, str] = {}
+        self._bucket(UNKNOWN_SHARD)
+
+    def _bucket(self, shard_id: str) -> _ShardBuckets:
+        buckets = self._buckets.get(shard_id)
+        if buckets is None:
+            now = self._clock()
+            buckets = self._buckets[shard_id] = _ShardBuckets(
+                AdaptiveTokenBucket(
+                    self._records_per_second,
+                    self._records_per_second * self._min_fraction,
+                    now,
+                ),
+                AdaptiveTokenBucket(
+                    self._bytes_per_second,
+                    self._bytes_per_second * self._min_fraction,
+                    now,
+                ),
+            )
+            SHARD_RATE.labels(self.stream_name, shard_id).set_function(
+                lambda: buckets.records.rate
+            )
+        return buckets
+
+    def set_shards(self, shards: List[Dict[str, Any]]) -> None:
+        """
+        ListShards の結果からハッシュキーの範囲を設定する
+
+        親シャード（EndingSequenceNumber のある閉じたシャード）は除く。
+
+        Args:
+            shards (List[Dict[str, Any]]): ListShards の Shards
+        """
+        ranges = sorted(
+            (int(shard["HashKeyRange"]["StartingHashKey"]), shard["ShardId"])
+            for shard in shards
+            if "EndingSequenceNumber" not in shard.get("SequenceNumberRange", {})
+        )
+        if not ranges:
+            return
+        self._starts = [start for start, _ in ranges]
+        self._shard_ids = [shard_id for _, shard_id in ranges]
+        self._shard_of.clear()
+        for shard_id in self._shard_ids:
+            self._bucket(shard_id)
+
+    def shard_for(self, partition_key: str) -> str:
+        """
+        パーティションキーが書き込まれるシャードを返す
+
+        Args:
+            partition_key (str): パーティションキー
+
+        Returns:
+            str: シャードID（ListShards の前は UNKNOWN_SHARD）
+        """
+        shard_id = self._shard_of.get(partition_key)
+        if shard_id is None:
+            index = bisect_right(self._starts, hash_key(partition_key)) - 1
+            shard_id = self._shard_of[partition_key] = self._shard_ids[max(index, 0)]
+        return shard_id
+
+    async def acquire(self, entries: List[Dict[str, Any]]) -> List[str]:
+        """
+        エントリのシャードごとにトークンを消費し、上限を超える場合は待つ
+
+        Args:
+            entries (List[Dict[str, Any]]): PutRecords のエントリ
+
+        Returns:
+            List[str]: 各エントリのシャードID
+        """
+        shard_ids = [self.shard_for(entry["PartitionKey"]) for entry in entries]
+        usage: Dict[str, List[int]] = {}
+        for shard_id, entry in zip(shard_ids, entries, strict=True):
+            counts = usage.setdefault(shard_id, [0, 0])
+            counts[0] += 1
+            counts[1] += len(entry["Data"]) + len(entry["PartitionKey"].encode("utf-8"))
+        now = self._clock()
+        delay = 0.0
+        for shard_id, (records, size) in usage.items():
+            buckets = self._bucket(shard_id)
+            delay = max(
+                delay,
+                buckets.records.reserve(records, now),
+                buckets.bytes.reserve(size, now),
+            )
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return shard_ids
+
+    def record_results(
+        self, shard_ids: List[str], results: List[Dict[str, Any]]
+    ) -> int:
+        """
+        PutRecords の結果からシャードごとの上限を調整する
+
+        Args:
+            shard_ids (List[str]): 各エントリのシャードID（acquire の戻り値）
+            results (List[Dict[str, Any]]): PutRecords の Records
+
+        Returns:
+            int: スロットリングされたレコード数
+        """
+        throttled: Dict[str, int] = {}
+        succeeded = set()
+        for shard_id, result in zip(shard_ids, results, strict=True):
+            if result.get("ErrorCode") == THROTTLED:
+                throttled[shard_id] = throttled.get(shard_id, 0) + 1
+            elif "ErrorCode" not in result:
+                succeeded.add(shard_id)
+        for shard_id, count in throttled.items():
+            buckets = self._bucket(shard_id)
+            buckets.records.decrease(self._decrease)
+            buckets.bytes.decrease(self._decrease)
+            THROTTLED_RECORDS.labels(self.stream_name, shard_id).inc(count)
+        for shard_id in succeeded.difference(throttled):
+            buckets = self._bucket(shard_id)
+            buckets.records.increase(self._records_per_second * self._increase)
+            buckets.bytes.increase(self._bytes_per_second * self._increase)
+        return sum(throttled.values())
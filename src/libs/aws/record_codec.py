@@ -0,0 +1,373 @@
+import json
+import math
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 任意の依存
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 任意の依存
+    zstandard = None
+
+RecordEncoder = Callable[[Dict[str, Any]], bytes]
+
+RECORD_FORMATS: Tuple[str, ...] = ("json", "msgpack", "struct")
+RECORD_COMPRESSIONS: Tuple[str, ...] = ("none", "zlib", "zstd")
+
+# ヘッダ（マジック、スキーマのバージョン、形式 | 圧縮 << 4）。
+# マジックは JSON の先頭（"{"）とも msgpack の map とも重ならない値にする。
+HEADER = struct.Struct("<BBB")
+MAGIC = 0xC1
+SCHEMA_VERSION = 1
+
+# struct 形式のローソク足（開始時刻のUNIX秒とUTCオフセットの分、価格・数量・件数・金額、revision）
+CANDLE_FIELDS: Tuple[str, ...] = (
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "buy_volume",
+    "sell_volume",
+    "count",
+    "buy_count",
+    "sell_count",
+    "value",
+    "buy_value",
+    "sell_value",
+    "revision",
+)
+CANDLE = struct.Struct("<qh7d3I3dI")
+_CANDLE_KEYS = frozenset(("timestamp",) + CANDLE_FIELDS)
+_FLOAT_FIELDS = frozenset(
+    name for name in CANDLE_FIELDS if "count" not in name and name != "revision"
+)
+
+# zlib / zstd の辞書。1件ごとに圧縮するため、共通するフィールド名を辞書で補う。
+# 内容を変える場合は SCHEMA_VERSION を上げる（復元に同じ辞書が必要なため）。
+DICTIONARY = json.dumps(
+    {
+        "timestamp": "2024-07-20T12:00:00+09:00",
+        **{name: 0.0 for name in CANDLE_FIELDS},
+        "exchange": "",
+        "contract": "",
+        "symbol": "",
+    },
+    separators=(",", ":"),
+).encode("utf-8")
+
+_FORMAT_IDS = {name: i for i, name in enumerate(RECORD_FORMATS)}
+_COMPRESSION_IDS = {name: i for i, name in enumerate(RECORD_COMPRESSIONS)}
+_dumps = json.JSONEncoder(separators=(",", ":")).encode
+_zones: Dict[int, timezone] = {}
+
+
+def _json_encoder(tags: Dict[str, str]) -> RecordEncoder:
+    fragment = _dumps(tags)[1:-1].encode("utf-8")
+
+    def encode(record: Dict[str, Any]) -> bytes:
+        body = _dumps(record).encode("utf-8")
+        if not fragment:
+            return body
+        if len(body) == 2:
+            return b"{" + fragment + b"}"
+        return b"".join((body[:-1], b",", fragment, b"}"))
+
+    return encode
+
+
+def _msgpack_map_header(size: int) -> bytes:
+    if size < 16:
+        return bytes((0x80 | size,))
+    if size < 0x10000:
+        return b"\xde" + size.to_bytes(2, "big")
+    return b"\xdf" + size.to_bytes(4, "big")
+
+
+def _msgpack_encoder(tags: Dict[str, str]) -> RecordEncoder:
+    packb = msgpack.packb
+    packed_tags = packb(tags)
+    tag_count = len(tags)
+    tag_body = packed_tags[len(_msgpack_map_header(tag_count)) :]
+
+    def encode(record: Dict[str, Any]) -> bytes:
+        size = len(record)
+        body = packb(record)[len(_msgpack_map_header(size)) :]
+        return b"".join((_msgpack_map_header(size + tag_count), body, tag_body))
+
+    return encode
+
+
+def _struct_encoder(tags: Dict[str, str]) -> Optional[RecordEncoder]:
+    encoded = [
+        (key.encode("utf-8"), str(value).encode("utf-8")) for key, value in tags.items()
+    ]
+    if len(encoded) > 255 or any(len(k) > 255 or len(v) > 255 for k, v in encoded):
+        return None
+    tag_block = bytes((len(encoded),)) + b"".join(
+        bytes((len(k),)) + k + bytes((len(v),)) + v for k, v in encoded
+    )
+    pack = CANDLE.pack
+    nan = math.nan
+
+    def encode(record: Dict[str, Any]) -> Optional[bytes]:
+        if not _CANDLE_KEYS <= record.keys():
+            return None
+        try:
+            start = datetime.fromisoformat(record["timestamp"])
+        except (TypeError, ValueError):
+            return None
+        offset = start.utcoffset()
+        if offset is None or start.microsecond or offset.seconds % 60:
+            return None
+        values = [record[name] for name in CANDLE_FIELDS]
+        for i, value in enumerate(values):
+            if value is None:
+                values[i] = nan
+        try:
+            fixed = pack(
+                int(start.timestamp()), offset // timedelta(minutes=1), *values
+            )
+        except struct.error:
+            return None
+        extras = {
+            key: value for key, value in record.items() if key not in _CANDLE_KEYS
+        }
+        rest = _dumps(extras).encode("utf-8") if extras else b""
+        return b"".join((fixed, tag_block, rest))
+
+    return encode
+
+
+def _decode_struct(body: bytes) -> Dict[str, Any]:
+    seconds, minutes, *values = CANDLE.unpack_from(body)
+    zone = _zones.get(minutes)
+    if zone is None:
+        zone = _zones[minutes] = timezone(timedelta(minutes=minutes))
+    record: Dict[str, Any] = {
+        "timestamp": datetime.fromtimestamp(seconds, zone).isoformat()
+    }
+    for name, value in zip(CANDLE_FIELDS, values, strict=True):
+        record[name] = None if name in _FLOAT_FIELDS and math.isnan(value) else value
+    offset = CANDLE.size
+    tags = {}
+    count = body[offset]
+    offset += 1
+    for _ in range(count):
+        length = body[offset]
+        key = body[offset + 1 : offset + 1 + length].decode("utf-8")
+        offset += 1 + length
+        length = body[offset]
+        tags[key] = body[offset + 1 : offset + 1 + length].decode("utf-8")
+        offset += 1 + length
+    if offset < len(body):
+        record.update(json.loads(body[offset:]))
+    record.update(tags)
+    return record
+
+
+def _zlib_compressor(level: Optional[int]) -> Callable[[bytes], bytes]:
+    # 生の deflate（wbits=-15）でヘッダとチェックサムを省く
+    base = zlib.compressobj(
+        zlib.Z_DEFAULT_COMPRESSION if level is None else level,
+        zlib.DEFLATED,
+        -15,
+        zdict=DICTIONARY,
+    )
+
+    def compress(data: bytes) -> bytes:
+        compressor = base.copy()
+        return compressor.compress(data) + compressor.flush()
+
+    return compress
+
+
+def _zlib_decompress(data: bytes) -> bytes:
+    decompressor = zlib.decompressobj(-15, zdict=DICTIONARY)
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+def _zstd_dictionary() -> Any:
+    return zstandard.ZstdCompressionDict(
+        DICTIONARY, dict_type=zstandard.DICT_TYPE_RAWCONTENT
+    )
+
+
+def _zstd_compressor(level: Optional[int]) -> Callable[[bytes], bytes]:
+    return zstandard.ZstdCompressor(
+        level=3 if level is None else level,
+        dict_data=_zstd_dictionary(),
+        write_checksum=False,
+        write_dict_id=False,
+    ).compress
+
+
+_zstd_decompressor: Optional[Any] = None
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    global _zstd_decompressor
+    if zstandard is None:
+        raise ValueError("zstd compressed record requires zstandard")
+    if _zstd_decompressor is None:
+        _zstd_decompressor = zstandard.ZstdDecompressor(dict_data=_zstd_dictionary())
+    return _zstd_decompressor.decompress(data)
+
+
+def decode_record(data: bytes) -> Dict[str, Any]:
+    """
+    RecordCodec で書き込んだレコードを辞書に戻す
+
+    ヘッダのない JSON（json 形式で圧縮なし、または以前の形式）もそのまま読める。
+
+    Args:
+        data (bytes): Kinesis のレコードの Data
+
+    Returns:
+        Dict[str, Any]: タグを含むレコード
+
+    Raises:
+        ValueError: 未知のバージョン・形式・圧縮の場合、または必要な依存がない場合
+    """
+    if not data or data[0] != MAGIC:
+        return json.loads(data)
+    _, version, flags = HEADER.unpack_from(data)
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported record schema version: {version}")
+    format_id, compression_id = flags & 0x0F, flags >> 4
+    if format_id >= len(RECORD_FORMATS) or compression_id >= len(RECORD_COMPRESSIONS):
+        raise ValueError(f"Unsupported record flags: {flags:#04x}")
+    body = data[HEADER.size :]
+    compression = RECORD_COMPRESSIONS[compression_id]
+    if compression == "zlib":
+        body = _zlib_decompress(body)
+    elif compression == "zstd":
+        body = _zstd_decompress(body)
+
+    record_format = RECORD_FORMATS[format_id]
+    if record_format == "struct":
+        return _decode_struct(body)
+    if record_format == "msgpack":
+        if msgpack is None:
+            raise ValueError("msgpack record requires msgpack")
+        return msgpack.unpackb(body)
+    return json.loads(body)
+
+
+class RecordCodec:
+    """
+    Kinesis に書き込むレコードの形式
+
+    - ``json``: JSON。タグは銘柄ごとに1度だけエンコードした断片を連結する
+    - ``msgpack``: MessagePack（msgpack が必要）
+    - ``struct``: ローソク足の固定レイアウト（float64・uint32）にタグと
+      その他のフィールド（JSON）を続ける。ローソク足でないレコードは json で書き込む
+
+    圧縮（zlib、zstd）は1件ごとに、共通するフィールド名の辞書を使って行い、
+    小さくならない場合は圧縮しない。json で圧縮しない場合はヘッダを付けず、
+    以前と同じく JSON のみを書き込む。それ以外は先頭にマジック・スキーマの
+    バージョン・形式と圧縮のヘッダ（3バイト）を付ける。読み出しは decode_record で、
+    書き込んだときの形式によらず元の辞書に戻す。
+
+    Attributes:
+        record_format (str): レコードの形式（RECORD_FORMATS のいずれか）
+        compression (str): 圧縮方式（RECORD_COMPRESSIONS のいずれか）
+        level (Optional[int]): 圧縮レベル。None の場合は各方式の既定値
+    """
+
+    def __init__(
+        self,
+        record_format: str = "json",
+        compression: str = "none",
+        level: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            record_format (str, optional): レコードの形式（RECORD_FORMATS のいずれか）
+            compression (str, optional): 圧縮方式（RECORD_COMPRESSIONS のいずれか）
+            level (Optional[int], optional): 圧縮レベル
+
+        Raises:
+            ValueError: サポートされていない、またはインストールされていない形式・圧縮が指定された場合
+        """
+        if record_format not in RECORD_FORMATS:
+            raise ValueError(f"Unsupported record format: {record_format}")
+        if compression not in RECORD_COMPRESSIONS:
+            raise ValueError(f"Unsupported record compression: {compression}")
+        if record_format == "msgpack" and msgpack is None:
+            raise ValueError("Record format is not installed: msgpack")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("Record compression is not installed: zstd (zstandard)")
+        self.record_format = record_format
+        self.compression = compression
+        self.level = level
+        self._compress: Optional[Callable[[bytes], bytes]] = None
+        if compression == "zlib":
+            self._compress = _zlib_compressor(level)
+        elif compression == "zstd":
+            self._compress = _zstd_compressor(level)
+
+    def _header(self, record_format: str, compression: str) -> bytes:
+        flags = _FORMAT_IDS[record_format] | _COMPRESSION_IDS[compression] << 4
+        return HEADER.pack(MAGIC, SCHEMA_VERSION, flags)
+
+    def encoder(self, tags: Dict[str, str]) -> RecordEncoder:
+        """
+        銘柄のタグをあらかじめエンコードし、レコードをバイト列に変換する関数を返す
+
+        レコード自体は変更しない（タグは出力にのみ追加する）。
+
+        Args:
+            tags (Dict[str, str]): レコードに追加するタグ
+
+        Returns:
+            RecordEncoder: レコードを受け取り、Kinesis の Data を返す関数
+        """
+        json_encode = _json_encoder(tags)
+        compress = self._compress
+        if self.record_format == "json" and compress is None:
+            return json_encode
+
+        json_header = self._header("json", "none")
+        if self.record_format == "msgpack":
+            primary = _msgpack_encoder(tags)
+        elif self.record_format == "struct":
+            primary = _struct_encoder(tags)
+        else:
+            primary = json_encode
+        primary_header = self._header(self.record_format, "none")
+        compressed_headers = (
+            self._header(self.record_format, self.compression),
+            self._header("json", self.compression),
+        )
+
+        def encode(record: Dict[str, Any]) -> bytes:
+            body = primary(record) if primary is not None else None
+            is_primary = body is not None
+            if not is_primary:
+                body = json_encode(record)
+            if compress is not None:
+                packed = compress(body)
+                if len(packed) < len(body):
+                    return compressed_headers[0 if is_primary else 1] + packed
+            return (primary_header if is_primary else json_header) + body
+
+        return encode
+
+    def decode(self, data: bytes) -> Dict[str, Any]:
+        """
+        レコードを辞書に戻す（decode_record と同じ）
+
+        Args:
+            data (bytes): Kinesis のレコードの Data
+
+        Returns:
+            Dict[str, Any]: タグを含むレコード
+        """
+        return decode_record(data)
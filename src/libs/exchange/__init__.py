@@ -1,8 +1,9 @@
 from typing import Tuple
 
-from .exchange import Exchange, load_exchange
+from .exchange import Exchange, load_exchange, load_exchanges
 
 __all__: Tuple[str, ...] = (
     "Exchange",
     "load_exchange",
+    "load_exchanges",
 )
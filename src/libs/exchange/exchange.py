@@ -1,29 +1,177 @@
 from __future__ import annotations
 
+import asyncio
 import importlib
 from abc import ABC, abstractmethod
 from argparse import Namespace
-from typing import Any, Dict, List
+from time import monotonic, perf_counter, time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Coroutine,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
 
 from aiohttp import ClientWebSocketResponse
 from pybotters import Client, WebSocketQueue
+from pybotters.ws import WebSocketApp
 
-from src.libs.utils import add_logging, trace
+from src.libs.utils import Instrument, TradeBatch, add_logging, trace
+from src.libs.utils.health_check import HealthCheck, InstrumentHealth
+from src.libs.utils.json_decoder import JsonDecoder, load_json_decoder
+from src.libs.utils.metrics import (
+    INSTRUMENT_LABELS,
+    PIPELINE_LATENCY,
+    STAGE_EXCHANGE,
+    Counter,
+    Histogram,
+    instrument_labels,
+)
+from src.libs.utils.orderbook import OrderBook
+
+if TYPE_CHECKING:
+    from src.libs.replay.capture import FrameRecorder
+
+Handler = Callable[[Any], Any]
+
+FRAMES = Counter(
+    "collector_frames_total", "WebSocket frames received", ("exchange", "contract")
+)
+DECODE_ERRORS = Counter(
+    "collector_decode_errors_total",
+    "WebSocket frames that failed to decode",
+    ("exchange", "contract"),
+)
+MESSAGES = Counter(
+    "collector_messages_total",
+    "Messages dispatched to a topic handler",
+    INSTRUMENT_LABELS,
+)
+TRADES = Counter(
+    "collector_trades_total", "Trades produced by topic handlers", INSTRUMENT_LABELS
+)
+DROPPED_MESSAGES = Counter(
+    "collector_dropped_messages_total",
+    "Handler results dropped because the output queue was full",
+    INSTRUMENT_LABELS,
+)
+MESSAGE_SECONDS = Histogram(
+    "collector_message_seconds",
+    "Time spent handling a dispatched message",
+    INSTRUMENT_LABELS,
+)
+
+
+class _RouteMetrics:
+    """
+    ルートごとのメトリクスと最終時刻（ディスパッチのたびにラベルを引かないよう保持する）
+    """
+
+    __slots__ = ("messages", "trades", "dropped", "seconds", "latency", "health")
+
+    def __init__(self, labels: Tuple[str, ...], health: InstrumentHealth) -> None:
+        self.messages = MESSAGES.labels(*labels)
+        self.trades = TRADES.labels(*labels)
+        self.dropped = DROPPED_MESSAGES.labels(*labels)
+        self.seconds = MESSAGE_SECONDS.labels(*labels)
+        self.latency = PIPELINE_LATENCY.labels(*labels, STAGE_EXCHANGE)
+        self.health = health
 
 
 @add_logging
 class Exchange(ABC):
-    def __init__(self, contract: str, symbol: str, queue_out: WebSocketQueue) -> None:
+    """
+    取引所のWebSocketクライアントの基底クラス
+
+    1つの接続で複数シンボルを購読し、受信したメッセージはトピックをキーとする
+    ルーティングテーブルで各シンボルのハンドラとキューに振り分ける。
+    フレームは文字列またはバイト列のまま受け取り、json_decoder で指定した
+    デコーダでデコードしてから on_message に渡す。
+    orderbook を有効にすると板のトピックも購読し、シンボルごとの OrderBook を
+    更新する。板のハンドラは出力キューには何も送らない。
+    受信したフレーム数と、トピックごとのメッセージ数・約定数・処理時間を
+    メトリクスに記録する。フレームと約定の受信時刻は銘柄ごとの InstrumentHealth に
+    記録し、ヘルスチェックで無通信を検知する。
+    フレームの受信時刻（clock）は TradeBatch.received に記録し、メッセージ内の
+    最後の約定時刻からの経過を取引所側の遅延として記録する。
+    recorder を設定すると、受信したフレームを受信時刻・接続先とともに書き込む。
+    ws_base_url を設定すると、public_ws_url の代わりに ``{ws_base_url}/{ホスト}/{パス}``
+    に接続する（ローカルのシミュレータ向け）。書き込む接続先は public_ws_url のまま。
+
+    Attributes:
+        schema (Optional[type]): ``typed`` デコーダで使う msgspec の型（サブクラスで定義）
+        clock (Callable[[], float]): 受信時刻（UNIX秒）を返す関数
+        recorder (Optional[FrameRecorder]): 受信したフレームの書き込み先
+        ws_base_url (Optional[str]): 接続先を置き換えるWebSocketのURL
+        _contract (str): 最初に登録した銘柄の契約種別（接続先の決定に使う）
+        _symbol (str): 最初に登録したシンボル
+        _client (Optional[Client]): pybottersのクライアント（subscribe時に生成）
+        queue_out (WebSocketQueue): 最初に登録したシンボルの出力キュー
+        _routes (Dict[str, Tuple[Handler, WebSocketQueue, _RouteMetrics]]):
+            トピックとハンドラ・出力キュー・メトリクスの対応表
+        _healths (List[InstrumentHealth]): 購読している銘柄の最終時刻
+        _received (Optional[float]): 処理中のフレームの受信時刻（UNIX秒）
+        _decode (JsonDecoder): フレームのデコーダ
+        orderbooks (Dict[str, OrderBook]): 大文字のシンボルをキーとする板情報
+    """
+
+    schema: Optional[type] = None
+    recorder: Optional[FrameRecorder] = None
+    ws_base_url: Optional[str] = None
+
+    def __init__(
+        self,
+        contract: str,
+        symbol: str,
+        queue_out: WebSocketQueue,
+        json_decoder: str = "auto",
+        orderbook: bool = False,
+        clock: Optional[Callable[[], float]] = None,
+    ) -> None:
+        self.clock = clock or time
+        self._decode: JsonDecoder = load_json_decoder(json_decoder, self.schema)
         self._contract = contract
         self._symbol = symbol
-        self._client = Client()
+        self._client: Optional[Client] = None
+        self._ws: Optional[WebSocketApp] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._orderbook_enabled = orderbook
+        self.orderbooks: Dict[str, OrderBook] = {}
         self.queue_out = queue_out
+        self._symbols: List[str] = []
+        self._instruments: Dict[str, Instrument] = {}
+        self._routes: Dict[str, Tuple[Handler, WebSocketQueue, _RouteMetrics]] = {}
+        self._healths: List[InstrumentHealth] = []
+        self._received: Optional[float] = None
+        self._connection_labels: Optional[Tuple[str, str]] = None
+        self.add_symbol(symbol, queue_out)
 
-    @property
+    @classmethod
     @abstractmethod
-    def public_ws_url(self) -> str:
+    def public_ws_url_for(cls, contract: str) -> str:
+        """
+        契約種別の公開WebSocketの接続先を返す
+
+        インスタンスを生成せずに接続先を決められるよう、契約種別だけから求める。
+
+        Args:
+            contract (str): 契約種別
+
+        Returns:
+            str: 接続先のURL
+        """
         raise NotImplementedError
 
+    @property
+    def public_ws_url(self) -> str:
+        return self.public_ws_url_for(self._contract)
+
     @property
     @abstractmethod
     def private_ws_url(self) -> str:
@@ -34,12 +182,25 @@ class Exchange(ABC):
     def subscribe_message(self) -> Dict[str, Any] | List[Dict[str, Any]]:
         raise NotImplementedError
 
+    @abstractmethod
+    def _topics(self, symbol: str) -> Dict[str, Handler]:
+        """
+        シンボルについて購読するトピックとハンドラの対応表を返す
+
+        Args:
+            symbol (str): シンボル
+
+        Returns:
+            Dict[str, Handler]: トピックとハンドラの対応表
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def on_message(self, msg: Any, ws: ClientWebSocketResponse) -> None:
         raise NotImplementedError
 
     @abstractmethod
-    def _on_trade(self, msg: Any) -> List:
+    def _on_trade(self, msg: Any) -> TradeBatch:
         raise NotImplementedError
 
     @abstractmethod
@@ -47,25 +208,221 @@ class Exchange(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    def _on_orderbook(self, msg: Any) -> List:
+    def _on_orderbook(self, msg: Any) -> None:
         raise NotImplementedError
 
+    @property
+    def symbols(self) -> List[str]:
+        """
+        購読しているシンボルの一覧
+
+        Returns:
+            List[str]: シンボルの一覧
+        """
+        return list(self._symbols)
+
+    @property
+    def instruments(self) -> List[Instrument]:
+        """
+        購読している銘柄の一覧
+
+        Returns:
+            List[Instrument]: 銘柄の一覧
+        """
+        return [self._instruments[symbol] for symbol in self._symbols]
+
+    @property
+    def topics(self) -> List[str]:
+        """
+        購読しているトピックの一覧
+
+        Returns:
+            List[str]: トピックの一覧
+        """
+        return list(self._routes)
+
+    def add_symbol(
+        self,
+        symbol: str,
+        queue_out: WebSocketQueue,
+        instrument: Optional[Instrument] = None,
+    ) -> None:
+        """
+        同じ接続で購読するシンボルを追加する
+
+        subscribe より前に呼び出す必要がある。同じ接続先でも契約種別が異なる銘柄
+        （bitFlyer の spot と fx など）があるため、銘柄名・タグ・ヘルスチェックの
+        キーは接続の契約種別ではなく instrument から決める。
+
+        Args:
+            symbol (str): シンボル
+            queue_out (WebSocketQueue): シンボルの出力キュー
+            instrument (Optional[Instrument]): 設定の銘柄。省略時は接続の契約種別の銘柄
+        """
+        if instrument is None:
+            instrument = Instrument(type(self).__name__, self._contract, symbol)
+        if self._orderbook_enabled:
+            self.orderbooks[symbol.upper()] = OrderBook(symbol.upper())
+        self._instruments[symbol] = instrument
+        self._label_connection()
+        health = HealthCheck.instrument(instrument.name)
+        self._healths.append(health)
+        metrics = _RouteMetrics(instrument_labels(instrument.tags), health)
+        for topic, handler in self._topics(symbol).items():
+            self._routes[topic] = (handler, queue_out, metrics)
+        self._symbols.append(symbol)
+
+    def _label_connection(self) -> None:
+        """
+        接続単位のメトリクスのラベルを、接続で購読する銘柄の契約種別から決める
+
+        契約種別が複数ある場合は登録順に ``+`` で連結する（例: ``spot+fx``）。
+        """
+        contracts = dict.fromkeys(
+            instrument.contract.lower() for instrument in self._instruments.values()
+        )
+        labels = (type(self).__name__.lower(), "+".join(contracts))
+        previous = self._connection_labels
+        if labels == previous:
+            return
+        if previous is not None:
+            # subscribe より前に呼ばれるため、まだ値のない以前のラベルは残さない
+            for metric, child in (
+                (FRAMES, self._frames),
+                (DECODE_ERRORS, self._decode_errors),
+            ):
+                if child.get() == 0:
+                    metric.remove(*previous)
+        self._connection_labels = labels
+        self._frames = FRAMES.labels(*labels)
+        self._decode_errors = DECODE_ERRORS.labels(*labels)
+
+    def _dispatch(self, topic: str, payload: Any) -> None:
+        """
+        トピックに対応するハンドラで処理し、結果を出力キューに送る
+
+        Args:
+            topic (str): トピック
+            payload (Any): メッセージ本体
+        """
+        route = self._routes.get(topic)
+        if route is None:
+            return
+        handler, queue_out, metrics = route
+        start = perf_counter()
+        result = handler(payload)
+        if result:
+            metrics.trades.inc(len(result))
+            metrics.health.last_trade = monotonic()
+            if isinstance(result, TradeBatch):
+                received = self._received
+                result.received = received
+                if received is not None:
+                    metrics.latency.observe(received - result.timestamps[-1] / 1000)
+            try:
+                queue_out.put_nowait(result)
+            except asyncio.QueueFull:
+                metrics.dropped.inc()
+                self.logger.warning(
+                    f"Output queue for {topic} is full, message dropped"
+                )
+        metrics.messages.inc()
+        metrics.seconds.observe(perf_counter() - start)
+
+    def on_raw_message(self, data: str | bytes, ws: ClientWebSocketResponse) -> None:
+        """
+        受信したフレームをデコードし、on_message に渡す
+
+        Args:
+            data (str | bytes): 受信したフレーム
+            ws (ClientWebSocketResponse): WebSocketの接続
+        """
+        self._frames.inc()
+        self._received = self.clock()
+        if self.recorder is not None:
+            self.recorder.write(self._received, self.public_ws_url, data)
+        now = monotonic()
+        for health in self._healths:
+            health.last_frame = now
+        try:
+            msg = self._decode(data)
+        except ValueError:
+            if data not in ("ping", "pong"):
+                self._decode_errors.inc()
+                self.logger.warning(f"Failed to decode message: {data!r}")
+            return
+        self.on_message(msg, ws)
+
+    def _spawn(self, coro: Coroutine) -> None:
+        """
+        バックグラウンドのタスクを開始し、完了まで参照を保持する
+
+        Args:
+            coro (Coroutine): 実行するコルーチン
+        """
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _resubscribe(self, messages: List[Dict[str, Any]]) -> None:
+        """
+        現在の接続でメッセージを送信する（板の再同期で購読をやり直すため）
+
+        接続が切れている場合は何もしない。再接続時には subscribe_message が
+        送り直されるため、スナップショットも再送される。
+
+        Args:
+            messages (List[Dict[str, Any]]): 送信するメッセージ
+        """
+        ws = self._ws.current_ws if self._ws is not None else None
+        if ws is None or ws.closed:
+            return
+
+        async def send() -> None:
+            for message in messages:
+                await ws.send_json(message)
+
+        self._spawn(send())
+
+    @property
+    def ws_url(self) -> str:
+        """
+        接続するWebSocketのURL
+
+        Returns:
+            str: ws_base_url が設定されている場合は public_ws_url のホストとパスを
+                続けたURL、それ以外は public_ws_url
+        """
+        if self.ws_base_url is None:
+            return self.public_ws_url
+        return f"{self.ws_base_url.rstrip('/')}/{self.public_ws_url.split('://', 1)[1]}"
+
     async def subscribe(self) -> None:
+        self._client = Client()
         self._ws = await self._client.ws_connect(
-            url=self.public_ws_url,
+            url=self.ws_url,
             send_json=self.subscribe_message,
-            hdlr_json=self.on_message,
+            hdlr_str=self.on_raw_message,
+            hdlr_bytes=self.on_raw_message,
         )
         await self._ws.wait()
 
 
 @trace
-def load_exchange(args: Namespace, wsqueue: WebSocketQueue) -> Exchange:
+def load_exchange(
+    args: Namespace | Instrument,
+    wsqueue: WebSocketQueue,
+    json_decoder: str = "auto",
+    orderbook: bool = False,
+) -> Exchange:
     """指定された取引所のモジュールとクラスを動的にロードし、インスタンスを返却
 
     Args:
-        args (Namespace): コマンドライン引数をパースしたNamespaceオブジェクト
-        `exchange`,`contract`,`symbol`の属性が必要
+        args (Namespace | Instrument): コマンドライン引数をパースしたNamespaceオブジェクト、
+        または銘柄。`exchange`,`contract`,`symbol`の属性が必要
+        wsqueue (WebSocketQueue): 出力キュー
+        json_decoder (str, optional): フレームのデコーダの名前
+        orderbook (bool, optional): 板情報を購読する場合は True
 
     Returns:
         Exchange: 指定された取引所のExchangeクラスのインスタンス
@@ -76,11 +433,68 @@ def load_exchange(args: Namespace, wsqueue: WebSocketQueue) -> Exchange:
         ValueError: その他の予期しないエラーが発生した場合
     """
 
+    exchange_class = _exchange_class(args.exchange)
+    return exchange_class(args.contract, args.symbol, wsqueue, json_decoder, orderbook)
+
+
+def _exchange_class(exchange: str) -> Type[Exchange]:
+    """
+    取引所名からExchangeクラスを動的にロードする
+
+    Args:
+        exchange (str): 取引所名
+
+    Returns:
+        Type[Exchange]: 取引所のExchangeクラス
+    """
     try:
         exchange_module = importlib.import_module(
-            f"src.libs.exchange.models.{args.exchange.lower()}"
+            f"src.libs.exchange.models.{exchange.lower()}"
         )
-        exchange_class = getattr(exchange_module, f"{args.exchange.capitalize()}")
-        return exchange_class(args.contract, args.symbol, wsqueue)
+        return getattr(exchange_module, f"{exchange.capitalize()}")
     except Exception:
         raise
+
+
+@trace
+def load_exchanges(
+    instruments: List[Instrument],
+    wsqueues: Dict[str, WebSocketQueue],
+    json_decoder: str = "auto",
+    orderbook: bool = False,
+) -> List[Exchange]:
+    """銘柄をWebSocketの接続先ごとにまとめ、接続ごとに1つのインスタンスを返却
+
+    Args:
+        instruments (List[Instrument]): 銘柄の一覧
+        wsqueues (Dict[str, WebSocketQueue]): 銘柄名をキーとする出力キュー
+        json_decoder (str, optional): フレームのデコーダの名前
+        orderbook (bool, optional): 板情報を購読する場合は True
+
+    Returns:
+        List[Exchange]: 接続先ごとのExchangeクラスのインスタンス
+    """
+    # インスタンスの生成は板・メトリクス・ヘルスチェックを登録するため、
+    # 先に接続先ごとにまとめてから接続ごとに1つだけ生成する
+    groups: Dict[Tuple[Type[Exchange], str], List[Instrument]] = {}
+    for instrument in instruments:
+        exchange_class = _exchange_class(instrument.exchange)
+        key = (exchange_class, exchange_class.public_ws_url_for(instrument.contract))
+        groups.setdefault(key, []).append(instrument)
+
+    exchanges: List[Exchange] = []
+    for (exchange_class, _), members in groups.items():
+        first, *rest = members
+        exchange = exchange_class(
+            first.contract,
+            first.symbol,
+            wsqueues[first.name],
+            json_decoder,
+            orderbook,
+        )
+        for instrument in rest:
+            exchange.add_symbol(
+                instrument.symbol, wsqueues[instrument.name], instrument
+            )
+        exchanges.append(exchange)
+    return exchanges
@@ -1,26 +1,78 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
 from pybotters import WebSocketQueue
 from pybotters.ws import ClientWebSocketResponse
 
-from src.libs.utils import add_logging
+from src.libs.utils import TradeBatch, add_logging
+from src.libs.utils.trade_batch import BUY, SELL
 
-from ..exchange import Exchange
+from ..exchange import Exchange, Handler
+from ..schema import Frame
+
+DEPTH_SNAPSHOT_LIMIT = 1000
+RESYNC_BACKOFF = 1.0
+
+if Frame is not None:
+
+    class BinanceTrade(Frame, tag_field="e", tag="trade"):
+        T: int
+        p: str
+        q: str
+        m: bool
+
+    class BinanceDepth(Frame, tag_field="e", tag="depthUpdate"):
+        E: int
+        s: str
+        U: int
+        u: int
+        b: List[Tuple[str, str]]
+        a: List[Tuple[str, str]]
+        pu: Optional[int] = None
+
+    class BinanceMessage(Frame):
+        stream: Optional[str] = None
+        data: Union[BinanceTrade, BinanceDepth, None] = None
+
+else:
+    BinanceMessage = None
 
 
 @add_logging
 class Binance(Exchange):
-    def __init__(self, contract: str, symbol: str, queue_out: WebSocketQueue) -> None:
-        super().__init__(contract, symbol, queue_out)
+    schema = BinanceMessage
+
+    def __init__(
+        self,
+        contract: str,
+        symbol: str,
+        queue_out: WebSocketQueue,
+        json_decoder: str = "auto",
+        orderbook: bool = False,
+        clock: Optional[Callable[[], float]] = None,
+    ) -> None:
+        # 板のスナップショットを取得するまでの差分
+        self._depth_buffers: Dict[str, List[Any]] = {}
+        self._resyncing: Set[str] = set()
+        self._bridging: Dict[str, bool] = {}
+        super().__init__(contract, symbol, queue_out, json_decoder, orderbook, clock)
+
+    @classmethod
+    def public_ws_url_for(cls, contract: str) -> str:
+        if contract == "spot":
+            return "wss://stream.binance.com:9443/stream"
+        elif contract == "usdt_perpetual":
+            return "wss://fstream.binance.com/stream"
+        return ""
 
     @property
-    def public_ws_url(self) -> str:
+    def depth_snapshot_url(self) -> str:
         if self._contract == "spot":
-            return "wss://stream.binance.com:9443/stream"
+            return "https://api.binance.com/api/v3/depth"
         elif self._contract == "usdt_perpetual":
-            return "wss://fstream.binance.com/stream"
+            return "https://fapi.binance.com/fapi/v1/depth"
         return ""
 
     @property
@@ -30,34 +82,32 @@ class Binance(Exchange):
 
     @property
     def subscribe_message(self) -> Dict[str, Any]:
-        symbol_lower = self._symbol.lower()
-
+        # Combined streams: 1接続で複数ストリームを購読する
         return {
             "method": "SUBSCRIBE",
-            "params": [
-                f"{symbol_lower}@trade",
-                # f"{symbol_lower}@ticker",
-                # f"{symbol_lower}@depth",
-            ],
+            "params": self.topics,
             "id": 1,
         }
 
+    def _topics(self, symbol: str) -> Dict[str, Handler]:
+        symbol_lower = symbol.lower()
+        topics: Dict[str, Handler] = {
+            f"{symbol_lower}@trade": self._on_trade,
+            # f"{symbol_lower}@ticker": self._on_ticker,
+        }
+        if self._orderbook_enabled:
+            topics[f"{symbol_lower}@depth@100ms"] = self._on_orderbook
+        return topics
+
     def on_message(self, msg: Any, ws: ClientWebSocketResponse) -> None:
         """WebSocket API > Market data requests
         - https://binance-docs.github.io/apidocs/websocket_api/en/#recent-trades  # noqa: E501
         - https://binance-docs.github.io/apidocs/websocket_api/en/#24hr-ticker-price-change-statistics  # noqa: E501
         """
         if "stream" in msg:
-            topic: str = msg["stream"]
-            if topic.endswith("@trade"):
-                self.queue_out.put_nowait(self._on_trade(msg["data"]))
-            elif topic.endswith("@ticker"):
-                self.queue_out.put_nowait(self._on_ticker(msg["data"]))
-            elif topic.endswith("@depth"):
-                self.queue_out.put_nowait(self._on_ticker(msg["data"]))
-        return {}
-
-    def _on_trade(self, msg: Any) -> List:
+            self._dispatch(msg["stream"], msg["data"])
+
+    def _on_trade(self, msg: Any) -> TradeBatch:
         """
         {
             'stream': 'btcusdt@trade',
@@ -74,19 +124,153 @@ class Binance(Exchange):
             }
         }
         """
-        return [
-            {
-                "timestamp": int(msg["T"]),
-                "side": "BUY" if msg["m"] else "SELL",
-                "price": float(msg["p"]),
-                "size": float(msg["p"]),
-            }
-        ]
+        trades = TradeBatch()
+        # m: 買い手がメイカーの場合は売りのテイカー約定
+        trades.append(
+            int(msg["T"]),
+            float(msg["p"]),
+            float(msg["q"]),
+            SELL if msg["m"] else BUY,
+        )
+        return trades
 
     def _on_ticker(self, msg: Any) -> List:
         # TODO: tickeメッセージの処理を実装
         return []
 
-    def _on_orderbook(self, msg: Any) -> List[Dict[str, Any]]:
-        # TODO: Orderbookメッセージの処理を実装
-        return []
+    def _on_orderbook(self, msg: Any) -> None:
+        """
+        {
+            'e': 'depthUpdate',
+            'E': 1721554806084,
+            's': 'BTCUSDT',
+            'U': 157,
+            'u': 160,
+            'pu': 149,
+            'b': [['66913.25', '0.5']],
+            'a': [['66913.26', '0']]
+        }
+
+        ローカル板の管理手順
+        - https://binance-docs.github.io/apidocs/spot/en/#how-to-manage-a-local-order-book-correctly  # noqa: E501
+        - https://binance-docs.github.io/apidocs/futures/en/#how-to-manage-a-local-order-book-correctly  # noqa: E501
+
+        同期前と再同期中の差分はバッファに溜め、RESTのスナップショットを取得してから
+        適用する。同期後は、先物は pu、現物は U が前回の u に続いているかで欠落を検知する。
+        """
+        symbol = msg["s"]
+        book = self.orderbooks[symbol]
+        if not book.is_synced:
+            self._depth_buffers.setdefault(symbol, []).append(msg)
+            self._start_resync(symbol)
+            return
+        if not self._apply_depth(symbol, msg):
+            self.logger.warning(
+                f"Orderbook gap detected for {symbol}: {book.sequence} -> {msg['U']}"
+            )
+            book.invalidate()
+            self._depth_buffers[symbol] = [msg]
+            self._start_resync(symbol)
+
+    def _apply_depth(self, symbol: str, msg: Any) -> bool:
+        """
+        差分を板に適用する
+
+        Args:
+            symbol (str): 大文字のシンボル
+            msg (Any): depthUpdate イベント
+
+        Returns:
+            bool: 適用した、またはスナップショットに含まれるため読み飛ばした場合は True、
+                欠落を検知した場合は False
+        """
+        book = self.orderbooks[symbol]
+        last_update_id = book.sequence
+        if msg["u"] <= last_update_id:
+            return True
+        if self._bridging.get(symbol, False):
+            # スナップショット後の最初の差分は lastUpdateId を跨いでいる必要がある
+            if msg["U"] > last_update_id + 1:
+                return False
+            self._bridging[symbol] = False
+        elif "pu" in msg:
+            if msg["pu"] != last_update_id:
+                return False
+        elif msg["U"] != last_update_id + 1:
+            return False
+        book.apply_delta(
+            [(float(price), float(size)) for price, size in msg["b"]],
+            [(float(price), float(size)) for price, size in msg["a"]],
+            msg["u"],
+            msg["E"],
+        )
+        return True
+
+    def _start_resync(self, symbol: str) -> None:
+        """
+        スナップショットの取得を開始する（取得中の場合は何もしない）
+
+        Args:
+            symbol (str): 大文字のシンボル
+        """
+        if symbol in self._resyncing:
+            return
+        self._resyncing.add(symbol)
+        self._spawn(self._resync(symbol))
+
+    async def _resync(self, symbol: str) -> None:
+        """
+        RESTのスナップショットで板を初期化し、バッファの差分を適用する
+
+        差分がスナップショットに繋がらない場合は、スナップショットを取り直す。
+
+        Args:
+            symbol (str): 大文字のシンボル
+        """
+        book = self.orderbooks[symbol]
+        try:
+            while not book.is_synced:
+                try:
+                    snapshot = await self._fetch_depth_snapshot(symbol)
+                except Exception as e:
+                    self.logger.error(
+                        f"Failed to fetch depth snapshot for {symbol}: {e}"
+                    )
+                    await asyncio.sleep(RESYNC_BACKOFF)
+                    continue
+
+                book.apply_snapshot(
+                    [(float(price), float(size)) for price, size in snapshot["bids"]],
+                    [(float(price), float(size)) for price, size in snapshot["asks"]],
+                    snapshot["lastUpdateId"],
+                )
+                self._bridging[symbol] = True
+                buffer = self._depth_buffers.pop(symbol, [])
+                for msg in buffer:
+                    if not self._apply_depth(symbol, msg):
+                        self.logger.warning(
+                            f"Depth snapshot for {symbol} is stale, retrying"
+                        )
+                        book.invalidate()
+                        self._depth_buffers[symbol] = []
+                        await asyncio.sleep(RESYNC_BACKOFF)
+                        break
+        finally:
+            self._resyncing.discard(symbol)
+
+    async def _fetch_depth_snapshot(self, symbol: str) -> Dict[str, Any]:
+        """
+        RESTで板のスナップショットを取得する
+
+        Args:
+            symbol (str): 大文字のシンボル
+
+        Returns:
+            Dict[str, Any]: lastUpdateId, bids, asks を含むスナップショット
+        """
+        result = await self._client.fetch(
+            "GET",
+            self.depth_snapshot_url,
+            params={"symbol": symbol, "limit": str(DEPTH_SNAPSHOT_LIMIT)},
+        )
+        return result.data
@@ -1,23 +1,57 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional, Union
 
 from pybotters import WebSocketQueue
 from pybotters.ws import ClientWebSocketResponse
 
-from src.libs.utils import add_logging
+from src.libs.utils import TradeBatch, add_logging
+from src.libs.utils.timestamp import TimestampParser
+from src.libs.utils.trade_batch import SIDE_FLAGS, UNKNOWN
 
-from ..exchange import Exchange
+from ..exchange import Exchange, Handler
+from ..schema import Frame
+
+BOARD_SNAPSHOT_CHANNEL = "lightning_board_snapshot_"
+BOARD_CHANNEL = "lightning_board_"
+
+if Frame is not None:
+
+    class BitflyerExecution(Frame):
+        side: str
+        price: float
+        size: float
+        exec_date: str
+
+    class BitflyerParams(Frame):
+        channel: str
+        message: Union[List[BitflyerExecution], Dict[str, Any]]
+
+    class BitflyerMessage(Frame):
+        params: Optional[BitflyerParams] = None
+
+else:
+    BitflyerMessage = None
 
 
 @add_logging
 class Bitflyer(Exchange):
-    def __init__(self, contract: str, symbol: str, queue_out: WebSocketQueue) -> None:
-        super().__init__(contract, symbol, queue_out)
+    schema = BitflyerMessage
 
-    @property
-    def public_ws_url(self) -> str:
+    def __init__(
+        self,
+        contract: str,
+        symbol: str,
+        queue_out: WebSocketQueue,
+        json_decoder: str = "auto",
+        orderbook: bool = False,
+        clock: Optional[Callable[[], float]] = None,
+    ) -> None:
+        self._parse_timestamp = TimestampParser()
+        super().__init__(contract, symbol, queue_out, json_decoder, orderbook, clock)
+
+    @classmethod
+    def public_ws_url_for(cls, contract: str) -> str:
         return "wss://ws.lightstream.bitflyer.com/json-rpc"
 
     @property
@@ -27,38 +61,37 @@ class Bitflyer(Exchange):
 
     @property
     def subscribe_message(self) -> List[Dict[str, Any]]:
-        symbol_upper = self._symbol.upper()
-        channels = [
-            "lightning_executions",
-            # "lightning_ticker",
-            # "lightning_board_snapshot",
-            # "lightning_board"
-        ]
         return [
             {
                 "method": "subscribe",
-                "params": {"channel": f"{channel}_{symbol_upper}"},
+                "params": {"channel": channel},
                 "id": idx + 1,
             }
-            for idx, channel in enumerate(channels)
+            for idx, channel in enumerate(self.topics)
         ]
 
+    def _topics(self, symbol: str) -> Dict[str, Handler]:
+        symbol_upper = symbol.upper()
+        topics: Dict[str, Handler] = {
+            f"lightning_executions_{symbol_upper}": self._on_trade,
+            # f"lightning_ticker_{symbol_upper}": self._on_ticker,
+        }
+        if self._orderbook_enabled:
+            topics[f"{BOARD_SNAPSHOT_CHANNEL}{symbol_upper}"] = (
+                self._on_orderbook_snapshot
+            )
+            topics[f"{BOARD_CHANNEL}{symbol_upper}"] = self._on_orderbook
+        return topics
+
     def on_message(self, msg: Any, ws: ClientWebSocketResponse) -> None:
         if "params" in msg:
-            topic: str = msg["params"]["channel"]
-            message: str = msg["params"]["message"]
-            if topic.startswith("lightning_executions"):
-                self.queue_out.put_nowait(self._on_trade(message))
-            elif topic.startswith("lightning_ticker"):
-                self.queue_out.put_nowait(self._on_ticker(message))
-            elif topic.startswith("lightning_board_snapshot"):
-                self.queue_out.put_nowait(self._on_orderbook_snapshot(message))
-            elif topic.startswith("lightning_board"):
-                self.queue_out.put_nowait(self._on_orderbook(message))
-
-    def _on_trade(self, msg: Any) -> List:
+            params = msg["params"]
+            self._dispatch(params["channel"], params)
+
+    def _on_trade(self, msg: Any) -> TradeBatch:
         """
-        [
+        channel: lightning_executions_{product_code}
+        message: [
             {
                 'id': 2536423851,
                 'side': 'SELL',
@@ -86,25 +119,14 @@ class Bitflyer(Exchange):
             }
         ]
         """
-        trades = []
-        for trade in msg:
-            exec_date = trade["exec_date"]
-            exec_date = exec_date.rstrip("Z")
-            if "." in exec_date:
-                exec_date, microseconds = exec_date.split(".")
-                microseconds = microseconds[:6].ljust(6, "0")
-                exec_date = f"{exec_date}.{microseconds}"
-            else:
-                exec_date = f"{exec_date}.000000"
-            dt = datetime.strptime(exec_date, "%Y-%m-%dT%H:%M:%S.%f")
-            unix_time_ms = int(dt.timestamp() * 1000)
+        trades = TradeBatch()
+        parse_timestamp = self._parse_timestamp
+        for trade in msg["message"]:
             trades.append(
-                {
-                    "timestamp": unix_time_ms,
-                    "side": trade["side"],
-                    "price": float(trade["price"]),
-                    "size": float(trade["size"]),
-                }
+                parse_timestamp(trade["exec_date"]),
+                float(trade["price"]),
+                float(trade["size"]),
+                SIDE_FLAGS.get(trade["side"], UNKNOWN),
             )
         return trades
 
@@ -112,10 +134,52 @@ class Bitflyer(Exchange):
         # TODO: tickeメッセージの処理を実装
         return []
 
-    def _on_orderbook_snapshot(self, msg: Any) -> List:
-        # TODO: Orderbook(snapshot)メッセージの処理を実装
-        return []
+    def _on_orderbook_snapshot(self, msg: Any) -> None:
+        """
+        channel: lightning_board_snapshot_{product_code}
+        message: {
+            'mid_price': 10219988.5,
+            'bids': [{'price': 10219988.0, 'size': 0.05}],
+            'asks': [{'price': 10219989.0, 'size': 0.2}]
+        }
+        """
+        book = self.orderbooks[msg["channel"][len(BOARD_SNAPSHOT_CHANNEL) :]]
+        board = msg["message"]
+        book.apply_snapshot(
+            [(float(level["price"]), float(level["size"])) for level in board["bids"]],
+            [(float(level["price"]), float(level["size"])) for level in board["asks"]],
+        )
 
-    def _on_orderbook(self, msg: Any) -> List:
-        # TODO: Orderbookメッセージの処理を実装
-        return []
+    def _on_orderbook(self, msg: Any) -> None:
+        """
+        channel: lightning_board_{product_code}
+        message: {
+            'mid_price': 10219988.5,
+            'bids': [{'price': 10219988.0, 'size': 0}],
+            'asks': [{'price': 10219990.0, 'size': 0.01}]
+        }
+
+        差分には連番がないため、適用後に板が交差した場合を欠落とみなし、
+        スナップショットのチャンネルを購読し直して板を取り直す。
+        """
+        symbol = msg["channel"][len(BOARD_CHANNEL) :]
+        book = self.orderbooks[symbol]
+        if not book.is_synced:
+            return
+        board = msg["message"]
+        book.apply_delta(
+            [(float(level["price"]), float(level["size"])) for level in board["bids"]],
+            [(float(level["price"]), float(level["size"])) for level in board["asks"]],
+        )
+        if book.is_crossed():
+            self.logger.warning(
+                f"Orderbook for {symbol} is crossed, resubscribing snapshot"
+            )
+            book.invalidate()
+            channel = f"{BOARD_SNAPSHOT_CHANNEL}{symbol}"
+            self._resubscribe(
+                [
+                    {"method": "unsubscribe", "params": {"channel": channel}},
+                    {"method": "subscribe", "params": {"channel": channel}},
+                ]
+            )
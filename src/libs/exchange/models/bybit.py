@@ -1,40 +1,80 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional, Union
 
 from pybotters import WebSocketQueue
 from pybotters.ws import ClientWebSocketResponse
 
-from src.libs.utils import add_logging
+from src.libs.utils import TradeBatch, add_logging
+from src.libs.utils.trade_batch import SIDE_FLAGS, UNKNOWN
 
-from ..exchange import Exchange
+from ..exchange import Exchange, Handler
+from ..schema import Frame
+
+MAX_ARGS_PER_REQUEST = 10
+ORDERBOOK_DEPTH = 50
+
+if Frame is not None:
+
+    class BybitTrade(Frame):
+        T: int
+        S: str
+        v: str
+        p: str
+
+    class BybitMessage(Frame):
+        topic: Optional[str] = None
+        type: Optional[str] = None
+        ts: Optional[int] = None
+        data: Union[List[BybitTrade], Dict[str, Any], None] = None
+
+else:
+    BybitMessage = None
 
 
 @add_logging
 class Bybit(Exchange):
-    def __init__(self, contract: str, symbol: str, queue_out: WebSocketQueue) -> None:
-        super().__init__(contract, symbol, queue_out)
+    schema = BybitMessage
 
-    @property
-    def public_ws_url(self) -> str:
-        return f"wss://stream.bybit.com/v5/public/{self._contract}"
+    def __init__(
+        self,
+        contract: str,
+        symbol: str,
+        queue_out: WebSocketQueue,
+        json_decoder: str = "auto",
+        orderbook: bool = False,
+        clock: Optional[Callable[[], float]] = None,
+    ) -> None:
+        self._tickers: Dict[str, Dict[str, Any]] = {}
+        super().__init__(contract, symbol, queue_out, json_decoder, orderbook, clock)
+
+    @classmethod
+    def public_ws_url_for(cls, contract: str) -> str:
+        return f"wss://stream.bybit.com/v5/public/{contract}"
 
     @property
     def private_ws_url(self) -> str:
         return "wss://stream.bybit.com/v5/private"
 
     @property
-    def subscribe_message(self) -> Dict[str, Any]:
-        symbol_upper = self._symbol.upper()
-        return {
-            "op": "subscribe",
-            "args": [
-                f"publicTrade.{symbol_upper}",
-                # f"tickers.{symbol_upper}",
-                # f"orderbook.50.{symbol_upper}",
-                # f"liquidation.{symbol_upper}",
-            ],
+    def subscribe_message(self) -> List[Dict[str, Any]]:
+        # spotは1リクエストあたり10トピックまで
+        topics = self.topics
+        return [
+            {"op": "subscribe", "args": topics[i : i + MAX_ARGS_PER_REQUEST]}
+            for i in range(0, len(topics), MAX_ARGS_PER_REQUEST)
+        ]
+
+    def _topics(self, symbol: str) -> Dict[str, Handler]:
+        symbol_upper = symbol.upper()
+        topics: Dict[str, Handler] = {
+            f"publicTrade.{symbol_upper}": self._on_trade,
+            # f"tickers.{symbol_upper}": self._on_ticker,
+            # f"liquidation.{symbol_upper}": self._on_liquidation,
         }
+        if self._orderbook_enabled:
+            topics[f"orderbook.{ORDERBOOK_DEPTH}.{symbol_upper}"] = self._on_orderbook
+        return topics
 
     def on_message(self, msg: Any, ws: ClientWebSocketResponse) -> None:
         """WebSocket Stream > Public
@@ -43,18 +83,9 @@ class Bybit(Exchange):
         - https://bybit-exchange.github.io/docs/v5/websocket/public/liquidation
         """
         if "topic" in msg:
-            topic: str = msg["topic"]
-            if topic.startswith("publicTrade"):
-                self.queue_out.put_nowait(self._on_trade(msg))
-            elif topic.startswith("tickers"):
-                self.queue_out.put_nowait(self._on_ticker(msg))
-            elif topic.startswith("orderbook"):
-                self.queue_out.put_nowait(self._on_orderbook(msg))
-            elif topic.startswith("liquidation"):
-                self.queue_out.put_nowait(self._on_orderbook(msg))
-        return {}
-
-    def _on_trade(self, msg: Any) -> List:
+            self._dispatch(msg["topic"], msg)
+
+    def _on_trade(self, msg: Any) -> TradeBatch:
         """
         {
             "topic": "publicTrade.BTCUSDT",
@@ -74,29 +105,69 @@ class Bybit(Exchange):
             ]
         }
         """
-        trades = []
+        trades = TradeBatch()
+        append = trades.append
         for trade in msg["data"]:
-            trades.append(
-                {
-                    "timestamp": trade["T"],
-                    "side": trade["S"],
-                    "price": float(trade["p"]),
-                    "size": float(trade["v"]),
-                }
+            append(
+                trade["T"],
+                float(trade["p"]),
+                float(trade["v"]),
+                SIDE_FLAGS.get(trade["S"], UNKNOWN),
             )
         return trades
 
     def _on_ticker(self, msg: Any) -> List:
         type: str = msg["type"]
+        symbol: str = msg["data"]["symbol"]
         if type == "delta":
-            self._ticker.update(msg["data"])
+            self._tickers[symbol].update(msg["data"])
         elif type == "snapshot":
-            self._ticker = msg["data"]
-        return [self._ticker]
+            self._tickers[symbol] = msg["data"]
+        return [self._tickers[symbol]]
 
-    def _on_orderbook(self, msg: Any) -> List:
-        # TODO: Orderbookメッセージの処理を実装
-        return []
+    def _on_orderbook(self, msg: Any) -> None:
+        """
+        {
+            "topic": "orderbook.50.BTCUSDT",
+            "type": "snapshot",
+            "ts": 1672304484978,
+            "data": {
+                "s": "BTCUSDT",
+                "b": [["16493.50", "0.006"], ["16493.00", "0.100"]],
+                "a": [["16611.00", "0.029"], ["16612.00", "0.213"]],
+                "u": 18521288,
+                "seq": 7961638724
+            },
+            "cts": 1672304484976
+        }
+
+        snapshot で板を置き換え、delta は更新ID（u）が連続している場合のみ適用する。
+        欠落を検知した場合は購読し直してスナップショットを受け取る。
+        u=1 のスナップショットはサービス再起動によるもので、同様に板を置き換える。
+        """
+        data = msg["data"]
+        book = self.orderbooks[data["s"]]
+        bids = [(float(price), float(size)) for price, size in data["b"]]
+        asks = [(float(price), float(size)) for price, size in data["a"]]
+        if msg["type"] == "snapshot":
+            book.apply_snapshot(bids, asks, data["u"], msg["ts"])
+            return
+        if not book.is_synced:
+            return
+        if data["u"] != book.sequence + 1:
+            self.logger.warning(
+                f"Orderbook gap detected for {book.symbol}: {book.sequence} -> {data['u']}"
+            )
+            book.invalidate()
+            topic = msg["topic"]
+            self._resubscribe(
+                [
+                    {"op": "unsubscribe", "args": [topic]},
+                    {"op": "subscribe", "args": [topic]},
+                ]
+            )
+            return
+        book.apply_delta(bids, asks, data["u"], msg["ts"])
 
     def _on_liquidation(self, msg: Any) -> List:
         # TODO: Liquidationメッセージの処理を実装
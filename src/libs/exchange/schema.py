@@ -0,0 +1,27 @@
+from typing import Any
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - 任意の依存
+    msgspec = None
+
+
+if msgspec is not None:
+
+    class Frame(msgspec.Struct):
+        """
+        msgspec でデコードするフレームの基底クラス
+
+        ハンドラを辞書と共通にするため、``msg["key"]`` と ``"key" in msg`` で
+        フィールドにアクセスできるようにしている。値が None のフィールドは
+        存在しないものとして扱う。
+        """
+
+        def __getitem__(self, key: str) -> Any:
+            return getattr(self, key)
+
+        def __contains__(self, key: str) -> bool:
+            return getattr(self, key, None) is not None
+
+else:
+    Frame = None
@@ -0,0 +1,11 @@
+from typing import Tuple
+
+from .capture import FrameRecorder, read_frames
+from .engine import ReplayEngine, VirtualClock
+
+__all__: Tuple[str, ...] = (
+    "FrameRecorder",
+    "ReplayEngine",
+    "VirtualClock",
+    "read_frames",
+)
@@ -0,0 +1,165 @@
+import gzip
+import os
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from src.libs.utils.logger import LogManager
+
+CAPTURE_SUFFIX = ".tsv.gz"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_SECONDS = 3600.0
+
+# 受信時刻（UNIX秒）、接続先（WebSocketのURL）、フレーム
+CapturedFrame = Tuple[float, str, str]
+
+
+class FrameRecorder:
+    """
+    受信したフレームを受信時刻とともに gzip 圧縮したファイルに書き込む
+
+    1行に「受信時刻 TAB 接続先 TAB フレーム」を書き込む。フレーム中の改行は
+    JSON の空白としてのみ現れるため、空白に置き換えて1行に収める。
+    書き込んだサイズ（圧縮前）が max_bytes を超えるか、ファイルを開いてから
+    max_seconds 秒が経過した時点で次のファイルに切り替える。
+    ファイル名は開いた時刻（UTC）と通し番号で、名前順が書き込み順になる。
+
+    Attributes:
+        directory (str): ファイルを保存するディレクトリ
+        prefix (str): ファイル名の接頭辞
+        frames (int): 書き込んだフレーム数
+        _max_bytes (int): 1ファイルに書き込む最大サイズ（圧縮前）
+        _max_seconds (float): 1ファイルに書き込む最大秒数
+        _compresslevel (int): gzip の圧縮レベル
+        _clock (Callable[[], float]): 現在時刻（UNIX秒）を返す関数
+        _file (Optional[BinaryIO]): 書き込み中のファイル
+        _opened (float): 書き込み中のファイルを開いた時刻
+        _written (int): 書き込み中のファイルに書き込んだサイズ
+        _sequence (int): ファイルの通し番号
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str = "frames",
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_seconds: float = DEFAULT_MAX_SECONDS,
+        compresslevel: int = 6,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        Args:
+            directory (str): ファイルを保存するディレクトリ
+            prefix (str, optional): ファイル名の接頭辞
+            max_bytes (int, optional): 1ファイルに書き込む最大サイズ（圧縮前）
+            max_seconds (float, optional): 1ファイルに書き込む最大秒数
+            compresslevel (int, optional): gzip の圧縮レベル
+            clock (Callable[[], float], optional): 現在時刻（UNIX秒）を返す関数
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.frames = 0
+        self._max_bytes = max_bytes
+        self._max_seconds = max_seconds
+        self._compresslevel = compresslevel
+        self._clock = clock
+        self._logger = LogManager.get_logger(__name__)
+        self._file: Optional[BinaryIO] = None
+        self._opened = 0.0
+        self._written = 0
+        self._sequence = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _open(self, now: float) -> None:
+        opened = datetime.fromtimestamp(now, timezone.utc).strftime("%Y%m%dT%H%M%S")
+        path = os.path.join(
+            self.directory,
+            f"{self.prefix}-{opened}-{self._sequence:04d}{CAPTURE_SUFFIX}",
+        )
+        self._file = gzip.open(path, "wb", compresslevel=self._compresslevel)
+        self._opened = now
+        self._written = 0
+        self._sequence += 1
+        self._logger.info(f"Capturing frames to {path}")
+
+    def write(self, received: float, source: str, data: str | bytes) -> None:
+        """
+        フレームを書き込む
+
+        Args:
+            received (float): 受信時刻（UNIX秒）
+            source (str): 接続先
+            data (str | bytes): 受信したフレーム
+        """
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        if "\n" in data:
+            data = data.replace("\n", " ")
+        now = self._clock()
+        if self._file is not None and (
+            self._written >= self._max_bytes or now - self._opened >= self._max_seconds
+        ):
+            self.close()
+        if self._file is None:
+            self._open(now)
+        line = f"{received:.6f}\t{source}\t{data}\n".encode("utf-8")
+        self._file.write(line)
+        self._written += len(line)
+        self.frames += 1
+
+    def close(self) -> None:
+        """書き込み中のファイルを閉じる"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def capture_files(paths: Iterable[str]) -> List[str]:
+    """
+    ファイルとディレクトリの一覧から、キャプチャのファイルを書き込み順に返す
+
+    Args:
+        paths (Iterable[str]): ファイルまたはディレクトリのパス
+
+    Returns:
+        List[str]: キャプチャのファイルのパス
+    """
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                sorted(
+                    os.path.join(path, name)
+                    for name in os.listdir(path)
+                    if name.endswith(CAPTURE_SUFFIX)
+                )
+            )
+        else:
+            files.append(path)
+    return files
+
+
+def read_frames(paths: Iterable[str]) -> Iterator[CapturedFrame]:
+    """
+    キャプチャのファイルからフレームを書き込み順に読み出す
+
+    停止時に閉じられなかったファイルの末尾（圧縮ストリームの途中）は読み飛ばす。
+
+    Args:
+        paths (Iterable[str]): ファイルまたはディレクトリのパス
+
+    Yields:
+        CapturedFrame: 受信時刻、接続先、フレーム
+    """
+    logger = LogManager.get_logger(__name__)
+    for path in capture_files(paths):
+        with gzip.open(path, "rb") as f:
+            try:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    received, source, data = line[:-1].decode("utf-8").split("\t", 2)
+                    yield float(received), source, data
+            except (EOFError, zlib.error, gzip.BadGzipFile):
+                logger.warning(f"Capture file {path} is truncated")
@@ -0,0 +1,155 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional
+
+from pybotters import WebSocketQueue
+
+from src.libs.exchange import Exchange, load_exchanges
+from src.libs.replay.capture import CapturedFrame
+from src.libs.sink import Sink
+from src.libs.utils import Candle, Instrument
+from src.libs.utils.logger import LogManager
+
+
+class VirtualClock:
+    """
+    リプレイ中の現在時刻（UNIX秒）
+
+    フレームの受信時刻で進め、取引所クラスとローソク足生成の clock に渡す。
+    出力に含まれる時刻が実行時の壁時計に依存しないため、同じ入力からは
+    同じ出力が得られる。
+
+    Attributes:
+        now (float): 現在時刻
+    """
+
+    __slots__ = ("now",)
+
+    def __init__(self, now: float = 0.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ReplayEngine:
+    """
+    キャプチャしたフレームを取引所クラス → Candle → Sink の順に流す
+
+    フレームごとに取引所クラスの on_raw_message を呼び出し、生成された約定を
+    同期的に Candle に反映して、確定したローソク足を sink に書き込む。
+    イベントループのスケジューリングに依存しないため、出力は決定的になる。
+    speed が0の場合は待たずに処理し、正の場合はフレームの受信間隔を speed 分の1に
+    縮めた壁時計の間隔で処理する。
+
+    Attributes:
+        clock (VirtualClock): リプレイ中の現在時刻
+        frames (int): 処理したフレーム数
+        skipped (int): 対応する接続先がないため読み飛ばしたフレーム数
+        _sink (Sink): 出力先
+        _speed (float): 再生速度（0は最大速度）
+        _exchanges (Dict[str, Exchange]): 接続先と取引所クラスの対応表
+        _pipelines (List[Tuple[Instrument, WebSocketQueue, Candle, WebSocketQueue]]):
+            銘柄・約定のキュー・ローソク足生成・ローソク足のキュー
+    """
+
+    def __init__(
+        self,
+        instruments: List[Instrument],
+        sink: Sink,
+        freq: int = 1,
+        speed: float = 0.0,
+        json_decoder: str = "auto",
+        allowed_lateness: Optional[float] = None,
+        emit_empty: bool = False,
+        late_policy: str = "drop",
+        amend_delay: float = 0.0,
+        latency_fields: bool = False,
+    ) -> None:
+        """
+        Args:
+            instruments (List[Instrument]): 銘柄の一覧
+            sink (Sink): 出力先
+            freq (int, optional): ローソク足の頻度（秒単位）
+            speed (float, optional): 再生速度（0は最大速度）
+            json_decoder (str, optional): フレームのデコーダの名前
+            allowed_lateness (Optional[float], optional): Candle の allowed_lateness
+            emit_empty (bool, optional): Candle の emit_empty
+            late_policy (str, optional): Candle の late_policy
+            amend_delay (float, optional): Candle の amend_delay
+            latency_fields (bool, optional): Candle の latency_fields
+        """
+        self.clock = VirtualClock()
+        self.frames = 0
+        self.skipped = 0
+        self._sink = sink
+        self._speed = speed
+        self._logger = LogManager.get_logger(__name__)
+
+        trade_queues = {instrument.name: WebSocketQueue() for instrument in instruments}
+        exchanges = load_exchanges(instruments, trade_queues, json_decoder)
+        self._exchanges: Dict[str, Exchange] = {}
+        for exchange in exchanges:
+            exchange.clock = self.clock
+            self._exchanges[exchange.public_ws_url] = exchange
+
+        self._pipelines = []
+        for instrument in instruments:
+            candle_queue = WebSocketQueue()
+            candle = Candle(
+                trade_queues[instrument.name],
+                candle_queue,
+                freq,
+                allowed_lateness=allowed_lateness,
+                emit_empty=emit_empty,
+                clock=self.clock,
+                late_policy=late_policy,
+                amend_delay=amend_delay,
+                tags=instrument.tags,
+                latency_fields=latency_fields,
+            )
+            self._pipelines.append(
+                (instrument, trade_queues[instrument.name], candle, candle_queue)
+            )
+
+    async def run(self, frames: Iterable[CapturedFrame]) -> None:
+        """
+        フレームを全て処理し、最後に未確定のローソク足を確定して出力する
+
+        Args:
+            frames (Iterable[CapturedFrame]): 受信時刻、接続先、フレーム
+        """
+        loop = asyncio.get_running_loop()
+        first: Optional[float] = None
+        started = loop.time()
+        for received, source, data in frames:
+            exchange = self._exchanges.get(source)
+            if exchange is None:
+                self.skipped += 1
+                continue
+            if self._speed > 0:
+                if first is None:
+                    first = received
+                delay = started + (received - first) / self._speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            self.clock.now = received
+            exchange.on_raw_message(data, None)
+            self.frames += 1
+            for _, trade_queue, candle, _ in self._pipelines:
+                while not trade_queue.empty():
+                    candle.update(trade_queue.get_nowait())
+                candle.tick()
+            await self._drain()
+
+        for _, _, candle, _ in self._pipelines:
+            candle.close()
+        await self._drain()
+        await self._sink.flush()
+        self._logger.info(f"Replayed {self.frames} frames ({self.skipped} skipped)")
+
+    async def _drain(self) -> None:
+        """確定したローソク足を銘柄の順に sink に書き込む"""
+        for instrument, _, _, candle_queue in self._pipelines:
+            while not candle_queue.empty():
+                await self._sink.write(candle_queue.get_nowait(), instrument.tags)
@@ -0,0 +1,8 @@
+from typing import Tuple
+
+from .sink import JsonLinesSink, Sink
+
+__all__: Tuple[str, ...] = (
+    "JsonLinesSink",
+    "Sink",
+)
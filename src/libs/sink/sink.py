@@ -0,0 +1,82 @@
+import sys
+from abc import ABC, abstractmethod
+from json import dumps
+from typing import Any, AsyncIterable, Dict, Optional, TextIO
+
+
+class Sink(ABC):
+    """
+    ローソク足などのレコードの出力先
+
+    レコードにタグを付与して書き込む。書き込みは呼び出し順に行う。
+    """
+
+    @abstractmethod
+    async def write(self, record: Dict[str, Any], tags: Dict[str, str]) -> None:
+        """
+        レコードを書き込む
+
+        Args:
+            record (Dict[str, Any]): レコード
+            tags (Dict[str, str]): レコードに追加するタグ
+        """
+        raise NotImplementedError
+
+    async def consume(
+        self, queue: AsyncIterable[Dict[str, Any]], tags: Dict[str, str]
+    ) -> None:
+        """
+        キューのレコードを順に書き込み続ける
+
+        Args:
+            queue (AsyncIterable[Dict[str, Any]]): 入力キュー
+            tags (Dict[str, str]): レコードに追加するタグ
+        """
+        async for record in queue:
+            await self.write(record, tags)
+
+    async def flush(self) -> None:
+        """
+        書き込み途中のレコードを出力する
+
+        バッファを持たない出力先では何もしない（既定の実装）。
+        """
+        return None
+
+    async def close(self) -> None:
+        """出力先を閉じる"""
+        await self.flush()
+
+
+class JsonLinesSink(Sink):
+    """
+    レコードを1行1件の JSON で書き込む出力先
+
+    Attributes:
+        _file (TextIO): 出力先のファイル
+        _owns_file (bool): close でファイルを閉じる場合は True
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """
+        Args:
+            path (Optional[str], optional): 出力先のパス。None または ``-`` の場合は標準出力
+        """
+        if path is None or path == "-":
+            self._file: TextIO = sys.stdout
+            self._owns_file = False
+        else:
+            self._file = open(path, "w", encoding="utf-8")
+            self._owns_file = True
+
+    async def write(self, record: Dict[str, Any], tags: Dict[str, str]) -> None:
+        self._file.write(dumps({**record, **tags}))
+        self._file.write("\n")
+
+    async def flush(self) -> None:
+        self._file.flush()
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._owns_file:
+            self._file.close()
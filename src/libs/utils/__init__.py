@@ -1,15 +1,29 @@
 from typing import Tuple
 
+from .book_features import BookFeatures
+from .bounded_queue import BoundedQueue
 from .candle import Candle
 from .display import Display
 from .health_check import HealthCheck
+from .instrument import Instrument, load_instruments
 from .logger import LogManager, add_logging, trace
+from .orderbook import OrderBook
+from .timestamp import TimestampParser, iso8601_to_ms
+from .trade_batch import TradeBatch
 
 __all__: Tuple[str, ...] = (
+    "BookFeatures",
+    "BoundedQueue",
     "Candle",
     "LogManager",
     "HealthCheck",
+    "Instrument",
     "Display",
+    "TradeBatch",
+    "OrderBook",
+    "TimestampParser",
     "add_logging",
     "trace",
+    "load_instruments",
+    "iso8601_to_ms",
 )
@@ -0,0 +1,162 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from pybotters import WebSocketQueue
+
+from src.libs.utils.candle import JST
+from src.libs.utils.logger import add_logging
+from src.libs.utils.orderbook import OrderBook
+
+BOOK_FEATURES_TYPE = "book_features"
+
+
+@add_logging
+class BookFeatures:
+    """
+    板情報の特徴量をローソク足と同じ周期で出力するクラス
+
+    板そのものは送らず、周期の終わりに板を1回だけ参照して、仲値・マイクロプライス・
+    スプレッド・上位N件の厚み・不均衡を出力する。時間加重スプレッドは板の更新の
+    たびに直前のスプレッドと経過時間を積算し、板を走査せずに求める。
+    出力は ``"type": "book_features"`` を持つ辞書で、ローソク足と同じキューに送る。
+
+    Attributes:
+        orderbook (OrderBook): 参照する板
+        queue_out (WebSocketQueue): 出力キュー
+        _freq (int): 周期（秒）
+        _depth (int): 厚みを集計する件数
+        _clock (Callable[[], float]): 現在時刻（UNIX秒）を返す関数
+        _spread (Optional[float]): 直前の更新時点のスプレッド（同期していない場合は None）
+        _last_update (Optional[float]): 直前に積算した時刻
+        _spread_area (float): 周期内のスプレッドの時間積分
+        _covered (float): 周期内でスプレッドが得られていた時間
+        _updates (int): 周期内の板の更新回数
+    """
+
+    def __init__(
+        self,
+        orderbook: OrderBook,
+        queue_out: WebSocketQueue,
+        freq: int = 1,
+        depth: int = 5,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            orderbook (OrderBook): 参照する板
+            queue_out (WebSocketQueue): 出力キュー
+            freq (int, optional): 周期（秒）
+            depth (int, optional): 厚みを集計する件数
+            clock (Callable[[], float], optional): 現在時刻（UNIX秒）を返す関数
+        """
+        self.orderbook = orderbook
+        self.queue_out = queue_out
+        self._freq = freq
+        self._depth = depth
+        self._clock = clock
+        self._spread: Optional[float] = None
+        self._last_update: Optional[float] = None
+        self._spread_area = 0.0
+        self._covered = 0.0
+        self._updates = 0
+        orderbook.add_listener(self._on_update)
+
+    async def generate(self) -> None:
+        """
+        周期の境界ごとに特徴量を出力する非同期メソッド
+
+        待機の前に次の境界を決めてその時刻で出力するため、待機が早く終わっても
+        遅れても、同じ周期を2回出力したり周期を飛ばしたりしない。
+        """
+        boundary: Optional[float] = None
+        while True:
+            now = self._clock()
+            target = (now // self._freq + 1) * self._freq
+            if boundary is not None:
+                target = max(target, boundary + self._freq)
+            boundary = target
+            await asyncio.sleep(boundary - now)
+            features = self.sample(boundary)
+            if features is not None:
+                await self.queue_out.put(features)
+
+    def _accumulate(self, now: float) -> None:
+        """
+        直前のスプレッドを経過時間で積算する
+
+        Args:
+            now (float): 現在時刻（UNIX秒）
+        """
+        if self._spread is not None and self._last_update is not None:
+            elapsed = now - self._last_update
+            self._spread_area += self._spread * elapsed
+            self._covered += elapsed
+        self._last_update = now
+
+    def _on_update(self, book: OrderBook) -> None:
+        """
+        板の更新時に呼び出され、時間加重スプレッドを更新する
+
+        Args:
+            book (OrderBook): 更新された板
+        """
+        self._accumulate(self._clock())
+        self._updates += 1
+        best_bid, best_ask = book.best_bid, book.best_ask
+        if book.is_synced and best_bid is not None and best_ask is not None:
+            self._spread = best_ask[0] - best_bid[0]
+        else:
+            self._spread = None
+
+    def sample(self, boundary: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        直前の周期の特徴量を求める
+
+        板が同期していない、または片側が空の場合は None を返す。
+
+        Args:
+            boundary (Optional[float], optional): 周期の終わりの時刻（UNIX秒）。
+                省略時は現在時刻から求める
+
+        Returns:
+            Optional[Dict[str, Any]]: 特徴量
+        """
+        now = self._clock()
+        self._accumulate(now)
+        time_weighted_spread = (
+            self._spread_area / self._covered if self._covered > 0 else None
+        )
+        updates = self._updates
+        self._spread_area = 0.0
+        self._covered = 0.0
+        self._updates = 0
+
+        book = self.orderbook
+        best_bid, best_ask = book.best_bid, book.best_ask
+        if not book.is_synced or best_bid is None or best_ask is None:
+            return None
+
+        bid_price, bid_size = best_bid
+        ask_price, ask_size = best_ask
+        bid_depth = sum(size for _, size in book.bids.top(self._depth))
+        ask_depth = sum(size for _, size in book.asks.top(self._depth))
+        # 直前の周期の開始時刻
+        if boundary is None:
+            boundary = int(now) // self._freq * self._freq
+        start = boundary - self._freq
+        features = {
+            "type": BOOK_FEATURES_TYPE,
+            "timestamp": datetime.fromtimestamp(start, JST).isoformat(),
+            "mid": (bid_price + ask_price) / 2,
+            "microprice": (bid_price * ask_size + ask_price * bid_size)
+            / (bid_size + ask_size),
+            "spread": ask_price - bid_price,
+            "time_weighted_spread": time_weighted_spread,
+            "bid_depth": bid_depth,
+            "ask_depth": ask_depth,
+            "imbalance": (bid_depth - ask_depth) / (bid_depth + ask_depth),
+            "updates": updates,
+        }
+        return features
@@ -0,0 +1,141 @@
+import asyncio
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from pybotters import WebSocketQueue
+
+from src.libs.utils.metrics import INSTRUMENT_LABELS, Counter, Gauge
+
+QUEUE_POLICIES: Tuple[str, ...] = ("block", "drop_oldest", "coalesce")
+
+QUEUE_LABELS = INSTRUMENT_LABELS + ("stage",)
+QUEUE_DEPTH = Gauge(
+    "collector_queue_depth", "Items waiting in a pipeline queue", QUEUE_LABELS
+)
+QUEUE_DROPPED = Counter(
+    "collector_queue_dropped_total",
+    "Items dropped by a full pipeline queue",
+    QUEUE_LABELS,
+)
+QUEUE_COALESCED = Counter(
+    "collector_queue_coalesced_total",
+    "Items replaced in place by a coalescing pipeline queue",
+    QUEUE_LABELS,
+)
+
+
+class BoundedQueue(WebSocketQueue):
+    """
+    上限付きのパイプライン用キュー
+
+    満杯のときの動作を policy で指定する。
+
+    - ``block``: put は空きができるまで待つ。put_nowait は asyncio.QueueFull を送出する
+    - ``drop_oldest``: 最も古い要素を捨てて追加する
+    - ``coalesce``: key が同じ要素がキューにあれば、その位置のまま最新の要素で置き換える。
+      key が新しい場合に満杯であれば、最も古い要素を捨てて追加する
+
+    Attributes:
+        policy (str): 満杯のときの動作
+        dropped (int): 捨てた要素数
+        coalesced (int): 置き換えた要素数
+        _key (Optional[Callable[[Any], Hashable]]): coalesce で要素を同一視するキーを返す関数
+        _boxes (Dict[Hashable, List[Any]]): coalesce でキーと要素の入れ物の対応表
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        policy: str = "block",
+        key: Optional[Callable[[Any], Hashable]] = None,
+    ) -> None:
+        """
+        Args:
+            maxsize (int, optional): 要素数の上限
+            policy (str, optional): 満杯のときの動作（QUEUE_POLICIES のいずれか）
+            key (Optional[Callable[[Any], Hashable]], optional): coalesce で使うキーを返す関数
+
+        Raises:
+            ValueError: サポートされていない policy、または coalesce で key がない場合
+        """
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unsupported queue policy: {policy}")
+        if policy == "coalesce" and key is None:
+            raise ValueError("coalesce policy requires a key function")
+        super().__init__(maxsize)
+        self.policy = policy
+        self.dropped = 0
+        self.coalesced = 0
+        self._key = key
+        self._boxes: Dict[Hashable, List[Any]] = {}
+
+    @property
+    def depth(self) -> int:
+        return self.qsize()
+
+    def expose_metrics(self, *labels: str) -> None:
+        """
+        要素数と捨てた要素数をメトリクスとして公開する（値は収集時に読む）
+
+        Args:
+            *labels (str): QUEUE_LABELS の順のラベルの値
+        """
+        QUEUE_DEPTH.labels(*labels).set_function(self.qsize)
+        QUEUE_DROPPED.labels(*labels).set_function(lambda: self.dropped)
+        QUEUE_COALESCED.labels(*labels).set_function(lambda: self.coalesced)
+
+    def _init(self, maxsize: int) -> None:
+        self._queue: deque = deque()
+
+    def _put(self, item: Any) -> None:
+        if self._key is not None:
+            box = [item]
+            self._boxes[self._key(item)] = box
+            self._queue.append(box)
+        else:
+            self._queue.append(item)
+
+    def _get(self) -> Any:
+        if self._key is None:
+            return self._queue.popleft()
+        box = self._queue.popleft()
+        item = box[0]
+        key = self._key(item)
+        if self._boxes.get(key) is box:
+            del self._boxes[key]
+        return item
+
+    def put_nowait(self, item: Any) -> None:
+        """
+        要素を追加する。満杯の場合は policy に従う
+
+        Args:
+            item (Any): 要素
+
+        Raises:
+            asyncio.QueueFull: policy が block で満杯の場合
+        """
+        if self._key is not None:
+            box = self._boxes.get(self._key(item))
+            if box is not None:
+                box[0] = item
+                self.coalesced += 1
+                return
+        if self.full():
+            if self.policy == "block":
+                raise asyncio.QueueFull
+            self.get_nowait()
+            self.dropped += 1
+        super().put_nowait(item)
+
+    async def put(self, item: Any) -> None:
+        """
+        要素を追加する。policy が block の場合は空きができるまで待つ
+
+        Args:
+            item (Any): 要素
+        """
+        if self.policy == "block":
+            await super().put(item)
+        else:
+            self.put_nowait(item)
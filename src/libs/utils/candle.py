@@ -1,24 +1,269 @@
+import asyncio
+import time
+from collections import deque
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List
+from typing import Any, Callable, Deque, Dict, List, Optional
 
+import numpy as np
 from pybotters import WebSocketQueue
 
+from src.libs.utils.health_check import HealthCheck, InstrumentHealth
 from src.libs.utils.limited_size_default_dict import LimitedSizeDefaultDict
 from src.libs.utils.logger import LogManager, add_logging
+from src.libs.utils.metrics import (
+    INSTRUMENT_LABELS,
+    PIPELINE_LATENCY,
+    STAGE_CANDLE,
+    Counter,
+    Histogram,
+    instrument_labels,
+)
+from src.libs.utils.trade_batch import BUY, SELL, SIDE_FLAGS, UNKNOWN, TradeBatch
 
 JST = timezone(timedelta(hours=9))
 
+# これ以上の約定数を含む TradeBatch は NumPy でまとめて集計する
+VECTORIZE_THRESHOLD = 64
+
+LATE_POLICIES = ("drop", "amend")
+
+# 1本のローソク足に含まれる約定数のバケット
+TRADES_PER_CANDLE_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+UPDATE_SECONDS = Histogram(
+    "collector_candle_update_seconds",
+    "Time spent applying a batch of trades to candles",
+    INSTRUMENT_LABELS,
+)
+TRADES_PER_CANDLE = Histogram(
+    "collector_candle_trades",
+    "Trades per finalized candle",
+    INSTRUMENT_LABELS,
+    buckets=TRADES_PER_CANDLE_BUCKETS,
+)
+CANDLES = Counter("collector_candles_total", "Finalized candles", INSTRUMENT_LABELS)
+LATE_TRADES = Counter(
+    "collector_late_trades_total",
+    "Trades received for an already finalized candle and dropped",
+    INSTRUMENT_LABELS,
+)
+AMENDED_CANDLES = Counter(
+    "collector_amended_candles_total",
+    "Finalized candles re-emitted with late trades",
+    INSTRUMENT_LABELS,
+)
+
+
+class CandleRecord(dict):
+    """
+    出力するローソク足
+
+    辞書としてそのまま JSON に変換でき、遅延の計測に使う時刻は JSON に含まれない
+    属性で後段（Kinesis）に渡す。
+
+    Attributes:
+        event_time (Optional[float]): 足の最後の約定時刻（UNIX秒）
+        closed_time (Optional[float]): 足を確定した時刻（UNIX秒）
+    """
+
+    __slots__ = ("event_time", "closed_time")
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.event_time: Optional[float] = None
+        self.closed_time: Optional[float] = None
+
+
+class CandleBucket:
+    """
+    1本のローソク足の集計値
+
+    約定ごとの更新を軽くするため、辞書ではなく __slots__ で属性を保持する。
+    辞書への変換は確定時にのみ行う。
+    last_event と last_received は遅延の計測用で、出力には含めない。
+    """
+
+    __slots__ = (
+        "open",
+        "high",
+        "low",
+        "close",
+        "volume",
+        "buy_volume",
+        "sell_volume",
+        "count",
+        "buy_count",
+        "sell_count",
+        "value",
+        "buy_value",
+        "sell_value",
+        "revision",
+        "last_event",
+        "last_received",
+    )
+
+    def __init__(self) -> None:
+        self.open = None
+        self.high = float("-inf")
+        self.low = float("inf")
+        self.close = None
+        self.volume = 0.0
+        self.buy_volume = 0.0
+        self.sell_volume = 0.0
+        self.count = 0
+        self.buy_count = 0
+        self.sell_count = 0
+        self.value = 0.0
+        self.buy_value = 0.0
+        self.sell_value = 0.0
+        self.revision = 0
+        self.last_event: Optional[int] = None
+        self.last_received: Optional[float] = None
+
+    def add(self, price: float, size: float, side: int) -> None:
+        """
+        約定を1件反映する
+
+        Args:
+            price (float): 約定価格
+            size (float): 約定数量
+            side (int): 売買方向（BUY, SELL, UNKNOWN）
+        """
+        value = price * size
+        if side == BUY:
+            self.merge(
+                price, price, price, price, size, size, 0.0, 1, 1, 0, value, value, 0.0
+            )
+        elif side == SELL:
+            self.merge(
+                price, price, price, price, size, 0.0, size, 1, 0, 1, value, 0.0, value
+            )
+        else:
+            self.merge(
+                price, price, price, price, size, 0.0, 0.0, 1, 0, 0, value, 0.0, 0.0
+            )
+
+    def merge(
+        self,
+        open_: float,
+        high: float,
+        low: float,
+        close: float,
+        volume: float,
+        buy_volume: float,
+        sell_volume: float,
+        count: int,
+        buy_count: int,
+        sell_count: int,
+        value: float,
+        buy_value: float,
+        sell_value: float,
+    ) -> None:
+        """
+        時刻順で後続する約定の集計値を反映する
+
+        Args:
+            open_ (float): 始値
+            high (float): 高値
+            low (float): 安値
+            close (float): 終値
+            volume (float): 出来高
+            buy_volume (float): 買い出来高
+            sell_volume (float): 売り出来高
+            count (int): 約定回数
+            buy_count (int): 買い約定回数
+            sell_count (int): 売り約定回数
+            value (float): 売買代金
+            buy_value (float): 買い売買代金
+            sell_value (float): 売り売買代金
+        """
+        if self.open is None:
+            self.open = open_
+        if high > self.high:
+            self.high = high
+        if low < self.low:
+            self.low = low
+        self.close = close
+        self.volume += volume
+        self.buy_volume += buy_volume
+        self.sell_volume += sell_volume
+        self.count += count
+        self.buy_count += buy_count
+        self.sell_count += sell_count
+        self.value += value
+        self.buy_value += buy_value
+        self.sell_value += sell_value
+
+    def to_dict(self, timestamp: str) -> Dict[str, Any]:
+        """
+        出力用の辞書に変換する
+
+        Args:
+            timestamp (str): ローソク足の開始時刻（ISO 8601）
+
+        Returns:
+            Dict[str, Any]: ローソク足データ
+        """
+        return {
+            "timestamp": timestamp,
+            "open": self.open,
+            "high": self.high,
+            "low": self.low,
+            "close": self.close,
+            "volume": self.volume,
+            "buy_volume": self.buy_volume,
+            "sell_volume": self.sell_volume,
+            "count": self.count,
+            "buy_count": self.buy_count,
+            "sell_count": self.sell_count,
+            "value": self.value,
+            "buy_value": self.buy_value,
+            "sell_value": self.sell_value,
+            "revision": self.revision,
+        }
+
+
 @add_logging
 class Candle:
     """
     ローソク足生成クラス
 
+    ローソク足のキーはエポックからの足の通し番号（``timestamp_ms // (freq * 1000)``）。
+    約定数の多い TradeBatch は NumPy のグループ集計で処理し、結果は約定ごとの
+    集計と同じになる（浮動小数点の加算順による誤差を除く）。
+
+    ローソク足は次のいずれかで確定する。
+
+    - 新しい足の約定を受信したとき（それより前の足を確定）
+    - 壁時計のウォーターマーク（現在時刻 - allowed_lateness）が足の終了時刻を過ぎたとき
+
+    確定済みの足に対する約定（遅延約定）は late_policy に従って処理する。
+
+    - ``drop``: 破棄して件数を数える
+    - ``amend``: 足に反映し、revision を1つ増やして再送する。amend_delay 秒の間に
+      届いた遅延約定はまとめて1回の再送にする
+
+    確定したローソク足は出力キューに空きがあればそのまま送り、満杯の場合は
+    送信待ち（_outbox）に溜める。generate は送信待ちを出力キューに送り終えるまで
+    次の約定を受信しないため、上限付きの出力キューで背圧がかかる。
+
+    約定の反映にかかった時間、確定した足の本数と約定数、遅延約定の件数は
+    tags のラベルでメトリクスに記録する。足の終了から確定までの経過も記録し、
+    出力する CandleRecord には最後の約定時刻と確定時刻を属性として持たせる。
+    latency_fields を有効にすると、これらの時刻を ``t_event``（最後の約定時刻）、
+    ``t_recv``（その約定の受信時刻）、``t_close``（確定時刻）の UNIX ミリ秒で出力にも含める。
+
     Attributes:
         queue_in (WebSocketQueue): 入力となるWebSocketキュー
         queue_out (WebSocketQueue): 出力となるWebSocketキュー
         _freq (int): ローソク足の頻度（秒単位）
-        _candles (Dict[datetime, Dict[str, Any]]): ローソク足データを格納する辞書
-        _last_key (datetime): 最後に更新されたローソク足のキー
+        _candles (Dict[int, CandleBucket]): ローソク足データを格納する辞書
+        _last_key (int): 最後に更新されたローソク足のキー
+        _finalized_key (int): 確定済みの最新のローソク足のキー
+        _last_close (float): 最後に確定したローソク足の終値
+        _amended (Dict[int, None]): 再送待ちのローソク足のキー
+        late_trades (int): 破棄した遅延約定の件数
+        _outbox (Deque[Dict[str, Any]]): 出力キューへの送信待ちのローソク足
     """
 
     def __init__(
@@ -27,6 +272,15 @@ class Candle:
         queue_out: WebSocketQueue,
         freq: int = 1,
         max_candles: int = 100,
+        vectorize_threshold: int = VECTORIZE_THRESHOLD,
+        allowed_lateness: Optional[float] = None,
+        emit_empty: bool = False,
+        watermark_interval: float = 0.1,
+        clock: Callable[[], float] = time.time,
+        late_policy: str = "drop",
+        amend_delay: float = 0.0,
+        tags: Optional[Dict[str, str]] = None,
+        latency_fields: bool = False,
     ):
         """
         コンストラクタ
@@ -36,32 +290,60 @@ class Candle:
             queue_out (WebSocketQueue): 出力となるWebSocketキュー
             freq (int, optional): ローソク足の頻度（秒単位）。デフォルトは1
             max_candles (int, optional): 保持するローソク足の最大数。デフォルトは100
+            vectorize_threshold (int, optional): NumPy で集計する最小の約定数
+            allowed_lateness (Optional[float], optional): 足の終了から壁時計で確定するまでの猶予（秒）。
+                None の場合は約定の受信時のみ確定する
+            emit_empty (bool, optional): 約定のない足を直前の終値で出力するか
+            watermark_interval (float, optional): ウォーターマークを確認する間隔（秒）
+            clock (Callable[[], float], optional): 現在時刻（UNIX秒）を返す関数
+            late_policy (str, optional): 遅延約定の処理方法（``drop`` または ``amend``）
+            amend_delay (float, optional): 再送をまとめる待ち時間（秒）
+            tags (Optional[Dict[str, str]], optional): メトリクスのラベルにする銘柄のタグ。
+                指定した場合はローソク足の出力時刻を銘柄の InstrumentHealth に記録する
+            latency_fields (bool, optional): 遅延の計測用の時刻を出力に含めるか
+
+        Raises:
+            ValueError: サポートされていない late_policy が指定された場合
         """
+        if late_policy not in LATE_POLICIES:
+            raise ValueError(f"Unsupported late_policy: {late_policy}")
+
         self._logger = LogManager.get_logger(__name__)
 
         self.queue_in = queue_in
         self.queue_out = queue_out
         self._freq = freq
-        self._candles: Dict[datetime, Dict[str, Any]] = LimitedSizeDefaultDict(
-            lambda: {
-                "timestamp": None,
-                "open": None,
-                "high": float("-inf"),
-                "low": float("inf"),
-                "close": None,
-                "volume": 0.0,
-                "buy_volume": 0.0,
-                "sell_volume": 0.0,
-                "count": 0,
-                "buy_count": 0,
-                "sell_count": 0,
-                "value": 0.0,
-                "buy_value": 0.0,
-                "sell_value": 0.0,
-            },
-            max_candles,
+        self._freq_ms = freq * 1000
+        self._candles: Dict[int, CandleBucket] = LimitedSizeDefaultDict(
+            CandleBucket, max_candles
+        )
+        self._last_key: Optional[int] = None
+        self._finalized_key: Optional[int] = None
+        self._last_close: Optional[float] = None
+        self._vectorize_threshold = vectorize_threshold
+        self._allowed_lateness = allowed_lateness
+        self._emit_empty = emit_empty
+        self._watermark_interval = watermark_interval
+        self._clock = clock
+        self._late_policy = late_policy
+        self._amend_delay = amend_delay
+        self._amended: Dict[int, None] = {}
+        self._amended_since: Optional[float] = None
+        self.late_trades = 0
+        self._outbox: Deque[Dict[str, Any]] = deque()
+        self._outbox_lock = asyncio.Lock()
+
+        labels = instrument_labels(tags)
+        self._update_seconds = UPDATE_SECONDS.labels(*labels)
+        self._trades_per_candle = TRADES_PER_CANDLE.labels(*labels)
+        self._candles_total = CANDLES.labels(*labels)
+        self._late_trades_total = LATE_TRADES.labels(*labels)
+        self._amended_total = AMENDED_CANDLES.labels(*labels)
+        self._close_latency = PIPELINE_LATENCY.labels(*labels, STAGE_CANDLE)
+        self._latency_fields = latency_fields
+        self._health: Optional[InstrumentHealth] = (
+            HealthCheck.instrument("-".join(tags.values())) if tags else None
         )
-        self._last_key = None
 
     async def generate(self):
         """
@@ -69,74 +351,407 @@ class Candle:
 
         WebSocketQueueからデータを受信し、ローソク足データを更新する
         """
-        async for messages in self.queue_in:
-            self._update_candle(messages)
+        watermark_task = None
+        if self._allowed_lateness is not None or self._amend_delay > 0:
+            watermark_task = asyncio.create_task(self._watermark_loop())
+        try:
+            async for messages in self.queue_in:
+                self.update(messages)
+                if self._outbox:
+                    await self._drain_outbox()
+        finally:
+            if watermark_task is not None:
+                watermark_task.cancel()
+
+    async def _watermark_loop(self) -> None:
+        """
+        一定間隔でウォーターマークを進め、終了したローソク足を確定する
+        """
+        while True:
+            await asyncio.sleep(self._watermark_interval)
+            self.tick()
+            if self._outbox:
+                await self._drain_outbox()
+
+    def update(self, trades: TradeBatch | List[Dict[str, Any]]) -> None:
+        """
+        約定データを反映し、処理時間をメトリクスに記録する
+
+        generate を使わずに約定を直接渡す場合（リプレイなど）に呼び出す。
+
+        Args:
+            trades (TradeBatch | List[Dict[str, Any]]): 約定データ
+        """
+        start = time.perf_counter()
+        self._update_candle(trades)
+        self._update_seconds.observe(time.perf_counter() - start)
+
+    def tick(self) -> None:
+        """
+        現在時刻（clock）でウォーターマークを進め、待ち時間を過ぎた再送を出力する
+        """
+        if self._allowed_lateness is not None:
+            self._advance_watermark()
+        self._flush_amendments()
+
+    def close(self) -> None:
+        """
+        未確定のローソク足を全て確定する（入力の終わりに呼び出す）
+        """
+        if self._amended:
+            self._amended_since = float("-inf")
+            self._flush_amendments()
+        if self._last_key is not None:
+            self._finalize_until(self._last_key)
 
-    def _get_candle_key(self, timestamp: datetime) -> datetime:
+    def _emit(self, record: Dict[str, Any]) -> None:
+        """
+        ローソク足を出力キューに送る。満杯の場合は送信待ちに溜める
+
+        Args:
+            record (Dict[str, Any]): ローソク足
+        """
+        health = self._health
+        if health is not None:
+            health.last_candle = time.monotonic()
+            if health.unpublished_since is None:
+                health.unpublished_since = health.last_candle
+        if not self._outbox:
+            try:
+                self.queue_out.put_nowait(record)
+                return
+            except asyncio.QueueFull:
+                pass
+        self._outbox.append(record)
+
+    async def _drain_outbox(self) -> None:
+        """
+        送信待ちのローソク足を、出力キューに空きができるのを待ちながら順に送る
+        """
+        async with self._outbox_lock:
+            while self._outbox:
+                await self.queue_out.put(self._outbox[0])
+                self._outbox.popleft()
+
+    def _advance_watermark(self) -> None:
+        """
+        壁時計のウォーターマークまでに終了したローソク足を確定する
+        """
+        watermark_ms = int((self._clock() - self._allowed_lateness) * 1000)
+        # キー k の足は (k + 1) * freq_ms に終了する
+        self._finalize_until(watermark_ms // self._freq_ms - 1)
+
+    def _get_candle_key(self, timestamp: int) -> int:
         """
         ローソク足のキーを取得する
 
         Args:
-            timestamp (datetime): タイムスタンプ
+            timestamp (int): UNIXタイムスタンプ（ミリ秒）
 
         Returns:
-            datetime: ローソク足のキー
+            int: ローソク足のキー
         """
-        return timestamp.replace(second=0, microsecond=0) + timedelta(
-            seconds=(timestamp.second // self._freq) * self._freq
-        )
+        return timestamp // self._freq_ms
 
-    def _update_candle(self, trades: List[Dict[str, Any]]) -> None:
+    def _get_candle_timestamp(self, key: int) -> str:
+        """
+        ローソク足のキーを開始時刻の文字列に変換する
+
+        Args:
+            key (int): ローソク足のキー
+
+        Returns:
+            str: ローソク足の開始時刻（JST, ISO 8601）
+        """
+        return datetime.fromtimestamp(key * self._freq, JST).isoformat()
+
+    def _update_candle(self, trades: TradeBatch | List[Dict[str, Any]]) -> None:
         """
         ローソク足データを更新する
 
         Args:
-            trades (List[Dict[str, Any]]): 取引データのリスト
-        """
-        for trade in trades:
-            key = self._get_candle_key(datetime.fromtimestamp(
-                trade["timestamp"] / 1000.0, timezone.utc
-            ))
-
-            candle = self._candles[key]
-
-            if candle["open"] is None:
-                candle["open"] = trade["price"]
-
-            candle["high"] = max(candle["high"], trade["price"])
-            candle["low"] = min(candle["low"], trade["price"])
-            candle["close"] = trade["price"]
-
-            candle["volume"] += trade["size"]
-            candle["count"] += 1
-            candle["value"] += trade["price"] * trade["size"]
-
-            side_upper = trade["side"].upper()
-            if side_upper == "BUY":
-                candle["buy_volume"] += trade["size"]
-                candle["buy_count"] += 1
-                candle["buy_value"] += trade["price"] * trade["size"]
-            elif side_upper == "SELL":
-                candle["sell_volume"] += trade["size"]
-                candle["sell_count"] += 1
-                candle["sell_value"] += trade["price"] * trade["size"]
-
-            if self._last_key is None:
-                self._last_key = key
-            elif key > self._last_key:
-                self._finalize_candle()
-                self._last_key = key
-            elif key < self._last_key:
-                self._logger.warn(
-                    f"Received data for {key.astimezone(JST).isoformat()} is already finalized"
+            trades (TradeBatch | List[Dict[str, Any]]): 約定データ。
+                列指向の TradeBatch、または約定ごとの辞書のリスト
+        """
+        received = None
+        if isinstance(trades, TradeBatch):
+            if len(
+                trades
+            ) >= self._vectorize_threshold and self._update_candle_vectorized(trades):
+                return
+            rows = iter(trades)
+            received = trades.received
+        else:
+            rows = (
+                (
+                    trade["timestamp"],
+                    trade["price"],
+                    trade["size"],
+                    SIDE_FLAGS.get(trade["side"], UNKNOWN),
                 )
+                for trade in trades
+            )
+
+        candles = self._candles
+        freq_ms = self._freq_ms
+        finalized_key = self._finalized_key
+        for timestamp, price, size, side in rows:
+            # _get_candle_key と同じ計算を、呼び出しコストを避けるため展開している
+            key = timestamp // freq_ms
+            if finalized_key is not None and key <= finalized_key:
+                self._on_late_trade(key, price, size, side)
+                continue
+            value = price * size
+
+            candle = candles[key]
+            if candle.open is None:
+                candle.open = price
+            if price > candle.high:
+                candle.high = price
+            if price < candle.low:
+                candle.low = price
+            candle.close = price
+            candle.last_event = timestamp
+            candle.last_received = received
+
+            candle.volume += size
+            candle.count += 1
+            candle.value += value
+
+            if side == BUY:
+                candle.buy_volume += size
+                candle.buy_count += 1
+                candle.buy_value += value
+            elif side == SELL:
+                candle.sell_volume += size
+                candle.sell_count += 1
+                candle.sell_value += value
+
+            if key != self._last_key:
+                self._on_candle_key(key)
+                finalized_key = self._finalized_key
+
+        if self._amended:
+            self._flush_amendments()
+
+    def _update_candle_vectorized(self, trades: TradeBatch) -> bool:
+        """
+        TradeBatch をローソク足のキーごとにまとめて集計し、ローソク足データに反映する
+
+        時刻順に並んでいないバッチは約定ごとの集計と結果が変わるため処理しない。
+
+        Args:
+            trades (TradeBatch): 約定データ
+
+        Returns:
+            bool: 処理した場合は True、時刻順でないため処理しなかった場合は False
+        """
+        timestamps = np.frombuffer(trades.timestamps, dtype=np.int64)
+        if np.any(timestamps[1:] < timestamps[:-1]):
+            return False
+
+        prices = np.frombuffer(trades.prices, dtype=np.float64)
+        sizes = np.frombuffer(trades.sizes, dtype=np.float64)
+        sides = np.frombuffer(trades.sides, dtype=np.int8)
+        values = prices * sizes
+        is_buy = sides == BUY
+        is_sell = sides == SELL
+
+        keys = timestamps // self._freq_ms
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        ends = np.append(starts[1:], len(keys))
+        last_events = timestamps[ends - 1].tolist()
+        received = trades.received
+
+        groups = zip(
+            keys[starts].tolist(),
+            prices[starts].tolist(),
+            np.maximum.reduceat(prices, starts).tolist(),
+            np.minimum.reduceat(prices, starts).tolist(),
+            prices[ends - 1].tolist(),
+            np.add.reduceat(sizes, starts).tolist(),
+            np.add.reduceat(np.where(is_buy, sizes, 0.0), starts).tolist(),
+            np.add.reduceat(np.where(is_sell, sizes, 0.0), starts).tolist(),
+            (ends - starts).tolist(),
+            np.add.reduceat(is_buy.astype(np.int64), starts).tolist(),
+            np.add.reduceat(is_sell.astype(np.int64), starts).tolist(),
+            np.add.reduceat(values, starts).tolist(),
+            np.add.reduceat(np.where(is_buy, values, 0.0), starts).tolist(),
+            np.add.reduceat(np.where(is_sell, values, 0.0), starts).tolist(),
+            strict=True,
+        )
+
+        candles = self._candles
+        for group, last_event in zip(groups, last_events, strict=True):
+            key = group[0]
+            finalized_key = self._finalized_key
+            if finalized_key is not None and key <= finalized_key:
+                self._on_late_group(key, group[1:])
+                continue
+
+            candle = candles[key]
+            candle.merge(*group[1:])
+            candle.last_event = last_event
+            candle.last_received = received
+            if key != self._last_key:
+                self._on_candle_key(key)
+
+        if self._amended:
+            self._flush_amendments()
+        return True
+
+    def _on_candle_key(self, key: int) -> None:
+        """
+        直前と異なる足の約定を反映した後に呼び出し、足の確定や遅延の検出を行う
+
+        Args:
+            key (int): 約定のローソク足のキー
+        """
+        if self._last_key is None or key > self._last_key:
+            self._finalize_until(key - 1)
+            self._last_key = key
+
+    def _on_late_trade(self, key: int, price: float, size: float, side: int) -> None:
+        """
+        確定済みのローソク足に対する約定を late_policy に従って処理する
+
+        Args:
+            key (int): ローソク足のキー
+            price (float): 約定価格
+            size (float): 約定数量
+            side (int): 売買方向
+        """
+        if self._late_policy == "amend" and key in self._candles:
+            self._candles[key].add(price, size, side)
+            self._mark_amended(key)
+            return
+        self.late_trades += 1
+        self._late_trades_total.inc()
+        self._logger.warning(
+            f"Received data for {self._get_candle_timestamp(key)} is already finalized"
+        )
+
+    def _on_late_group(self, key: int, aggregates: tuple) -> None:
+        """
+        確定済みのローソク足に対する約定の集計値を late_policy に従って処理する
+
+        Args:
+            key (int): ローソク足のキー
+            aggregates (tuple): CandleBucket.merge に渡す集計値
+        """
+        if self._late_policy == "amend" and key in self._candles:
+            self._candles[key].merge(*aggregates)
+            self._mark_amended(key)
+            return
+        self.late_trades += aggregates[7]
+        self._late_trades_total.inc(aggregates[7])
+        self._logger.warning(
+            f"Received data for {self._get_candle_timestamp(key)} is already finalized"
+        )
+
+    def _mark_amended(self, key: int) -> None:
+        """
+        ローソク足を再送待ちにする
+
+        Args:
+            key (int): ローソク足のキー
+        """
+        if not self._amended:
+            self._amended_since = self._clock()
+        self._amended[key] = None
+
+    def _flush_amendments(self) -> None:
+        """
+        待ち時間を過ぎた再送待ちのローソク足を、revision を増やして出力キューに送信する
+        """
+        if not self._amended:
+            return
+        if self._clock() - self._amended_since < self._amend_delay:
+            return
+        for key in sorted(self._amended):
+            candle = self._candles.get(key)
+            if candle is None:
+                continue
+            candle.revision += 1
+            self._amended_total.inc()
+            self._emit(self._to_record(key, candle))
+        self._amended.clear()
+        self._amended_since = None
+
+    def _finalize_until(self, target_key: int) -> None:
+        """
+        指定したキーまでの未確定のローソク足を古い順に確定する
+
+        Args:
+            target_key (int): 確定するローソク足のキーの上限
+        """
+        finalized_key = self._finalized_key
+        if finalized_key is not None and target_key <= finalized_key:
+            return
+
+        keys = sorted(
+            key
+            for key in self._candles
+            if key <= target_key and (finalized_key is None or key > finalized_key)
+        )
+        if self._emit_empty and (keys or finalized_key is not None):
+            start = keys[0] if finalized_key is None else finalized_key + 1
+            keys = range(start, target_key + 1)
+
+        for key in keys:
+            if key in self._candles:
+                self._finalize_candle(key)
+            elif self._last_close is not None:
+                self._finalize_empty_candle(key)
+        self._finalized_key = target_key
 
-    def _finalize_candle(self) -> None:
+    def _finalize_candle(self, key: int) -> None:
         """
         ローソク足を確定し、出力キューに送信する
+
+        Args:
+            key (int): ローソク足のキー
+        """
+        candle = self._candles[key]
+        self._last_close = candle.close
+        self._candles_total.inc()
+        self._trades_per_candle.observe(candle.count)
+        record = self._to_record(key, candle)
+        self._close_latency.observe(record.closed_time - (key + 1) * self._freq)
+        self._emit(record)
+
+    def _finalize_empty_candle(self, key: int) -> None:
+        """
+        約定のないローソク足を直前の終値で確定し、出力キューに送信する
+
+        Args:
+            key (int): ローソク足のキー
+        """
+        candle = CandleBucket()
+        candle.open = candle.high = candle.low = candle.close = self._last_close
+        self._candles_total.inc()
+        self._trades_per_candle.observe(0)
+        self._emit(self._to_record(key, candle))
+
+    def _to_record(self, key: int, candle: CandleBucket) -> CandleRecord:
+        """
+        ローソク足を出力用の CandleRecord に変換し、確定時刻を記録する
+
+        Args:
+            key (int): ローソク足のキー
+            candle (CandleBucket): ローソク足の集計値
+
+        Returns:
+            CandleRecord: 出力するローソク足
         """
-        if len(self._candles) > 1:
-            current_candle = self._candles[self._last_key]
-            if current_candle["timestamp"] is None:
-                current_candle["timestamp"] = self._last_key.astimezone(JST).isoformat()
-            self.queue_out.put_nowait(current_candle)
+        record = CandleRecord(candle.to_dict(self._get_candle_timestamp(key)))
+        closed = self._clock()
+        record.closed_time = closed
+        if candle.last_event is not None:
+            record.event_time = candle.last_event / 1000
+        if self._latency_fields:
+            received = candle.last_received
+            record["t_event"] = candle.last_event
+            record["t_recv"] = int(received * 1000) if received is not None else None
+            record["t_close"] = int(closed * 1000)
+        return record
@@ -1,15 +1,23 @@
+import time
+from typing import Optional
+
 from pybotters import WebSocketQueue
 
-from src.libs.utils.health_check import HealthCheck
+from src.libs.utils.health_check import InstrumentHealth
 from src.libs.utils.logger import LogManager
 
 
 class Display:
-    def __init__(self, queue: WebSocketQueue):
+    def __init__(
+        self, queue: WebSocketQueue, health: Optional[InstrumentHealth] = None
+    ):
         self._queue = queue
+        self._health = health
         self._logger = LogManager.get_logger(__name__)
 
     async def run(self) -> None:
         async for msg in self._queue:
             self._logger.info(msg)
-            await HealthCheck.set_health_status(True)
+            if self._health is not None:
+                self._health.last_publish = time.monotonic()
+                self._health.unpublished_since = None
@@ -1,46 +1,174 @@
-import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 import uvicorn
 from fastapi import FastAPI, Response
 
+from src.libs.utils.metrics import CONTENT_TYPE, REGISTRY
+
+# 最終時刻の種類と、経過秒数の上限の既定値（None は確認しない）。
+# 約定とローソク足は流動性の低い銘柄で数分途切れることがあるため、既定では確認しない
+DEFAULT_MAX_AGES: Dict[str, Optional[float]] = {
+    "frame": 30.0,
+    "trade": None,
+    "candle": None,
+    "publish": 300.0,
+}
+
+
+class InstrumentHealth:
+    """
+    銘柄ごとの最終時刻（time.monotonic の秒）
+
+    各段は処理のたびに対応する属性へ現在時刻を代入するだけで、ロックは取らない。
+    まだ一度も記録されていない場合は登録した時刻からの経過で判定する。
+    送信（publish）は送信待ちのローソク足がある間だけ、その最初の出力からの経過で
+    判定するため、約定がなくローソク足の出ない銘柄は異常にならない。
+
+    Attributes:
+        started (float): 登録した時刻
+        last_frame (Optional[float]): 最後にWebSocketのフレームを受信した時刻
+        last_trade (Optional[float]): 最後に約定を受信した時刻
+        last_candle (Optional[float]): 最後にローソク足を出力した時刻
+        last_publish (Optional[float]): 最後にレコードを送信できた時刻
+        unpublished_since (Optional[float]): 送信できていないローソク足を最初に出力した時刻
+    """
+
+    __slots__ = (
+        "started",
+        "last_frame",
+        "last_trade",
+        "last_candle",
+        "last_publish",
+        "unpublished_since",
+    )
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.last_frame: Optional[float] = None
+        self.last_trade: Optional[float] = None
+        self.last_candle: Optional[float] = None
+        self.last_publish: Optional[float] = None
+        self.unpublished_since: Optional[float] = None
+
+    def ages(self, now: float) -> Dict[str, float]:
+        """
+        最終時刻からの経過秒数を返す
+
+        Args:
+            now (float): 現在時刻（time.monotonic の秒）
+
+        Returns:
+            Dict[str, float]: 種類（frame, trade, candle, publish）と経過秒数
+        """
+        ages = {
+            kind: now - (getattr(self, f"last_{kind}") or self.started)
+            for kind in DEFAULT_MAX_AGES
+        }
+        pending = self.unpublished_since
+        ages["publish"] = now - pending if pending is not None else 0.0
+        return ages
+
 
 class HealthCheck:
-    condition = asyncio.Condition()
-    is_healthy = True
+    """
+    ヘルスチェックとメトリクスのHTTPサーバー
+
+    銘柄ごとのフレーム受信・約定・ローソク足の出力・送信の最終時刻を、
+    それぞれの経過秒数の上限と比較して判定する。WebSocketが切断されずに
+    止まった場合も、フレームの最終時刻が古くなることで異常になる。
+
+    Attributes:
+        instruments (Dict[str, InstrumentHealth]): 銘柄名と最終時刻の対応表（プロセスで共有）
+        max_ages (Dict[str, Optional[float]]): 種類ごとの経過秒数の上限
+    """
 
-    def __init__(self):
+    instruments: Dict[str, InstrumentHealth] = {}
+
+    def __init__(self, max_ages: Optional[Dict[str, Optional[float]]] = None):
+        """
+        Args:
+            max_ages (Optional[Dict[str, Optional[float]]], optional): 種類ごとの経過秒数の上限。
+                指定しない種類は DEFAULT_MAX_AGES を使い、None または0以下の場合は確認しない
+        """
+        self.max_ages = dict(DEFAULT_MAX_AGES)
+        if max_ages:
+            self.max_ages.update(max_ages)
         self.app = FastAPI()
         self._setup_routes()
 
+    @classmethod
+    def instrument(cls, name: str) -> InstrumentHealth:
+        """
+        銘柄の最終時刻を返す（初回は登録する）
+
+        Args:
+            name (str): 銘柄名（Instrument.name）
+
+        Returns:
+            InstrumentHealth: 銘柄の最終時刻
+        """
+        health = cls.instruments.get(name)
+        if health is None:
+            health = cls.instruments[name] = InstrumentHealth()
+        return health
+
+    def check(self, now: Optional[float] = None) -> Tuple[bool, Dict[str, List[str]]]:
+        """
+        全ての銘柄の最終時刻を判定する
+
+        Args:
+            now (Optional[float], optional): 現在時刻（time.monotonic の秒）
+
+        Returns:
+            Tuple[bool, Dict[str, List[str]]]: 全て正常な場合は True と、
+                銘柄名ごとの上限を超えた種類
+        """
+        now = time.monotonic() if now is None else now
+        stale: Dict[str, List[str]] = {}
+        for name, health in HealthCheck.instruments.items():
+            ages = health.ages(now)
+            stale[name] = [
+                kind
+                for kind, max_age in self.max_ages.items()
+                if max_age is not None and max_age > 0 and ages[kind] > max_age
+            ]
+        return not any(stale.values()), stale
+
     def _setup_routes(self):
         @self.app.get("/health")
         async def health_check(response: Response):
             """
             ヘルスチェックエンドポイント
 
+            銘柄ごとのステータスを含め、いずれかの最終時刻が上限より古い場合は503を返す。
+
             Returns:
                 dict: ステータスメッセージ
             """
-            async with HealthCheck.condition:
-                if HealthCheck.is_healthy:
-                    response.status_code = 200
-                    return {"status": "ok"}
-                else:
-                    response.status_code = 503
-                    return {"status": "unhealthy"}
+            is_healthy, stale = self.check()
+            response.status_code = 200 if is_healthy else 503
+            body: Dict[str, Any] = {"status": "ok" if is_healthy else "unhealthy"}
+            if not stale:
+                return body
+            body["instruments"] = {
+                name: "unhealthy" if kinds else "ok" for name, kinds in stale.items()
+            }
+            if not is_healthy:
+                body["stale"] = {name: kinds for name, kinds in stale.items() if kinds}
+            return body
 
-    @classmethod
-    async def set_health_status(cls, is_healthy: bool):
-        """
-        ヘルスステータスを設定するメソッド
+        @self.app.get("/metrics")
+        async def metrics():
+            """
+            メトリクスエンドポイント
 
-        Args:
-            is_healthy (bool): ヘルスステータス
-        """
-        async with cls.condition:
-            if cls.is_healthy != is_healthy:
-                cls.is_healthy = is_healthy
-                cls.condition.notify_all()
+            登録された全てのメトリクスを Prometheus のテキスト形式で返す。
+
+            Returns:
+                Response: テキスト形式のメトリクス
+            """
+            return Response(content=REGISTRY.expose(), media_type=CONTENT_TYPE)
 
     async def start(self):
         """
@@ -0,0 +1,80 @@
+import tomllib
+from dataclasses import dataclass
+from typing import Dict, List
+
+
+@dataclass(frozen=True)
+class Instrument:
+    """
+    収集対象の銘柄
+
+    Attributes:
+        exchange (str): 取引所名
+        contract (str): 契約種別
+        symbol (str): シンボル
+    """
+
+    exchange: str
+    contract: str
+    symbol: str
+
+    @property
+    def name(self) -> str:
+        """
+        銘柄の識別名（例: ``bybit-spot-btcusdt``）
+
+        Returns:
+            str: 識別名
+        """
+        return f"{self.exchange}-{self.contract}-{self.symbol}".lower()
+
+    @property
+    def tags(self) -> Dict[str, str]:
+        """
+        Kinesisに送信するレコードへ付与するタグ
+
+        Returns:
+            Dict[str, str]: タグ
+        """
+        return {
+            "exchange": self.exchange.lower(),
+            "contract": self.contract.lower(),
+            "symbol": self.symbol.lower(),
+        }
+
+
+def load_instruments(path: str) -> List[Instrument]:
+    """
+    設定ファイル（TOML）から銘柄の一覧を読み込む
+
+    ```toml
+    [[instruments]]
+    exchange = "bybit"
+    contract = "spot"
+    symbol = "BTCUSDT"
+    ```
+
+    Args:
+        path (str): 設定ファイルのパス
+
+    Returns:
+        List[Instrument]: 銘柄の一覧
+
+    Raises:
+        ValueError: 銘柄が定義されていない、または同じ銘柄が重複している場合
+    """
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+
+    instruments = [
+        Instrument(item["exchange"], item["contract"], item["symbol"])
+        for item in config.get("instruments", [])
+    ]
+    if not instruments:
+        raise ValueError(f"No instruments defined in {path}")
+
+    names = [instrument.name for instrument in instruments]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate instruments in {path}: {sorted(duplicates)}")
+    return instruments
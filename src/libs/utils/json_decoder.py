@@ -0,0 +1,78 @@
+import json
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 任意の依存
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - 任意の依存
+    msgspec = None
+
+JsonDecoder = Callable[[str | bytes], Any]
+
+JSON_DECODERS: Tuple[str, ...] = ("auto", "typed", "orjson", "msgspec", "json")
+
+
+def _available_decoders() -> Dict[str, JsonDecoder]:
+    decoders: Dict[str, JsonDecoder] = {}
+    if orjson is not None:
+        decoders["orjson"] = orjson.loads
+    if msgspec is not None:
+        decoders["msgspec"] = msgspec.json.Decoder().decode
+    decoders["json"] = json.loads
+    return decoders
+
+
+def load_json_decoder(name: str = "auto", schema: Optional[type] = None) -> JsonDecoder:
+    """
+    WebSocketのフレームをデコードする関数を返す
+
+    ``auto`` はインストールされているものから、スキーマ付きの msgspec、orjson、
+    msgspec、標準ライブラリの json の順に選ぶ。``typed`` は schema の型で
+    デコードし、必要なフィールドだけを取り出す。スキーマに合わないフレームは
+    スキーマなしの msgspec でデコードし直す。
+
+    Args:
+        name (str, optional): デコーダの名前（JSON_DECODERS のいずれか）
+        schema (Optional[type], optional): ``typed`` で使う msgspec の型
+
+    Returns:
+        JsonDecoder: str または bytes を受け取り、デコード結果を返す関数
+
+    Raises:
+        ValueError: サポートされていない、またはインストールされていないデコーダが指定された場合
+    """
+    if name not in JSON_DECODERS:
+        raise ValueError(f"Unsupported JSON decoder: {name}")
+    decoders = _available_decoders()
+
+    if name == "auto":
+        if msgspec is not None and schema is not None:
+            name = "typed"
+        else:
+            return next(iter(decoders.values()))
+
+    if name == "typed":
+        if msgspec is None or schema is None:
+            raise ValueError("typed JSON decoder requires msgspec and a schema")
+        return _typed_decoder(msgspec.json.Decoder(schema).decode, decoders["msgspec"])
+
+    decoder = decoders.get(name)
+    if decoder is None:
+        raise ValueError(f"JSON decoder is not installed: {name}")
+    return decoder
+
+
+def _typed_decoder(typed: JsonDecoder, fallback: JsonDecoder) -> JsonDecoder:
+    validation_error = msgspec.ValidationError
+
+    def decode(data: str | bytes) -> Any:
+        try:
+            return typed(data)
+        except validation_error:
+            return fallback(data)
+
+    return decode
@@ -1,6 +1,5 @@
 from collections import defaultdict, deque
-from datetime import datetime
-from typing import Any, Callable, Deque, Dict
+from typing import Any, Callable, Deque, Hashable
 
 
 class LimitedSizeDefaultDict(defaultdict):
@@ -12,28 +11,28 @@ class LimitedSizeDefaultDict(defaultdict):
 
     Attributes:
         max_size (int): 保持する最大アイテム数
-        _keys (Deque[datetime]): 挿入順のキーを保持するデキュー
+        _keys (Deque[Hashable]): 挿入順のキーを保持するデキュー
     """
 
-    def __init__(self, default_factory: Callable[[], Dict[str, Any]], max_size: int):
+    def __init__(self, default_factory: Callable[[], Any], max_size: int):
         """
         コンストラクタ
 
         Args:
-            default_factory (Callable[[], Dict[str, Any]]): デフォルト値を生成するファクトリ関数
+            default_factory (Callable[[], Any]): デフォルト値を生成するファクトリ関数
             max_size (int): 保持する最大アイテム数
         """
         super().__init__(default_factory)
         self.max_size = max_size
-        self._keys: Deque[datetime] = deque()
+        self._keys: Deque[Hashable] = deque()
 
-    def __setitem__(self, key: datetime, value: Dict[str, Any]):
+    def __setitem__(self, key: Hashable, value: Any):
         """
         アイテムを設定するメソッド
 
         Args:
-            key (datetime): キー
-            value (Dict[str, Any]): 値
+            key (Hashable): キー
+            value (Any): 値
         """
         if key not in self:
             if len(self._keys) >= self.max_size:
@@ -1,7 +1,10 @@
 import logging
 import logging.config
 from datetime import datetime, timedelta, timezone
-from typing import Any, Callable, Dict, Type
+from functools import wraps
+from itertools import count
+from os import getenv
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Type
 
 JST = timezone(timedelta(hours=9))
 
@@ -29,9 +32,25 @@ class LogManager:
 
     _masked_credentials: Dict[str, Any] = {}
 
-    def __init__(self, level: int = DEFAULT_LOG_LEVEL) -> None:
+    # トレース設定。import 時点では環境変数 LOG_LEVEL で初期化する
+    _trace_enabled: bool = getenv("LOG_LEVEL", "").upper() == "DEBUG"
+    _trace_sample_rate: int = 1
+    _trace_methods: Optional[Set[str]] = None
+    _traced_classes: List[Type] = []
+
+    def __init__(
+        self,
+        level: int = DEFAULT_LOG_LEVEL,
+        trace_sample_rate: int = 1,
+        trace_methods: Optional[Iterable[str]] = None,
+    ) -> None:
         self.level = level
         self._setup_logging()
+        self.configure_tracing(
+            logging.getLogger().isEnabledFor(logging.DEBUG),
+            trace_sample_rate,
+            trace_methods,
+        )
 
     def _setup_logging(self) -> None:
         """ロギングの設定を行う"""
@@ -74,11 +93,64 @@ class LogManager:
             return tuple(cls.mask_data(item) for item in data)
         return data
 
+    @classmethod
+    def configure_tracing(
+        cls,
+        enabled: bool,
+        sample_rate: int = 1,
+        methods: Optional[Iterable[str]] = None,
+    ) -> None:
+        """トレースの設定を変更し、add_logging 済みのクラスに反映する
+
+        無効の場合はラッパーを外し、元のメソッドを直接呼び出す。
 
-def trace(func: Callable) -> Callable:
+        Args:
+            enabled (bool): トレースを有効にするか
+            sample_rate (int): N回に1回だけトレースする
+            methods (Optional[Iterable[str]]): トレースするメソッド名
+                （``on_message`` または ``Bybit.on_message``）。None の場合は全て
+        """
+        cls._trace_enabled = enabled
+        cls._trace_sample_rate = max(1, sample_rate)
+        cls._trace_methods = set(methods) if methods else None
+        for target in cls._traced_classes:
+            _apply_tracing(target)
+
+    @classmethod
+    def is_traced(cls, name: str, qualname: str = "") -> bool:
+        """指定したメソッドをトレースするかどうか
+
+        Args:
+            name (str): メソッド名
+            qualname (str): クラス名を含むメソッド名
+
+        Returns:
+            bool: トレースする場合は True
+        """
+        if not cls._trace_enabled:
+            return False
+        if cls._trace_methods is None:
+            return True
+        return name in cls._trace_methods or qualname in cls._trace_methods
+
+
+def _traced(func: Callable, sample_rate: int = 1) -> Callable:
+    """引数と戻り値を DEBUG ログに出力するラッパーを生成する
+
+    Args:
+        func (Callable): 対象の関数
+        sample_rate (int): N回に1回だけログを出力する
+
+    Returns:
+        Callable: ラップした関数
+    """
     logger = logging.getLogger(func.__module__)
+    counter = count()
 
+    @wraps(func)
     def wrapper(*args, **kwargs):
+        if sample_rate > 1 and next(counter) % sample_rate:
+            return func(*args, **kwargs)
         masked_args = [LogManager.mask_data(arg) for arg in args]
         masked_kwargs = {k: LogManager.mask_data(v) for k, v in kwargs.items()}
         logger.debug(
@@ -93,12 +165,64 @@ def trace(func: Callable) -> Callable:
     return wrapper
 
 
+def trace(func: Callable) -> Callable:
+    """関数呼び出しをトレースするデコレータ
+
+    モジュールの関数は import した側が参照を持つため、クラスのように後から
+    差し替えられない。トレースの有無は呼び出しのたびに判定し、import 後に
+    configure_tracing で有効にした場合も反映する。無効の間は元の関数を呼び出す。
+
+    Args:
+        func (Callable): 対象の関数
+
+    Returns:
+        Callable: ラップした関数
+    """
+    # 間引きの回数ごとのトレース用のラッパー
+    traced: Dict[int, Callable] = {}
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not LogManager.is_traced(func.__name__, func.__qualname__):
+            return func(*args, **kwargs)
+        sample_rate = LogManager._trace_sample_rate
+        target = traced.get(sample_rate)
+        if target is None:
+            target = traced[sample_rate] = _traced(func, sample_rate)
+        return target(*args, **kwargs)
+
+    return wrapper
+
+
+def _apply_tracing(cls: Type) -> None:
+    """現在のトレース設定に従って、クラスのメソッドをラップまたは元に戻す
+
+    Args:
+        cls (Type): add_logging 済みのクラス
+    """
+    for attr_name, attr_value in cls.__dict__["_untraced_methods"].items():
+        if LogManager.is_traced(attr_name, f"{cls.__name__}.{attr_name}"):
+            if isinstance(attr_value, (staticmethod, classmethod)):
+                # デスクリプタの中の関数をラップし、同じ種類のデスクリプタに戻す
+                attr_value = type(attr_value)(
+                    _traced(attr_value.__func__, LogManager._trace_sample_rate)
+                )
+            else:
+                attr_value = _traced(attr_value, LogManager._trace_sample_rate)
+        setattr(cls, attr_name, attr_value)
+
+
 def add_logging(cls: Type) -> Type:
     logger = logging.getLogger(cls.__name__)
     cls.logger = logger
 
-    for attr_name, attr_value in cls.__dict__.items():
-        if callable(attr_value):
-            setattr(cls, attr_name, trace(attr_value))
+    cls._untraced_methods = {
+        attr_name: attr_value
+        for attr_name, attr_value in cls.__dict__.items()
+        if isinstance(attr_value, (staticmethod, classmethod))
+        or (callable(attr_value) and not isinstance(attr_value, type))
+    }
+    LogManager._traced_classes.append(cls)
+    _apply_tracing(cls)
 
     return cls
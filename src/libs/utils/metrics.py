@@ -0,0 +1,383 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+# 銘柄ごとのメトリクスに付けるラベル（Instrument.tags と同じキー）
+INSTRUMENT_LABELS: Tuple[str, ...] = ("exchange", "contract", "symbol")
+
+# 秒単位の処理時間向けのバケット（10µs〜10s）
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# パイプラインの経過時間向けのバケット（1ms〜60s）
+PIPELINE_BUCKETS: Tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# PIPELINE_LATENCY の stage ラベルの値
+STAGE_EXCHANGE = "exchange"  # 約定時刻 → フレームの受信
+STAGE_CANDLE = "candle"  # 足の終了時刻 → 足の確定
+STAGE_PUBLISH = "publish"  # 足の確定 → Kinesis の応答
+STAGE_TOTAL = "total"  # 足の最後の約定時刻 → Kinesis の応答
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)
+    )
+    return f"{{{pairs}}}"
+
+
+class CounterChild:
+    """
+    ラベルの値ごとのカウンタ
+
+    Attributes:
+        value (float): 現在値
+        _function (Optional[Callable[[], float]]): 値を収集時に求める関数
+    """
+
+    __slots__ = ("value", "_function")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1) -> None:
+        """
+        値を増やす
+
+        Args:
+            amount (float, optional): 増分
+        """
+        self.value += amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        収集時に値を返す関数を登録する（他のクラスが数えている累計値の公開用）
+
+        Args:
+            function (Callable[[], float]): 値を返す関数
+        """
+        self._function = function
+
+    def get(self) -> float:
+        return self._function() if self._function is not None else self.value
+
+
+class GaugeChild(CounterChild):
+    """ラベルの値ごとのゲージ"""
+
+    __slots__ = ()
+
+    def set(self, value: float) -> None:
+        """
+        値を設定する
+
+        Args:
+            value (float): 値
+        """
+        self.value = value
+
+    def dec(self, amount: float = 1) -> None:
+        """
+        値を減らす
+
+        Args:
+            amount (float, optional): 減分
+        """
+        self.value -= amount
+
+
+class HistogramChild:
+    """
+    ラベルの値ごとのヒストグラム
+
+    バケットごとの件数は累積せずに数え、収集時に累積する。
+
+    Attributes:
+        bounds (Tuple[float, ...]): バケットの上限（昇順）
+        counts (List[int]): バケットごとの件数（末尾は +Inf）
+        sum (float): 観測値の合計
+        count (int): 観測値の件数
+    """
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """
+        値を記録する
+
+        Args:
+            value (float): 観測値
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """
+    メトリクスの基底クラス
+
+    ラベルの値ごとの子を labels で取得し、子に対して記録する。記録はイベントループの
+    スレッドからのみ行う前提で、ロックを取らずに属性を更新する。収集（/metrics）も
+    同じイベントループで行うため、記録の途中の値が読まれることはない。
+    ホットパスでは labels の結果を保持しておき、呼び出しごとの辞書の参照も避ける。
+
+    Attributes:
+        name (str): メトリクス名
+        documentation (str): 説明
+        labelnames (Tuple[str, ...]): ラベル名
+        _children (Dict[Tuple[str, ...], object]): ラベルの値と子の対応表
+    """
+
+    type_name = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: Optional["Registry"] = None,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_child(self) -> object:
+        raise NotImplementedError
+
+    def labels(self, *values: str, **kwargs: str):
+        """
+        ラベルの値に対応する子を返す（初回は作成する）
+
+        Args:
+            *values (str): labelnames の順のラベルの値
+            **kwargs (str): ラベル名と値（values の代わりに指定する）
+
+        Returns:
+            ラベルの値に対応する子
+
+        Raises:
+            ValueError: ラベルの数が labelnames と一致しない場合
+        """
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {values}"
+            )
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def remove(self, *values: str) -> None:
+        """
+        ラベルの値に対応する子を削除する
+
+        Args:
+            *values (str): labelnames の順のラベルの値
+        """
+        self._children.pop(tuple(values), None)
+
+    def _samples(self) -> Iterator[str]:
+        for values, child in self._children.items():
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}{labels} {_format_value(child.get())}"
+
+    def expose(self) -> str:
+        """
+        Prometheus のテキスト形式で出力する
+
+        Returns:
+            str: メトリクスの行（末尾に改行を含む）
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    """単調増加するカウンタ"""
+
+    type_name = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+
+class Gauge(Metric):
+    """任意に増減する値"""
+
+    type_name = "gauge"
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+
+class Histogram(Metric):
+    """
+    観測値の分布
+
+    Attributes:
+        buckets (Tuple[float, ...]): バケットの上限（昇順、+Inf を含まない）
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        registry: Optional["Registry"] = None,
+    ) -> None:
+        self.buckets = tuple(
+            sorted(bucket for bucket in buckets if bucket != float("inf"))
+        )
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+    def _samples(self) -> Iterator[str]:
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(
+                self.buckets + (float("inf"),), child.counts, strict=True
+            ):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames + ("le",), values + (_format_value(bound),)
+                )
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+class Registry:
+    """
+    メトリクスの登録先
+
+    Attributes:
+        _metrics (Dict[str, Metric]): メトリクス名とメトリクスの対応表
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        """
+        メトリクスを登録する
+
+        Args:
+            metric (Metric): メトリクス
+
+        Raises:
+            ValueError: 同じ名前のメトリクスが登録済みの場合
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def expose(self) -> str:
+        """
+        登録された全てのメトリクスを Prometheus のテキスト形式で出力する
+
+        Returns:
+            str: テキスト形式のメトリクス
+        """
+        return "".join(metric.expose() for metric in self._metrics.values())
+
+
+REGISTRY = Registry()
+
+
+def instrument_labels(tags: Optional[Dict[str, str]]) -> Tuple[str, ...]:
+    """
+    タグから銘柄のラベルの値を取り出す
+
+    Args:
+        tags (Optional[Dict[str, str]]): Instrument.tags と同じキーを持つタグ
+
+    Returns:
+        Tuple[str, ...]: INSTRUMENT_LABELS の順のラベルの値。タグがない場合は空文字列
+    """
+    tags = tags or {}
+    return tuple(str(tags.get(name, "")) for name in INSTRUMENT_LABELS)
+
+
+PIPELINE_LATENCY = Histogram(
+    "collector_latency_seconds",
+    "Wall-clock latency between pipeline stages",
+    INSTRUMENT_LABELS + ("stage",),
+    buckets=PIPELINE_BUCKETS,
+)
@@ -0,0 +1,213 @@
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedDict
+
+Level = Tuple[float, float]
+Listener = Callable[["OrderBook"], None]
+
+
+class BookSide:
+    """
+    板の片側（買い板または売り板）
+
+    キーで並べた SortedDict で保持する。キーは最良気配が末尾に来るように
+    売り板では価格の符号を反転するため、最良気配と上位N件の取得は末尾からの
+    参照になり、価格の追加と削除は板の深さに対して対数時間で済む。
+
+    Attributes:
+        is_bid (bool): 買い板の場合は True
+        _levels (SortedDict): キー（売り板は価格の符号を反転した値）と数量の対応表
+    """
+
+    __slots__ = ("is_bid", "_levels")
+
+    def __init__(self, is_bid: bool) -> None:
+        self.is_bid = is_bid
+        self._levels = SortedDict()
+
+    def __len__(self) -> int:
+        return len(self._levels)
+
+    def update(self, price: float, size: float) -> None:
+        """
+        価格の数量を更新する。数量が0の場合は価格を削除する
+
+        Args:
+            price (float): 価格
+            size (float): 数量
+        """
+        key = price if self.is_bid else -price
+        if size <= 0.0:
+            self._levels.pop(key, None)
+        else:
+            self._levels[key] = size
+
+    def clear(self) -> None:
+        """全ての価格を削除する"""
+        self._levels.clear()
+
+    def best(self) -> Optional[Level]:
+        """
+        最良気配を返す
+
+        Returns:
+            Optional[Level]: 価格と数量。板が空の場合は None
+        """
+        if not self._levels:
+            return None
+        key, size = self._levels.peekitem(-1)
+        return (key if self.is_bid else -key), size
+
+    def top(self, n: int) -> List[Level]:
+        """
+        最良気配から順にN件を返す
+
+        Args:
+            n (int): 件数
+
+        Returns:
+            List[Level]: 価格と数量のリスト
+        """
+        if n <= 0:
+            return []
+        levels = self._levels
+        keys = reversed(levels.keys()[-n:])
+        if self.is_bid:
+            return [(key, levels[key]) for key in keys]
+        return [(-key, levels[key]) for key in keys]
+
+    def size_at(self, price: float) -> float:
+        """
+        価格の数量を返す
+
+        Args:
+            price (float): 価格
+
+        Returns:
+            float: 数量。価格がない場合は0
+        """
+        return self._levels.get(price if self.is_bid else -price, 0.0)
+
+
+class OrderBook:
+    """
+    ローカルの板情報（L2）
+
+    スナップショットで初期化し、差分を適用して最新の状態を保つ。差分の連番の
+    検証は取引所ごとに異なるため、呼び出し側（取引所クラス）で行い、
+    欠落を検知した場合は invalidate で未同期にしてスナップショットを取り直す。
+    更新のたびに add_listener で登録した関数を呼び出す。
+
+    Attributes:
+        symbol (str): シンボル
+        bids (BookSide): 買い板
+        asks (BookSide): 売り板
+        sequence (Optional[int]): 最後に適用した更新の連番
+        timestamp (Optional[int]): 最後に適用した更新の時刻（UNIXミリ秒）
+        is_synced (bool): スナップショットを適用済みで、差分が連続している場合は True
+        resyncs (int): 欠落を検知して未同期にした回数
+        _listeners (List[Listener]): 更新時に呼び出す関数
+    """
+
+    def __init__(self, symbol: str) -> None:
+        self.symbol = symbol
+        self.bids = BookSide(is_bid=True)
+        self.asks = BookSide(is_bid=False)
+        self.sequence: Optional[int] = None
+        self.timestamp: Optional[int] = None
+        self.is_synced = False
+        self.resyncs = 0
+        self._listeners: List[Listener] = []
+
+    def add_listener(self, listener: Listener) -> None:
+        """
+        板の更新時（差分の適用、スナップショット、未同期化）に呼び出す関数を登録する
+
+        Args:
+            listener (Listener): 板を引数に取る関数
+        """
+        self._listeners.append(listener)
+
+    def apply_snapshot(
+        self,
+        bids: Iterable[Level],
+        asks: Iterable[Level],
+        sequence: Optional[int] = None,
+        timestamp: Optional[int] = None,
+    ) -> None:
+        """
+        スナップショットで板を置き換える
+
+        Args:
+            bids (Iterable[Level]): 買い板の価格と数量
+            asks (Iterable[Level]): 売り板の価格と数量
+            sequence (Optional[int], optional): 更新の連番
+            timestamp (Optional[int], optional): 更新の時刻（UNIXミリ秒）
+        """
+        self.bids.clear()
+        self.asks.clear()
+        self.is_synced = True
+        self.apply_delta(bids, asks, sequence, timestamp)
+
+    def apply_delta(
+        self,
+        bids: Iterable[Level],
+        asks: Iterable[Level],
+        sequence: Optional[int] = None,
+        timestamp: Optional[int] = None,
+    ) -> None:
+        """
+        差分を適用する。数量が0の価格は削除する
+
+        Args:
+            bids (Iterable[Level]): 買い板の価格と数量
+            asks (Iterable[Level]): 売り板の価格と数量
+            sequence (Optional[int], optional): 更新の連番
+            timestamp (Optional[int], optional): 更新の時刻（UNIXミリ秒）
+        """
+        update = self.bids.update
+        for price, size in bids:
+            update(price, size)
+        update = self.asks.update
+        for price, size in asks:
+            update(price, size)
+        if sequence is not None:
+            self.sequence = sequence
+        if timestamp is not None:
+            self.timestamp = timestamp
+        for listener in self._listeners:
+            listener(self)
+
+    def invalidate(self) -> None:
+        """欠落を検知した板を未同期にする"""
+        if self.is_synced:
+            self.resyncs += 1
+        self.is_synced = False
+        for listener in self._listeners:
+            listener(self)
+
+    @property
+    def best_bid(self) -> Optional[Level]:
+        return self.bids.best()
+
+    @property
+    def best_ask(self) -> Optional[Level]:
+        return self.asks.best()
+
+    def is_crossed(self) -> bool:
+        """
+        最良買い気配が最良売り気配以上になっているかを返す
+
+        Returns:
+            bool: 板が交差している場合は True
+        """
+        best_bid, best_ask = self.bids.best(), self.asks.best()
+        return (
+            best_bid is not None and best_ask is not None and best_bid[0] >= best_ask[0]
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"OrderBook({self.symbol}, bids={self.bids.top(5)}, asks={self.asks.top(5)}, "
+            f"sequence={self.sequence})"
+        )
@@ -0,0 +1,350 @@
+import mmap
+import os
+import struct
+from typing import Dict, Iterator, List, Tuple
+from zlib import crc32
+
+from src.libs.utils.logger import LogManager
+
+# レコードの先頭に置くヘッダ（ペイロード長、CRC32）
+HEADER = struct.Struct("<II")
+SEGMENT_SUFFIX = ".seg"
+CURSOR_FILE = "cursor"
+
+DEFAULT_SEGMENT_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+Position = Tuple[int, int]
+
+
+class Spool:
+    """
+    ディスク上の追記専用ログ
+
+    送信できなかったレコードを一時的に保存し、送信先の復旧後に書き込み順で読み出す。
+    ログは固定サイズのセグメントファイルに分割し、mmap で読み書きする。
+    各レコードは長さと CRC32 のヘッダを持ち、書き込み途中で停止した場合は
+    再起動時に CRC が一致しない位置を末尾として扱う。
+    読み出し位置はカーソルファイルに保存し、読み終えたセグメントは削除する。
+    セグメントの合計が max_bytes を超えた場合は、未読でも最も古いセグメントから削除する。
+
+    Attributes:
+        directory (str): セグメントを保存するディレクトリ
+        records (int): 未読のレコード数
+        evicted (int): 容量の上限により削除したレコード数
+        _segment_bytes (int): セグメントのサイズ
+        _max_bytes (int): セグメントの合計サイズの上限
+        _segments (List[int]): 存在するセグメントの番号（昇順）
+        _maps (Dict[int, mmap.mmap]): 開いているセグメント
+        _read (Position): 読み出し位置（セグメント番号、オフセット）
+        _write (Position): 書き込み位置（セグメント番号、オフセット）
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        """
+        Args:
+            directory (str): セグメントを保存するディレクトリ
+            segment_bytes (int, optional): セグメントのサイズ
+            max_bytes (int, optional): セグメントの合計サイズの上限
+
+        Raises:
+            ValueError: max_bytes がセグメント2つ分より小さい場合
+        """
+        if max_bytes < 2 * segment_bytes:
+            raise ValueError("max_bytes must hold at least two segments")
+        self.directory = directory
+        self._segment_bytes = segment_bytes
+        self._max_bytes = max_bytes
+        self._logger = LogManager.get_logger(__name__)
+        self._maps: Dict[int, mmap.mmap] = {}
+        self.records = 0
+        self.evicted = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._segments: List[int] = sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+        if not self._segments:
+            self._create_segment(0)
+        self._read = self._load_cursor()
+        # カーソルの保存後、セグメントの削除前に停止した場合の残り
+        for segment in [s for s in self._segments if s < self._read[0]]:
+            self._remove_segment(segment)
+        self._write = self._recover()
+
+    @property
+    def is_empty(self) -> bool:
+        return self.records == 0
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:020d}{SEGMENT_SUFFIX}")
+
+    def _create_segment(self, segment: int) -> None:
+        with open(self._path(segment), "wb") as f:
+            f.truncate(self._segment_bytes)
+        self._segments.append(segment)
+
+    def _map(self, segment: int) -> mmap.mmap:
+        segment_map = self._maps.get(segment)
+        if segment_map is None:
+            with open(self._path(segment), "r+b") as f:
+                segment_map = mmap.mmap(f.fileno(), self._segment_bytes)
+            self._maps[segment] = segment_map
+        return segment_map
+
+    def _load_cursor(self) -> Position:
+        """
+        カーソルファイルから読み出し位置を復元する
+
+        Returns:
+            Position: 読み出し位置。カーソルがない、または削除済みのセグメントを指す場合は
+                最も古いセグメントの先頭
+        """
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as f:
+                segment, offset = (int(value) for value in f.read().split())
+        except (FileNotFoundError, ValueError):
+            return self._segments[0], 0
+        if segment not in self._segments:
+            return self._segments[0], 0
+        return segment, offset
+
+    def _save_cursor(self) -> None:
+        path = os.path.join(self.directory, CURSOR_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            f.write(f"{self._read[0]} {self._read[1]}\n")
+        os.replace(f"{path}.tmp", path)
+
+    def _scan(self, segment: int, offset: int) -> Iterator[Tuple[int, bytes]]:
+        """
+        セグメント内のレコードを順に読み出す
+
+        Args:
+            segment (int): セグメント番号
+            offset (int): 読み出しを開始するオフセット
+
+        Yields:
+            Tuple[int, bytes]: 次のレコードのオフセットとペイロード
+        """
+        segment_map = self._map(segment)
+        end = self._segment_bytes
+        while offset + HEADER.size <= end:
+            length, checksum = HEADER.unpack_from(segment_map, offset)
+            start = offset + HEADER.size
+            if length == 0 or start + length > end:
+                return
+            payload = segment_map[start : start + length]
+            if crc32(payload) != checksum:
+                return
+            offset = start + length
+            yield offset, payload
+
+    def _recover(self) -> Position:
+        """
+        未読のレコード数を数え、最後のセグメントの書き込み位置を求める
+
+        最後のセグメントで CRC が一致しない位置以降は書き込み途中のデータとして破棄する。
+
+        Returns:
+            Position: 書き込み位置
+        """
+        read_segment, read_offset = self._read
+        for segment in self._segments:
+            if segment < read_segment:
+                continue
+            offset = read_offset if segment == read_segment else 0
+            for _ in self._scan(segment, offset):
+                self.records += 1
+
+        last = self._segments[-1]
+        offset = read_offset if last == read_segment else 0
+        for end, _ in self._scan(last, offset):
+            offset = end
+        if offset + HEADER.size <= self._segment_bytes:
+            self._map(last)[offset : offset + HEADER.size] = bytes(HEADER.size)
+        if self.records:
+            self._logger.info(
+                f"Recovered {self.records} spooled records in {self.directory}"
+            )
+        return last, offset
+
+    def append(self, payload: bytes) -> None:
+        """
+        レコードを追記する
+
+        Args:
+            payload (bytes): レコード
+
+        Raises:
+            ValueError: レコードが1つのセグメントに収まらない場合
+        """
+        size = HEADER.size + len(payload)
+        if size > self._segment_bytes:
+            raise ValueError(
+                f"Record too large for spool segment ({len(payload)} bytes)"
+            )
+        segment, offset = self._write
+        if offset + size > self._segment_bytes:
+            self._rotate()
+            segment, offset = self._write
+
+        segment_map = self._map(segment)
+        # ペイロードを先に書き、ヘッダを最後に書くことで途中のレコードを読ませない
+        segment_map[offset + HEADER.size : offset + size] = payload
+        segment_map[offset : offset + HEADER.size] = HEADER.pack(
+            len(payload), crc32(payload)
+        )
+        self._write = segment, offset + size
+        self.records += 1
+
+    def _rotate(self) -> None:
+        """新しいセグメントに切り替え、容量の上限を超えた場合は古いセグメントを削除する"""
+        current = self._write[0]
+        self._map(current).flush()
+        self._create_segment(current + 1)
+        self._write = current + 1, 0
+        while len(self._segments) * self._segment_bytes > self._max_bytes:
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        """未読のレコードを含む最も古いセグメントを削除する"""
+        segment = self._segments[0]
+        offset = self._read[1] if segment == self._read[0] else 0
+        dropped = sum(1 for _ in self._scan(segment, offset))
+        self._remove_segment(segment)
+        self.records -= dropped
+        self.evicted += dropped
+        self._read = self._segments[0], 0
+        self._save_cursor()
+        self._logger.warning(f"Spool is full, evicted {dropped} oldest records")
+
+    def _remove_segment(self, segment: int) -> None:
+        segment_map = self._maps.pop(segment, None)
+        if segment_map is not None:
+            segment_map.close()
+        os.remove(self._path(segment))
+        self._segments.remove(segment)
+
+    def peek(self, max_records: int) -> Tuple[List[bytes], Position]:
+        """
+        読み出し位置から最大 max_records 件のレコードを読み出す（読み出し位置は進めない）
+
+        Args:
+            max_records (int): 読み出す最大件数
+
+        Returns:
+            Tuple[List[bytes], Position]: レコードと、最後のレコードの次の位置
+        """
+        records: List[bytes] = []
+        segment, offset = self._read
+        for current in self._segments:
+            if current < segment:
+                continue
+            if current > segment:
+                segment, offset = current, 0
+            for end, payload in self._scan(segment, offset):
+                records.append(payload)
+                offset = end
+                if len(records) >= max_records:
+                    return records, (segment, offset)
+        return records, (segment, offset)
+
+    def peek_positions(self, max_records: int) -> Tuple[List[bytes], List[Position]]:
+        """
+        読み出し位置から最大 max_records 件のレコードと、それぞれの次の位置を読み出す
+        （読み出し位置は進めない）
+
+        送信の完了を待つ間に追記で古いセグメントが削除されても、先頭から n 件を
+        送信できた場合は n 件目の位置を commit すればよい。
+
+        Args:
+            max_records (int): 読み出す最大件数
+
+        Returns:
+            Tuple[List[bytes], List[Position]]: レコードと、各レコードの次の位置
+        """
+        records: List[bytes] = []
+        positions: List[Position] = []
+        segment, offset = self._read
+        for current in self._segments:
+            if current < segment:
+                continue
+            if current > segment:
+                segment, offset = current, 0
+            for end, payload in self._scan(segment, offset):
+                records.append(payload)
+                positions.append((segment, end))
+                if len(records) >= max_records:
+                    return records, positions
+        return records, positions
+
+    def commit(self, position: Position) -> None:
+        """
+        読み出し位置を進め、読み終えたセグメントを削除する
+
+        peek の後に容量の上限で読み出し位置より先まで削除されていた場合は何もしない。
+
+        Args:
+            position (Position): peek で返された位置、または送信できたレコードの次の位置
+        """
+        if position <= self._read:
+            return
+        self.records -= self._count(position)
+        self._read = position
+        for segment in [s for s in self._segments if s < position[0]]:
+            self._remove_segment(segment)
+        self._save_cursor()
+
+    def _count(self, position: Position) -> int:
+        """
+        読み出し位置から position までのレコード数を返す
+
+        Args:
+            position (Position): 位置
+
+        Returns:
+            int: レコード数
+        """
+        count = 0
+        segment, offset = self._read
+        for current in self._segments:
+            if current < segment or current > position[0]:
+                continue
+            start = offset if current == segment else 0
+            for end, _ in self._scan(current, start):
+                if (current, end) > position:
+                    break
+                count += 1
+        return count
+
+    def position_after(self, count: int) -> Position:
+        """
+        読み出し位置から count 件のレコードの次の位置を返す
+
+        Args:
+            count (int): レコード数
+
+        Returns:
+            Position: 位置
+        """
+        if count <= 0:
+            return self._read
+        return self.peek(count)[1]
+
+    def flush(self) -> None:
+        """書き込み中のセグメントをディスクに書き出す"""
+        self._map(self._write[0]).flush()
+
+    def close(self) -> None:
+        """全てのセグメントを閉じる"""
+        for segment_map in self._maps.values():
+            segment_map.flush()
+            segment_map.close()
+        self._maps.clear()
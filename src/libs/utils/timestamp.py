@@ -0,0 +1,64 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def iso8601_to_ms(value: str) -> int:
+    """
+    UTCのISO-8601文字列をUNIXミリ秒に変換する
+
+    ``YYYY-MM-DDTHH:MM:SS.f...Z`` の形式は小数部をミリ秒までに切り詰めてから
+    datetime.fromisoformat で変換する。ミリ秒未満は切り捨てる。
+    naive な時刻はUTCとして扱い、実行環境のタイムゾーンには依存しない。
+
+    Args:
+        value (str): ISO-8601形式の時刻（例: 2024-07-19T13:42:21.8333232Z）
+
+    Returns:
+        int: UNIXミリ秒
+
+    Raises:
+        ValueError: 時刻として解釈できない文字列が指定された場合
+    """
+    if len(value) > 24 and value[-1] == "Z" and value[19] == ".":
+        # ミリ秒未満と末尾の Z を落とす（naive な時刻としてUTCで扱う）
+        value = value[:23]
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp()) * 1000 + dt.microsecond // 1000
+
+
+class TimestampParser:
+    """
+    直前の文字列の変換結果を保持するISO-8601パーサ
+
+    1メッセージ内の約定は同じ時刻文字列を共有することが多いため、
+    直前と同じ文字列であれば変換をスキップする。
+
+    Attributes:
+        _last_value (Optional[str]): 直前に変換した文字列
+        _last_ms (int): 直前に変換した結果
+    """
+
+    __slots__ = ("_last_value", "_last_ms")
+
+    def __init__(self) -> None:
+        self._last_value: Optional[str] = None
+        self._last_ms = 0
+
+    def __call__(self, value: str) -> int:
+        """
+        ISO-8601文字列をUNIXミリ秒に変換する
+
+        Args:
+            value (str): ISO-8601形式の時刻
+
+        Returns:
+            int: UNIXミリ秒
+        """
+        if value == self._last_value:
+            return self._last_ms
+        timestamp_ms = iso8601_to_ms(value)
+        self._last_value = value
+        self._last_ms = timestamp_ms
+        return timestamp_ms
@@ -0,0 +1,81 @@
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+BUY = 1
+SELL = -1
+UNKNOWN = 0
+
+SIDE_FLAGS: Dict[str, int] = {
+    "BUY": BUY,
+    "Buy": BUY,
+    "buy": BUY,
+    "SELL": SELL,
+    "Sell": SELL,
+    "sell": SELL,
+}
+
+
+class TradeBatch:
+    """
+    列指向の約定データ
+
+    1メッセージ分の約定を、約定ごとの辞書ではなく型付き配列で保持する。
+
+    Attributes:
+        timestamps (array): 約定時刻（UNIXミリ秒）
+        prices (array): 約定価格
+        sizes (array): 約定数量
+        sides (array): 売買方向（BUY=1, SELL=-1, 不明=0）
+        received (Optional[float]): メッセージを受信した時刻（UNIX秒）
+    """
+
+    __slots__ = ("timestamps", "prices", "sizes", "sides", "received")
+
+    def __init__(self) -> None:
+        self.timestamps = array("q")
+        self.prices = array("d")
+        self.sizes = array("d")
+        self.sides = array("b")
+        self.received: Optional[float] = None
+
+    def append(self, timestamp: int, price: float, size: float, side: int) -> None:
+        """
+        約定を追加する
+
+        Args:
+            timestamp (int): 約定時刻（UNIXミリ秒）
+            price (float): 約定価格
+            size (float): 約定数量
+            side (int): 売買方向（BUY, SELL, UNKNOWN）
+        """
+        self.timestamps.append(timestamp)
+        self.prices.append(price)
+        self.sizes.append(size)
+        self.sides.append(side)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __iter__(self) -> Iterator[Tuple[int, float, float, int]]:
+        return zip(self.timestamps, self.prices, self.sizes, self.sides, strict=True)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """
+        約定ごとの辞書に変換する（デバッグ・互換用）
+
+        Returns:
+            List[Dict[str, Any]]: 約定データのリスト
+        """
+        side_names = {BUY: "BUY", SELL: "SELL", UNKNOWN: ""}
+        return [
+            {
+                "timestamp": timestamp,
+                "side": side_names[side],
+                "price": price,
+                "size": size,
+            }
+            for timestamp, price, size, side in self
+        ]
+
+    def __repr__(self) -> str:
+        return f"TradeBatch({self.to_dicts()})"
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+from argparse import ArgumentParser, Namespace
+
+from src.libs.replay import ReplayEngine, read_frames
+from src.libs.sink import JsonLinesSink
+from src.libs.utils import Instrument, LogManager, load_instruments, trace
+from src.libs.utils.json_decoder import JSON_DECODERS
+
+
+@trace
+async def main(args: Namespace) -> None:
+    """
+    キャプチャしたフレームからローソク足を生成し、JSON Lines で出力する
+
+    Args:
+        args: コマンドライン引数
+    """
+    if args.config:
+        instruments = load_instruments(args.config)
+    else:
+        instruments = [Instrument(args.exchange, args.contract, args.symbol)]
+
+    sink = JsonLinesSink(args.output)
+    engine = ReplayEngine(
+        instruments,
+        sink,
+        args.frequency,
+        speed=args.speed,
+        json_decoder=args.json_decoder,
+        allowed_lateness=args.allowed_lateness,
+        emit_empty=args.emit_empty,
+        late_policy=args.late_policy,
+        amend_delay=args.amend_delay,
+        latency_fields=args.latency_fields,
+    )
+    try:
+        await engine.run(read_frames(args.capture))
+    finally:
+        await sink.close()
+
+
+if __name__ == "__main__":
+    try:
+        parser = ArgumentParser()
+        parser.add_argument("exchange", type=str, nargs="?")
+        parser.add_argument("contract", type=str, nargs="?")
+        parser.add_argument("symbol", type=str, nargs="?")
+        parser.add_argument(
+            "--capture", type=str, nargs="+", required=True, help="files or directories"
+        )
+        parser.add_argument("--config", type=str, default=None)
+        parser.add_argument("--output", type=str, default="-")
+        parser.add_argument("--speed", type=float, default=0.0)
+        parser.add_argument("--frequency", type=int, default=1)
+        parser.add_argument("--allowed_lateness", type=float, default=None)
+        parser.add_argument("--emit_empty", action="store_true")
+        parser.add_argument(
+            "--late_policy", type=str, default="drop", choices=["drop", "amend"]
+        )
+        parser.add_argument("--amend_delay", type=float, default=0.0)
+        parser.add_argument(
+            "--json_decoder", type=str, default="auto", choices=JSON_DECODERS
+        )
+        parser.add_argument("--latency_fields", action="store_true")
+        parser.add_argument(
+            "--log_level",
+            type=str,
+            default="WARNING",
+            choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        )
+        args: Namespace = parser.parse_args()
+        if not args.config and not (args.exchange and args.contract and args.symbol):
+            parser.error("exchange, contract and symbol are required without --config")
+        log_manager = LogManager(args.log_level.upper())
+        logger = log_manager.get_logger(__name__)
+
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        logger.warning("KeyboardInterrupt detected, exiting.")
+    except Exception:
+        logger.error("Exception occurred", exc_info=True)
@@ -0,0 +1,77 @@
+"""
+Kinesis のレコードの形式（RecordCodec）のベンチマーク
+
+feeds.SyntheticFeed の約定から生成したローソク足を、形式と圧縮の組み合わせごとに
+エンコードし、1件あたりのバイト数と圧縮なしの JSON に対する比率、エンコードと
+デコードの1件あたりの時間を表示する。インストールされていない
+形式・圧縮（msgpack、zstd）は飛ばす。
+
+実行方法:
+    python -m tests.benchmarks.bench_codec --exchanges bybit --seconds 600
+"""
+
+import time
+from argparse import ArgumentParser, Namespace
+from typing import Any, Dict, List
+
+from src.libs.aws import RecordCodec
+from src.libs.aws.record_codec import RECORD_COMPRESSIONS, RECORD_FORMATS, decode_record
+from tests.benchmarks.bench_pipeline import Pipeline, _drain, _parsed_batches
+from tests.benchmarks.feeds import FORMATTERS, SyntheticFeed
+
+
+def candles(feed: SyntheticFeed, freq: int) -> List[Dict[str, Any]]:
+    pipeline = Pipeline(feed, freq)
+    frames = [frame for _, frame in feed.frames()]
+    for batch in _parsed_batches(feed, frames, freq):
+        pipeline.candle._update_candle(batch)
+    pipeline.candle.close()
+    return _drain(pipeline.candle_queue)
+
+
+def main(args: Namespace) -> None:
+    for exchange in args.exchanges:
+        feed = SyntheticFeed(
+            exchange, rate=args.rate, seconds=args.seconds, seed=args.seed
+        )
+        records = candles(feed, args.frequency)
+        tags = {
+            "exchange": feed.exchange,
+            "contract": feed.contract,
+            "symbol": feed.symbol,
+        }
+        json_encode = RecordCodec().encoder(tags)
+        baseline = sum(len(json_encode(record)) for record in records)
+        print(f"[{exchange} {len(records)} candles]")
+        for record_format in RECORD_FORMATS:
+            for compression in RECORD_COMPRESSIONS:
+                try:
+                    encode = RecordCodec(record_format, compression).encoder(tags)
+                except ValueError as e:
+                    print(f"  {record_format:8} {compression:5} skipped ({e})")
+                    continue
+                start = time.perf_counter()
+                encoded = [encode(record) for record in records]
+                encode_us = (time.perf_counter() - start) / len(records) * 1e6
+                start = time.perf_counter()
+                for data in encoded:
+                    decode_record(data)
+                decode_us = (time.perf_counter() - start) / len(records) * 1e6
+                size = sum(map(len, encoded))
+                print(
+                    f"  {record_format:8} {compression:5} {size / len(records):7.1f} bytes/record"
+                    f"  {size / baseline:6.1%} of json"
+                    f"  encode {encode_us:6.2f} us  decode {decode_us:6.2f} us"
+                )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--exchanges", nargs="+", default=list(FORMATTERS), choices=FORMATTERS
+    )
+    parser.add_argument("--rate", type=float, default=200.0, help="trades per second")
+    parser.add_argument("--seconds", type=float, default=300.0)
+    parser.add_argument("--frequency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
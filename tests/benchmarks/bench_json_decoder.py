@@ -0,0 +1,75 @@
+"""
+取引所ごとの WebSocket フレームのデコードのベンチマーク
+
+tests/fixtures の約定フレームを、利用できるデコーダごとにデコードし、
+デコードのみと on_message までを含めた1フレームあたりの時間を表示する。
+
+実行方法:
+    python -m tests.benchmarks.bench_json_decoder
+"""
+
+import timeit
+from pathlib import Path
+from typing import List
+
+from pybotters import WebSocketQueue
+
+from src.libs.exchange import load_exchanges
+from src.libs.utils import Instrument
+from src.libs.utils.json_decoder import JSON_DECODERS
+
+FIXTURES = Path(__file__).resolve().parent.parent / "fixtures"
+
+INSTRUMENTS = {
+    "bybit": [("linear", "BTCUSDT"), ("linear", "ETHUSDT")],
+    "binance": [("usdt_perpetual", "btcusdt"), ("usdt_perpetual", "ethusdt")],
+    "bitflyer": [("fx", "FX_BTC_JPY"), ("spot", "BTC_JPY")],
+}
+
+
+def load_frames(exchange: str) -> List[str]:
+    return (FIXTURES / f"{exchange}_trades.jsonl").read_text().splitlines()
+
+
+def bench(
+    exchange: str, json_decoder: str, frames: List[str], number: int = 20
+) -> None:
+    instruments = [Instrument(exchange, c, s) for c, s in INSTRUMENTS[exchange]]
+    queues = {instrument.name: WebSocketQueue() for instrument in instruments}
+    try:
+        (client,) = load_exchanges(instruments, queues, json_decoder)
+    except ValueError as e:
+        print(f"  {json_decoder:<8} skipped ({e})")
+        return
+
+    decode = client._decode
+
+    def decode_only() -> None:
+        for frame in frames:
+            decode(frame)
+
+    def end_to_end() -> None:
+        for frame in frames:
+            client.on_raw_message(frame, None)
+        for queue in queues.values():
+            queue._queue.clear()
+
+    results = []
+    for func in (decode_only, end_to_end):
+        elapsed = min(timeit.repeat(func, number=number, repeat=3))
+        results.append(elapsed / number / len(frames) * 1e6)
+    print(
+        f"  {json_decoder:<8} decode {results[0]:7.2f} us/frame  on_message {results[1]:7.2f} us/frame"
+    )
+
+
+def main() -> None:
+    for exchange in INSTRUMENTS:
+        frames = load_frames(exchange)
+        print(f"[{exchange}] {len(frames)} frames")
+        for json_decoder in JSON_DECODERS:
+            bench(exchange, json_decoder, frames)
+
+
+if __name__ == "__main__":
+    main()
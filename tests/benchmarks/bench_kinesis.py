@@ -0,0 +1,83 @@
+"""
+Kinesis の送信（バッチ・再送・並列度）のベンチマーク
+
+LocalKinesisClient のシャードの上限と応答の待ち時間のもとで、指定したレートの
+レコードを --symbols 銘柄に振り分けて Kinesis.write で送り、送信できた件数/秒、
+PutRecords の呼び出し回数、上限で拒否された件数と、再送しても送信できなかった件数を
+表示する。--no_rate_limit でシャードごとの送信レートの制限なしと比べる。
+
+実行方法:
+    python -m tests.benchmarks.bench_kinesis --shards 2 --symbols 4 --rate 3000 --seconds 10
+"""
+
+import asyncio
+import time
+from argparse import ArgumentParser, Namespace
+
+from src.libs.aws import Kinesis, LocalKinesisClient
+from src.libs.aws.kinesis import FAILED_RECORDS
+from src.libs.utils import LogManager
+
+
+async def run(args: Namespace, max_in_flight: int) -> None:
+    client = LocalKinesisClient(
+        shards=args.shards, latency=args.latency, jitter=args.jitter, retain=1
+    )
+    kinesis = Kinesis(
+        client=client,
+        stream_name="bench",
+        linger=args.linger,
+        max_in_flight=max_in_flight,
+        max_retries=args.max_retries,
+        rate_limit=not args.no_rate_limit,
+    )
+    failed = FAILED_RECORDS.labels("bench")
+    failed_before = failed.get()
+    instruments = [
+        {"exchange": "bench", "contract": "spot", "symbol": f"sym{n}"}
+        for n in range(args.symbols)
+    ]
+    total = int(args.rate * args.seconds)
+    started = time.perf_counter()
+    for i in range(total):
+        tags = dict(instruments[i % args.symbols])
+        await kinesis.write({"i": i, "close": 66913.5, "volume": 0.123}, tags)
+        delay = started + (i + 1) / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    await kinesis.close()
+    elapsed = time.perf_counter() - started
+
+    calls, accepted, throttled = client.stats()
+    print(
+        f"  max_in_flight={max_in_flight:<3} {accepted / elapsed:10,.0f} records/sec"
+        f"  calls {calls:6d}  throttled {throttled:7d}"
+        f"  failed {int(failed.get() - failed_before):7d}  lost {total - accepted:6d}"
+    )
+
+
+def main(args: Namespace) -> None:
+    print(
+        f"[shards={args.shards} symbols={args.symbols} rate={args.rate:,.0f}/s"
+        f" latency={args.latency}s linger={args.linger}s"
+        f" rate_limit={not args.no_rate_limit}]"
+    )
+    for max_in_flight in args.max_in_flight:
+        asyncio.run(run(args, max_in_flight))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--symbols", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=2000.0, help="records per second")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--linger", type=float, default=0.2)
+    parser.add_argument("--max_retries", type=int, default=3)
+    parser.add_argument("--max_in_flight", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--no_rate_limit", action="store_true")
+    # 再送の警告で結果が埋もれないようにする
+    LogManager("ERROR")
+    main(parser.parse_args())
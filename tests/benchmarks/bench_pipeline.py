@@ -0,0 +1,406 @@
+"""
+約定の受信からレコードのシリアライズまでのベンチマーク
+
+feeds.SyntheticFeed で生成したフレームを使い、次の段をそれぞれ計測する。
+
+- ``parse``: デコード済みのフレームに対する Exchange.on_message（TradeBatch の生成まで）
+- ``candle_update``: 約定ごとの Candle._update_candle（足の確定を含む）
+- ``candle_finalize``: Candle._finalize_candle（candle_update の内数）
+- ``serialize``: タグを付けた JSON へのシリアライズ（Kinesis.publish と同じ RecordCodec）
+- ``end_to_end``: フレームの受信（on_raw_message）からシリアライズまで
+
+段ごとに処理件数/秒、1件あたりの p50/p99 レイテンシ、tracemalloc のピークメモリを
+出力する。計測は repeat 回繰り返して合計時間が最短の回を採用し、ピークメモリは
+計測とは別に tracemalloc を有効にした1回で求める（入力の準備は含まない）。
+
+--output で結果を JSON に保存し、--compare で保存済みの結果と比較する。比較では
+処理件数/秒の低下または p99 の増加が threshold を超えた段を回帰として表示し、
+終了コード1で終了する。
+
+実行方法:
+    python -m tests.benchmarks.bench_pipeline --output bench.json
+    python -m tests.benchmarks.bench_pipeline --compare bench.json
+"""
+
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser, Namespace
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+from pybotters import WebSocketQueue
+
+from src.libs.aws import RecordCodec
+from src.libs.exchange import Exchange, load_exchanges
+from src.libs.utils import Candle, Instrument
+from tests.benchmarks.feeds import FORMATTERS, SHAPES, SyntheticFeed
+
+STAGES = ("parse", "candle_update", "candle_finalize", "serialize", "end_to_end")
+
+# 1回の計測の結果（処理件数、1回の呼び出しごとの時間（ns））
+Run = Tuple[int, List[int]]
+# 入力を準備し、計測する処理を返す関数
+Benchmark = Callable[[SyntheticFeed, List[str], int], Callable[[], Run]]
+
+
+def percentile(samples: List[int], q: float) -> float:
+    """
+    昇順に並べた標本の q 分位点（最近傍法）を返す
+
+    Args:
+        samples (List[int]): 昇順の標本
+        q (float): 分位（0〜1）
+
+    Returns:
+        float: 分位点。標本がない場合は0
+    """
+    if not samples:
+        return 0.0
+    return float(samples[min(len(samples) - 1, int(q * len(samples)))])
+
+
+def _drain(queue: WebSocketQueue) -> List[Any]:
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+class Pipeline:
+    """
+    1銘柄分の取引所クラスとローソク足生成
+
+    Attributes:
+        instrument (Instrument): 銘柄
+        exchange (Exchange): 取引所クラス
+        trade_queue (WebSocketQueue): 約定のキュー
+        candle (Candle): ローソク足生成
+        candle_queue (WebSocketQueue): ローソク足のキュー
+    """
+
+    def __init__(self, feed: SyntheticFeed, freq: int) -> None:
+        self.instrument = Instrument(feed.exchange, feed.contract, feed.symbol)
+        self.trade_queue = WebSocketQueue()
+        (self.exchange,) = load_exchanges(
+            [self.instrument], {self.instrument.name: self.trade_queue}
+        )
+        self.candle_queue = WebSocketQueue()
+        self.candle = Candle(
+            self.trade_queue, self.candle_queue, freq, tags=self.instrument.tags
+        )
+
+
+def bench_parse(feed: SyntheticFeed, frames: List[str], freq: int) -> Callable[[], Run]:
+    pipeline = Pipeline(feed, freq)
+    exchange: Exchange = pipeline.exchange
+    messages = [exchange._decode(frame) for frame in frames]
+
+    def run() -> Run:
+        on_message = exchange.on_message
+        clock = time.perf_counter_ns
+        samples = []
+        for msg in messages:
+            start = clock()
+            on_message(msg, None)
+            samples.append(clock() - start)
+        return sum(len(batch) for batch in _drain(pipeline.trade_queue)), samples
+
+    return run
+
+
+def _parsed_batches(feed: SyntheticFeed, frames: List[str], freq: int) -> List[Any]:
+    pipeline = Pipeline(feed, freq)
+    for frame in frames:
+        pipeline.exchange.on_raw_message(frame, None)
+    return _drain(pipeline.trade_queue)
+
+
+def bench_candle_update(
+    feed: SyntheticFeed, frames: List[str], freq: int
+) -> Callable[[], Run]:
+    batches = _parsed_batches(feed, frames, freq)
+    candle = Pipeline(feed, freq).candle
+
+    def run() -> Run:
+        update = candle._update_candle
+        clock = time.perf_counter_ns
+        samples = []
+        for batch in batches:
+            start = clock()
+            update(batch)
+            samples.append(clock() - start)
+        return sum(len(batch) for batch in batches), samples
+
+    return run
+
+
+def bench_candle_finalize(
+    feed: SyntheticFeed, frames: List[str], freq: int
+) -> Callable[[], Run]:
+    batches = _parsed_batches(feed, frames, freq)
+    candle = Pipeline(feed, freq).candle
+    finalize = candle._finalize_candle
+    clock = time.perf_counter_ns
+    samples: List[int] = []
+
+    def timed(key: int) -> None:
+        start = clock()
+        finalize(key)
+        samples.append(clock() - start)
+
+    def run() -> Run:
+        candle._finalize_candle = timed
+        for batch in batches:
+            candle._update_candle(batch)
+        candle.close()
+        return len(samples), samples
+
+    return run
+
+
+def bench_serialize(
+    feed: SyntheticFeed, frames: List[str], freq: int
+) -> Callable[[], Run]:
+    pipeline = Pipeline(feed, freq)
+    for batch in _parsed_batches(feed, frames, freq):
+        pipeline.candle._update_candle(batch)
+    pipeline.candle.close()
+    records = _drain(pipeline.candle_queue)
+    encode = RecordCodec().encoder(pipeline.instrument.tags)
+
+    def run() -> Run:
+        clock = time.perf_counter_ns
+        samples = []
+        for record in records:
+            start = clock()
+            encode(record)
+            samples.append(clock() - start)
+        return len(records), samples
+
+    return run
+
+
+def bench_end_to_end(
+    feed: SyntheticFeed, frames: List[str], freq: int
+) -> Callable[[], Run]:
+    pipeline = Pipeline(feed, freq)
+
+    def run() -> Run:
+        on_raw_message = pipeline.exchange.on_raw_message
+        trade_queue = pipeline.trade_queue
+        candle = pipeline.candle
+        candle_queue = pipeline.candle_queue
+        encode = RecordCodec().encoder(pipeline.instrument.tags)
+        clock = time.perf_counter_ns
+        trades = 0
+        samples = []
+        for frame in frames:
+            start = clock()
+            on_raw_message(frame, None)
+            while not trade_queue.empty():
+                batch = trade_queue.get_nowait()
+                trades += len(batch)
+                candle.update(batch)
+            while not candle_queue.empty():
+                encode(candle_queue.get_nowait())
+            samples.append(clock() - start)
+        return trades, samples
+
+    return run
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    "parse": bench_parse,
+    "candle_update": bench_candle_update,
+    "candle_finalize": bench_candle_finalize,
+    "serialize": bench_serialize,
+    "end_to_end": bench_end_to_end,
+}
+
+UNITS = {
+    "parse": "trades",
+    "candle_update": "trades",
+    "candle_finalize": "candles",
+    "serialize": "candles",
+    "end_to_end": "trades",
+}
+
+
+def measure(
+    feed: SyntheticFeed, stage: str, freq: int = 1, repeat: int = 3
+) -> Dict[str, Any]:
+    """
+    1つの段を計測する
+
+    Args:
+        feed (SyntheticFeed): フレームの生成器
+        stage (str): 段の名前（STAGES のいずれか）
+        freq (int, optional): ローソク足の頻度（秒単位）
+        repeat (int, optional): 繰り返す回数
+
+    Returns:
+        Dict[str, Any]: 段の計測結果
+    """
+    frames = [frame for _, frame in feed.frames()]
+    benchmark = BENCHMARKS[stage]
+
+    best: Run = (0, [])
+    best_total = None
+    for _ in range(repeat):
+        items, samples = benchmark(feed, frames, freq)()
+        total = sum(samples)
+        if best_total is None or total < best_total:
+            best, best_total = (items, samples), total
+
+    run = benchmark(feed, frames, freq)
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        run()
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+    items, samples = best
+    samples.sort()
+    seconds = (best_total or 0) / 1e9
+    return {
+        "exchange": feed.exchange,
+        "shape": feed.shape,
+        "stage": stage,
+        "unit": UNITS[stage],
+        "frames": len(frames),
+        "items": items,
+        "per_sec": items / seconds if seconds > 0 else 0.0,
+        "p50_us": percentile(samples, 0.5) / 1000,
+        "p99_us": percentile(samples, 0.99) / 1000,
+        "peak_kib": peak / 1024,
+    }
+
+
+def result_key(result: Dict[str, Any]) -> Tuple[str, str, str]:
+    return result["exchange"], result["shape"], result["stage"]
+
+
+def compare(
+    baseline: List[Dict[str, Any]], current: List[Dict[str, Any]], threshold: float
+) -> List[str]:
+    """
+    保存済みの結果と比較し、回帰した段の説明を返す
+
+    Args:
+        baseline (List[Dict[str, Any]]): 保存済みの結果
+        current (List[Dict[str, Any]]): 今回の結果
+        threshold (float): 回帰とみなす変化の割合
+
+    Returns:
+        List[str]: 回帰の説明（回帰がない場合は空）
+    """
+    previous = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in current:
+        before = previous.get(result_key(result))
+        if before is None:
+            continue
+        name = "/".join(result_key(result))
+        if before["per_sec"] > 0 and result["per_sec"] < before["per_sec"] * (
+            1 - threshold
+        ):
+            regressions.append(
+                f"{name}: {result['unit']}/sec {before['per_sec']:,.0f} -> {result['per_sec']:,.0f}"
+            )
+        if before["p99_us"] > 0 and result["p99_us"] > before["p99_us"] * (
+            1 + threshold
+        ):
+            regressions.append(
+                f"{name}: p99 {before['p99_us']:.2f} us -> {result['p99_us']:.2f} us"
+            )
+    return regressions
+
+
+def print_result(result: Dict[str, Any], before: Dict[str, Any] | None = None) -> None:
+    line = (
+        f"  {result['stage']:<16} {result['per_sec']:>12,.0f} {result['unit']}/sec"
+        f"  p50 {result['p50_us']:8.2f} us  p99 {result['p99_us']:8.2f} us"
+        f"  peak {result['peak_kib']:9.1f} KiB"
+    )
+    if before is not None and before["per_sec"] > 0:
+        line += f"  ({result['per_sec'] / before['per_sec'] - 1:+.1%})"
+    print(line)
+
+
+def main(args: Namespace) -> int:
+    baseline: List[Dict[str, Any]] = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    previous = {result_key(result): result for result in baseline}
+
+    results = []
+    for exchange in args.exchanges:
+        for shape in args.shapes:
+            feed = SyntheticFeed(
+                exchange,
+                rate=args.rate,
+                seconds=args.seconds,
+                shape=shape,
+                max_batch=args.max_batch,
+                seed=args.seed,
+            )
+            print(f"[{exchange} {shape}]")
+            for stage in args.stages:
+                result = measure(feed, stage, args.frequency, args.repeat)
+                print_result(result, previous.get(result_key(result)))
+                results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "created": datetime.now(timezone.utc).isoformat(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "parameters": {
+                        "rate": args.rate,
+                        "seconds": args.seconds,
+                        "max_batch": args.max_batch,
+                        "frequency": args.frequency,
+                        "repeat": args.repeat,
+                        "seed": args.seed,
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+    if not args.compare:
+        return 0
+    regressions = compare(baseline, results, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--exchanges", nargs="+", default=list(FORMATTERS), choices=FORMATTERS
+    )
+    parser.add_argument(
+        "--shapes", nargs="+", default=["poisson", "burst"], choices=SHAPES
+    )
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--rate", type=float, default=2000.0, help="trades per second")
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--max_batch", type=int, default=50)
+    parser.add_argument("--frequency", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--compare", type=str, default=None)
+    parser.add_argument("--threshold", type=float, default=0.1)
+    sys.exit(main(parser.parse_args()))
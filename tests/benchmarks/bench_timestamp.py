@@ -0,0 +1,48 @@
+"""
+bitFlyer の exec_date 変換のマイクロベンチマーク
+
+実行方法:
+    python -m tests.benchmarks.bench_timestamp
+"""
+
+import timeit
+from datetime import datetime
+
+from src.libs.utils.timestamp import TimestampParser, iso8601_to_ms
+
+EXEC_DATES = [f"2024-07-19T13:42:{i % 60:02d}.{i:07d}Z" for i in range(1000)]
+# 1メッセージ内の約定は同じ exec_date を共有することが多い
+REPEATED = [date for date in EXEC_DATES[:100] for _ in range(10)]
+
+
+def strptime_to_ms(exec_date: str) -> int:
+    """変更前の Bitflyer._on_trade と同じ変換"""
+    exec_date = exec_date.rstrip("Z")
+    if "." in exec_date:
+        exec_date, microseconds = exec_date.split(".")
+        microseconds = microseconds[:6].ljust(6, "0")
+        exec_date = f"{exec_date}.{microseconds}"
+    else:
+        exec_date = f"{exec_date}.000000"
+    dt = datetime.strptime(exec_date, "%Y-%m-%dT%H:%M:%S.%f")
+    return int(dt.timestamp() * 1000)
+
+
+def bench(name: str, func, values, number: int = 20) -> None:
+    elapsed = min(
+        timeit.repeat(lambda: [func(v) for v in values], number=number, repeat=3)
+    )
+    per_call_ns = elapsed / number / len(values) * 1e9
+    print(f"{name:<32} {per_call_ns:8.0f} ns/call")
+
+
+def main() -> None:
+    for label, values in (("unique", EXEC_DATES), ("repeated x10", REPEATED)):
+        print(f"[{label}]")
+        bench("strptime (baseline)", strptime_to_ms, values)
+        bench("iso8601_to_ms", iso8601_to_ms, values)
+        bench("TimestampParser", TimestampParser(), values)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+取引所ごとの約定フレームの合成
+
+Bybit の publicTrade、Binance の @trade（Combined streams）、bitFlyer の
+lightning_executions と同じ形式のフレームを、指定した約定レートと到着の形
+（shape）で生成する。乱数の種を固定すれば同じフレーム列になる。
+
+- ``steady``: 一定間隔で到着する
+- ``poisson``: 指数分布の間隔で到着する
+- ``burst``: 毎秒の先頭 burst_ratio の時間に burst_factor 倍のレートで到着し、
+  残りの時間は平均レートが rate になるように減らす
+
+Bybit と bitFlyer は同じ時刻の約定を1フレームにまとめる（最大 max_batch 件）。
+Binance は1約定1フレームで送られるため、まとめない。
+"""
+
+import json
+import random
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+SHAPES = ("steady", "poisson", "burst")
+
+# 取引所と、生成するフレームに合う契約・銘柄・初期価格
+INSTRUMENTS: Dict[str, Tuple[str, str, float]] = {
+    "bybit": ("linear", "BTCUSDT", 66913.5),
+    "binance": ("usdt_perpetual", "btcusdt", 66913.36),
+    "bitflyer": ("fx", "FX_BTC_JPY", 10219771.0),
+}
+
+# 約定時刻（UNIXミリ秒）、価格、数量、買いか
+Trade = Tuple[int, float, float, bool]
+
+
+def _bybit(symbol: str, trades: List[Trade], rng: random.Random) -> str:
+    return json.dumps(
+        {
+            "topic": f"publicTrade.{symbol}",
+            "type": "snapshot",
+            "ts": trades[-1][0] + 2,
+            "data": [
+                {
+                    "T": timestamp,
+                    "s": symbol,
+                    "S": "Buy" if buy else "Sell",
+                    "v": f"{size:.3f}",
+                    "p": f"{price:.2f}",
+                    "L": "PlusTick" if buy else "MinusTick",
+                    "i": str(uuid.UUID(int=rng.getrandbits(128))),
+                    "BT": False,
+                }
+                for timestamp, price, size, buy in trades
+            ],
+        },
+        separators=(",", ":"),
+    )
+
+
+def _binance(symbol: str, trades: List[Trade], rng: random.Random) -> str:
+    ((timestamp, price, size, buy),) = trades
+    return json.dumps(
+        {
+            "stream": f"{symbol}@trade",
+            "data": {
+                "e": "trade",
+                "E": timestamp + 1,
+                "s": symbol.upper(),
+                "t": rng.getrandbits(32),
+                "p": f"{price:.8f}",
+                "q": f"{size:.8f}",
+                "T": timestamp,
+                "m": not buy,
+                "M": True,
+            },
+        },
+        separators=(",", ":"),
+    )
+
+
+def _bitflyer(symbol: str, trades: List[Trade], rng: random.Random) -> str:
+    messages = []
+    for timestamp, price, size, buy in trades:
+        exec_date = datetime.fromtimestamp(timestamp / 1000, timezone.utc)
+        order_date = exec_date.strftime("%Y%m%d-%H%M%S")
+        messages.append(
+            {
+                "id": rng.getrandbits(32),
+                "side": "BUY" if buy else "SELL",
+                "price": round(price),
+                "size": round(size, 8),
+                "exec_date": exec_date.strftime("%Y-%m-%dT%H:%M:%S.%f") + "0Z",
+                "buy_child_order_acceptance_id": f"JRF{order_date}-{rng.randrange(10**6):06d}",
+                "sell_child_order_acceptance_id": f"JRF{order_date}-{rng.randrange(10**6):06d}",
+            }
+        )
+    return json.dumps(
+        {
+            "jsonrpc": "2.0",
+            "method": "channelMessage",
+            "params": {
+                "channel": f"lightning_executions_{symbol}",
+                "message": messages,
+            },
+        },
+        separators=(",", ":"),
+    )
+
+
+FORMATTERS: Dict[str, Callable[[str, List[Trade], random.Random], str]] = {
+    "bybit": _bybit,
+    "binance": _binance,
+    "bitflyer": _bitflyer,
+}
+
+
+class SyntheticFeed:
+    """
+    約定フレームの生成器
+
+    Attributes:
+        exchange (str): 取引所名
+        contract (str): 契約種別
+        symbol (str): 銘柄
+        rate (float): 平均の約定レート（件/秒）
+        seconds (float): 生成する期間（秒）
+        shape (str): 到着の形（SHAPES のいずれか）
+        max_batch (int): 1フレームにまとめる最大の約定数
+        burst_factor (float): burst の区間のレートの倍率
+        burst_ratio (float): 毎秒のうち burst の区間の割合
+        start (float): 最初の約定時刻（UNIX秒）
+        seed (int): 乱数の種
+    """
+
+    def __init__(
+        self,
+        exchange: str,
+        rate: float = 1000.0,
+        seconds: float = 10.0,
+        shape: str = "poisson",
+        max_batch: int = 50,
+        burst_factor: float = 20.0,
+        burst_ratio: float = 0.02,
+        start: float = 1721396541.0,
+        seed: int = 0,
+        symbol: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            exchange (str): 取引所名（FORMATTERS のキー）
+            rate (float, optional): 平均の約定レート（件/秒）
+            seconds (float, optional): 生成する期間（秒）
+            shape (str, optional): 到着の形（SHAPES のいずれか）
+            max_batch (int, optional): 1フレームにまとめる最大の約定数
+            burst_factor (float, optional): burst の区間のレートの倍率
+            burst_ratio (float, optional): 毎秒のうち burst の区間の割合
+            start (float, optional): 最初の約定時刻（UNIX秒）
+            seed (int, optional): 乱数の種
+            symbol (Optional[str], optional): 銘柄（トピックと同じ表記）。
+                指定しない場合は INSTRUMENTS の銘柄
+
+        Raises:
+            ValueError: サポートされていない取引所または到着の形が指定された場合
+        """
+        if exchange not in FORMATTERS:
+            raise ValueError(f"Unsupported exchange: {exchange}")
+        if shape not in SHAPES:
+            raise ValueError(f"Unsupported shape: {shape}")
+        if shape == "burst" and burst_factor * burst_ratio >= 1:
+            raise ValueError("burst_factor * burst_ratio must be less than 1")
+        self.exchange = exchange
+        self.contract, default_symbol, self._price = INSTRUMENTS[exchange]
+        self.symbol = symbol or default_symbol
+        self.rate = rate
+        self.seconds = seconds
+        self.shape = shape
+        self.max_batch = 1 if exchange == "binance" else max_batch
+        self.burst_factor = burst_factor
+        self.burst_ratio = burst_ratio
+        self.start = start
+        self.seed = seed
+
+    def _elapsed(self, count: float) -> float:
+        """累積の到着数 count に達する経過秒数（到着率の積分の逆関数）"""
+        if self.shape != "burst":
+            return count / self.rate
+        seconds, remainder = divmod(count, self.rate)
+        burst_rate = self.rate * self.burst_factor
+        burst_count = burst_rate * self.burst_ratio
+        if remainder < burst_count:
+            return seconds + remainder / burst_rate
+        quiet_rate = (self.rate - burst_count) / (1 - self.burst_ratio)
+        return seconds + self.burst_ratio + (remainder - burst_count) / quiet_rate
+
+    def _arrivals(self, rng: random.Random) -> Iterator[float]:
+        count = 0.0
+        while True:
+            # 到着率1の過程（steady は等間隔、poisson は指数分布の間隔）を時間変換する
+            count += rng.expovariate(1.0) if self.shape == "poisson" else 1.0
+            elapsed = self._elapsed(count)
+            if elapsed >= self.seconds:
+                return
+            yield elapsed
+
+    def trades(self) -> Iterator[Trade]:
+        """
+        約定を時刻順に生成する（価格は相対的なランダムウォーク）
+
+        Yields:
+            Trade: 約定時刻（UNIXミリ秒）、価格、数量、買いか
+        """
+        rng = random.Random(self.seed)
+        price = self._price
+        tick = price * 1e-5
+        for elapsed in self._arrivals(rng):
+            price += tick * rng.choice((-1, 0, 0, 1))
+            size = rng.lognormvariate(-4.0, 1.5)
+            yield int((self.start + elapsed) * 1000), price, size, rng.random() < 0.5
+
+    def frames(self) -> Iterator[Tuple[float, str]]:
+        """
+        約定を同じ時刻ごとに max_batch 件までまとめたフレームを生成する
+
+        Yields:
+            Tuple[float, str]: 受信時刻（UNIX秒、最後の約定の5ms後）とフレーム
+        """
+        rng = random.Random(self.seed + 1)
+        format_frame = FORMATTERS[self.exchange]
+        batch: List[Trade] = []
+        for trade in self.trades():
+            if batch and (trade[0] != batch[-1][0] or len(batch) >= self.max_batch):
+                yield batch[-1][0] / 1000 + 0.005, format_frame(self.symbol, batch, rng)
+                batch = []
+            batch.append(trade)
+        if batch:
+            yield batch[-1][0] / 1000 + 0.005, format_frame(self.symbol, batch, rng)
@@ -0,0 +1,93 @@
+"""
+取引所のWebSocketのシミュレータを起動する
+
+実行方法:
+    # 合成した約定を銘柄ごとに毎秒2000件、10分ごとに切断して送る
+    python -m tests.simulator --rate 2000 --shape burst --disconnect_after 600
+    # キャプチャしたフレームを10倍速で繰り返し送る
+    python -m tests.simulator --capture captures/ --speed 10 --loop
+
+    # collector はシミュレータに接続する
+    python -Bum collector bybit linear BTCUSDT --ws_base_url ws://127.0.0.1:8765
+"""
+
+import asyncio
+from argparse import ArgumentParser, Namespace
+
+from src.libs.utils import LogManager
+from tests.benchmarks.feeds import SHAPES
+from tests.simulator.server import (
+    CaptureSource,
+    FaultPlan,
+    SimulatorServer,
+    SyntheticSource,
+)
+
+
+async def main(args: Namespace) -> None:
+    logger = LogManager.get_logger(__name__)
+    if args.capture:
+        source = CaptureSource(args.capture, speed=args.speed, loop=args.loop)
+    else:
+        source = SyntheticSource(
+            rate=args.rate,
+            shape=args.shape,
+            seconds=args.seconds,
+            max_batch=args.max_batch,
+            seed=args.seed,
+        )
+    faults = FaultPlan(
+        disconnect_after=args.disconnect_after,
+        abort=args.abort,
+        stall_every=args.stall_every,
+        stall_seconds=args.stall_seconds,
+        delay_probability=args.delay_probability,
+        delay_seconds=args.delay_seconds,
+        seed=args.seed,
+    )
+    server = SimulatorServer(source, faults, args.host, args.port)
+    await server.start()
+    try:
+        while True:
+            await asyncio.sleep(args.stats_interval)
+            logger.info(
+                f"connections={server.connections} disconnects={server.disconnects} "
+                f"frames_sent={server.frames_sent}"
+            )
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--capture", type=str, nargs="+", default=None)
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--loop", action="store_true")
+    parser.add_argument(
+        "--rate", type=float, default=1000.0, help="trades per second per symbol"
+    )
+    parser.add_argument("--shape", type=str, default="poisson", choices=SHAPES)
+    parser.add_argument("--seconds", type=float, default=86400.0)
+    parser.add_argument("--max_batch", type=int, default=50)
+    parser.add_argument("--disconnect_after", type=float, default=None)
+    parser.add_argument("--abort", action="store_true")
+    parser.add_argument("--stall_every", type=float, default=None)
+    parser.add_argument("--stall_seconds", type=float, default=0.0)
+    parser.add_argument("--delay_probability", type=float, default=0.0)
+    parser.add_argument("--delay_seconds", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stats_interval", type=float, default=60.0)
+    parser.add_argument(
+        "--log_level",
+        type=str,
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+    )
+    args = parser.parse_args()
+    LogManager(args.log_level.upper())
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
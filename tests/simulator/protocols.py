@@ -0,0 +1,151 @@
+"""
+取引所ごとの購読のハンドシェイクとトピックの取り出し
+
+シミュレータは接続先（public_ws_url）のホストで取引所を判定し、クライアントが
+送る購読メッセージに対して各取引所と同じ形式の応答を返す。
+"""
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+
+class Protocol:
+    """
+    取引所のWebSocketのプロトコルの基底クラス
+
+    Attributes:
+        name (str): 取引所名（feeds.FORMATTERS のキー）
+        trade_prefix (str): 約定のトピックの接頭辞
+        trade_suffix (str): 約定のトピックの接尾辞
+        _conn_id (str): 接続ID
+    """
+
+    name = ""
+    trade_prefix = ""
+    trade_suffix = ""
+
+    def __init__(self, conn_id: str) -> None:
+        self._conn_id = conn_id
+
+    def handle(self, msg: Any) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        クライアントからのメッセージを処理する
+
+        Args:
+            msg (Any): デコードしたメッセージ
+
+        Returns:
+            Tuple[List[str], List[Dict[str, Any]]]: 購読したトピックと、返す応答
+        """
+        raise NotImplementedError
+
+    def topic(self, msg: Any) -> Optional[str]:
+        """
+        サーバーから送るメッセージのトピックを返す
+
+        Args:
+            msg (Any): デコードしたメッセージ
+
+        Returns:
+            Optional[str]: トピック。購読の応答などトピックがない場合は None
+        """
+        raise NotImplementedError
+
+    def trade_symbols(self, topics: Set[str]) -> List[str]:
+        """
+        約定のトピックから銘柄を取り出す
+
+        Args:
+            topics (Set[str]): 購読しているトピック
+
+        Returns:
+            List[str]: トピックと同じ表記の銘柄（名前順）
+        """
+        return sorted(
+            topic[len(self.trade_prefix) : len(topic) - len(self.trade_suffix)]
+            for topic in topics
+            if topic.startswith(self.trade_prefix) and topic.endswith(self.trade_suffix)
+        )
+
+
+class BybitProtocol(Protocol):
+    """Bybit v5 public（``{"op": "subscribe", "args": [...]}``）"""
+
+    name = "bybit"
+    trade_prefix = "publicTrade."
+
+    def handle(self, msg: Any) -> Tuple[List[str], List[Dict[str, Any]]]:
+        op = msg.get("op")
+        if op not in ("subscribe", "ping"):
+            return [], []
+        reply = {
+            "success": True,
+            "ret_msg": "pong" if op == "ping" else "",
+            "conn_id": self._conn_id,
+            "req_id": msg.get("req_id", ""),
+            "op": op,
+        }
+        return (list(msg.get("args", [])) if op == "subscribe" else []), [reply]
+
+    def topic(self, msg: Any) -> Optional[str]:
+        return msg.get("topic")
+
+
+class BinanceProtocol(Protocol):
+    """Binance Combined streams（``{"method": "SUBSCRIBE", "params": [...]}``）"""
+
+    name = "binance"
+    trade_suffix = "@trade"
+
+    def handle(self, msg: Any) -> Tuple[List[str], List[Dict[str, Any]]]:
+        if msg.get("method") != "SUBSCRIBE":
+            return [], []
+        return list(msg.get("params", [])), [{"result": None, "id": msg.get("id")}]
+
+    def topic(self, msg: Any) -> Optional[str]:
+        return msg.get("stream")
+
+
+class BitflyerProtocol(Protocol):
+    """bitFlyer JSON-RPC（``{"method": "subscribe", "params": {"channel": ...}}``）"""
+
+    name = "bitflyer"
+    trade_prefix = "lightning_executions_"
+
+    def handle(self, msg: Any) -> Tuple[List[str], List[Dict[str, Any]]]:
+        if msg.get("method") != "subscribe":
+            return [], []
+        channel = msg.get("params", {}).get("channel")
+        reply = {"jsonrpc": "2.0", "id": msg.get("id"), "result": True}
+        return ([channel] if channel else []), [reply]
+
+    def topic(self, msg: Any) -> Optional[str]:
+        return msg.get("params", {}).get("channel")
+
+
+PROTOCOLS = {
+    "bybit": BybitProtocol,
+    "binance": BinanceProtocol,
+    "bitflyer": BitflyerProtocol,
+}
+
+
+def load_protocol(url: str, conn_id: str) -> Protocol:
+    """
+    接続先のホストに対応するプロトコルを返す
+
+    Args:
+        url (str): 取引所の public_ws_url
+        conn_id (str): 接続ID
+
+    Returns:
+        Protocol: プロトコル
+
+    Raises:
+        ValueError: 対応する取引所がない場合
+    """
+    host = urlparse(url).hostname or ""
+    for name, protocol in PROTOCOLS.items():
+        if name in host:
+            return protocol(conn_id)
+    raise ValueError(f"Unsupported url: {url}")
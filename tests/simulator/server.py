@@ -0,0 +1,329 @@
+"""
+取引所のWebSocketを模したローカルのサーバー
+
+Exchange.ws_base_url にサーバーのURLを設定すると、取引所クラスは
+``{ws_base_url}/{ホスト}/{パス}`` に接続する。サーバーはパスから元の接続先
+（public_ws_url）を復元して取引所のプロトコルを選び、購読したトピックの
+フレームをトラフィックの生成元（source）から送る。
+
+- CaptureSource: キャプチャしたフレームを受信間隔どおり（speed 倍速）に送る
+- SyntheticSource: feeds.SyntheticFeed で合成したフレームを現在時刻で送る
+
+FaultPlan で切断・停止・遅延を注入し、再接続やヘルスチェックを検証する。
+"""
+
+import asyncio
+import heapq
+import json
+import random
+import time
+import uuid
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from aiohttp import WSCloseCode, WSMsgType, web
+
+from src.libs.replay.capture import read_frames
+from src.libs.utils.logger import LogManager
+from tests.benchmarks.feeds import SyntheticFeed
+from tests.simulator.protocols import Protocol, load_protocol
+
+# 最初の購読から送信を始めるまでの待ち時間（購読が複数のメッセージに分かれる場合）
+SUBSCRIBE_SETTLE = 0.1
+
+# 接続の開始からの経過秒数とフレーム
+Frame = Tuple[float, str]
+
+
+class CaptureSource:
+    """
+    キャプチャしたフレームを接続先ごとに送る
+
+    Attributes:
+        paths (List[str]): キャプチャのファイルまたはディレクトリ
+        speed (float): 再生速度（受信間隔を speed 分の1にする）
+        loop (bool): 最後まで送ったら最初から繰り返すか
+    """
+
+    def __init__(
+        self, paths: Iterable[str], speed: float = 1.0, loop: bool = False
+    ) -> None:
+        self.paths = list(paths)
+        self.speed = speed
+        self.loop = loop
+
+    def frames(
+        self, protocol: Protocol, url: str, topics: Set[str], start: float
+    ) -> Iterator[Frame]:
+        """
+        接続先と購読したトピックに一致するフレームを受信順に返す
+
+        Args:
+            protocol (Protocol): 取引所のプロトコル
+            url (str): 接続先（public_ws_url）
+            topics (Set[str]): 購読しているトピック
+            start (float): 送信を始めた時刻（UNIX秒、使わない）
+
+        Yields:
+            Frame: 接続の開始からの経過秒数とフレーム
+        """
+        offset = 0.0
+        while True:
+            first: Optional[float] = None
+            last = 0.0
+            for received, source, data in read_frames(self.paths):
+                if source != url:
+                    continue
+                try:
+                    topic = protocol.topic(json.loads(data))
+                except ValueError:
+                    continue
+                if topic not in topics:
+                    continue
+                if first is None:
+                    first = received
+                last = offset + (received - first) / self.speed
+                yield last, data
+            if not self.loop or first is None:
+                return
+            offset = last
+
+
+class SyntheticSource:
+    """
+    購読した約定のトピックごとに SyntheticFeed のフレームを生成して送る
+
+    約定時刻は送信を始めた時刻から始まるため、取引所側の遅延はほぼ0になる。
+
+    Attributes:
+        rate (float): 銘柄ごとの平均の約定レート（件/秒）
+        shape (str): 到着の形（feeds.SHAPES のいずれか）
+        seconds (float): 1接続で生成する期間（秒）
+        max_batch (int): 1フレームにまとめる最大の約定数
+        seed (int): 乱数の種
+    """
+
+    def __init__(
+        self,
+        rate: float = 1000.0,
+        shape: str = "poisson",
+        seconds: float = 86400.0,
+        max_batch: int = 50,
+        seed: int = 0,
+    ) -> None:
+        self.rate = rate
+        self.shape = shape
+        self.seconds = seconds
+        self.max_batch = max_batch
+        self.seed = seed
+
+    def frames(
+        self, protocol: Protocol, url: str, topics: Set[str], start: float
+    ) -> Iterator[Frame]:
+        """
+        購読した銘柄のフレームを時刻順に返す
+
+        Args:
+            protocol (Protocol): 取引所のプロトコル
+            url (str): 接続先（public_ws_url、使わない）
+            topics (Set[str]): 購読しているトピック
+            start (float): 送信を始めた時刻（UNIX秒）
+
+        Yields:
+            Frame: 接続の開始からの経過秒数とフレーム
+        """
+        feeds = [
+            SyntheticFeed(
+                protocol.name,
+                rate=self.rate,
+                seconds=self.seconds,
+                shape=self.shape,
+                max_batch=self.max_batch,
+                start=start,
+                seed=self.seed + i,
+                symbol=symbol,
+            )
+            for i, symbol in enumerate(protocol.trade_symbols(topics))
+        ]
+        merged = heapq.merge(
+            *(feed.frames() for feed in feeds), key=lambda frame: frame[0]
+        )
+        for received, data in merged:
+            yield received - start, data
+
+
+class FaultPlan:
+    """
+    接続ごとに注入する障害
+
+    Attributes:
+        disconnect_after (Optional[float]): 接続してから切断するまでの秒数
+        abort (bool): Close フレームを送らずにTCP接続を切るか
+        stall_every (Optional[float]): 送信を止める間隔（フレームの経過秒数）
+        stall_seconds (float): 送信を止める秒数（止めている間のフレームは後でまとめて送る）
+        delay_probability (float): フレームごとに遅延させる確率
+        delay_seconds (float): 遅延させる秒数
+        seed (int): 乱数の種
+    """
+
+    __slots__ = (
+        "disconnect_after",
+        "abort",
+        "stall_every",
+        "stall_seconds",
+        "delay_probability",
+        "delay_seconds",
+        "seed",
+    )
+
+    def __init__(
+        self,
+        disconnect_after: Optional[float] = None,
+        abort: bool = False,
+        stall_every: Optional[float] = None,
+        stall_seconds: float = 0.0,
+        delay_probability: float = 0.0,
+        delay_seconds: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.disconnect_after = disconnect_after
+        self.abort = abort
+        self.stall_every = stall_every
+        self.stall_seconds = stall_seconds
+        self.delay_probability = delay_probability
+        self.delay_seconds = delay_seconds
+        self.seed = seed
+
+
+class SimulatorServer:
+    """
+    取引所のWebSocketのシミュレータ
+
+    Attributes:
+        source (CaptureSource | SyntheticSource): トラフィックの生成元
+        faults (FaultPlan): 注入する障害
+        host (str): 待ち受けるホスト
+        port (int): 待ち受けるポート（0の場合は start で割り当てる）
+        connections (int): 受け付けた接続数
+        disconnects (int): 注入した切断の回数
+        frames_sent (int): 送信したフレーム数
+        _runner (Optional[web.AppRunner]): aiohttp のランナー
+        _sockets (Set[web.WebSocketResponse]): 接続中のWebSocket
+    """
+
+    def __init__(
+        self,
+        source: CaptureSource | SyntheticSource,
+        faults: Optional[FaultPlan] = None,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+    ) -> None:
+        self.source = source
+        self.faults = faults or FaultPlan()
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self.disconnects = 0
+        self.frames_sent = 0
+        self._runner: Optional[web.AppRunner] = None
+        self._sockets: Set[web.WebSocketResponse] = set()
+        self._rng = random.Random(self.faults.seed)
+        self._logger = LogManager.get_logger(__name__)
+
+    @property
+    def url(self) -> str:
+        """Exchange.ws_base_url に設定するURL"""
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        """サーバーを起動する"""
+        app = web.Application()
+        app.router.add_get("/{path:.+}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = self._runner.addresses[0][1]
+        self._logger.info(f"Simulator listening on {self.url}")
+
+    async def close(self) -> None:
+        """接続中のWebSocketを閉じてサーバーを停止する"""
+        for ws in list(self._sockets):
+            await ws.close(code=WSCloseCode.GOING_AWAY)
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.WebSocketResponse:
+        url = f"wss://{request.match_info['path']}"
+        ws = web.WebSocketResponse(autoping=True)
+        await ws.prepare(request)
+        self.connections += 1
+        self._sockets.add(ws)
+        protocol = load_protocol(url, uuid.uuid4().hex)
+        topics: Set[str] = set()
+        tasks: List[asyncio.Task] = []
+        if self.faults.disconnect_after is not None:
+            tasks.append(asyncio.create_task(self._disconnect_later(ws, request)))
+        self._logger.info(f"Connection {self.connections} to {url}")
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                if msg.data == "ping":
+                    await ws.send_str("pong")
+                    continue
+                try:
+                    subscribed, replies = protocol.handle(json.loads(msg.data))
+                except (ValueError, AttributeError):
+                    continue
+                for reply in replies:
+                    await ws.send_json(reply)
+                if subscribed and not topics:
+                    tasks.append(
+                        asyncio.create_task(self._stream(ws, protocol, url, topics))
+                    )
+                topics.update(subscribed)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._sockets.discard(ws)
+        return ws
+
+    async def _disconnect_later(
+        self, ws: web.WebSocketResponse, request: web.Request
+    ) -> None:
+        await asyncio.sleep(self.faults.disconnect_after)
+        self.disconnects += 1
+        if self.faults.abort and request.transport is not None:
+            request.transport.close()
+        else:
+            await ws.close(code=WSCloseCode.GOING_AWAY, message=b"simulated disconnect")
+
+    async def _stream(
+        self, ws: web.WebSocketResponse, protocol: Protocol, url: str, topics: Set[str]
+    ) -> None:
+        await asyncio.sleep(SUBSCRIBE_SETTLE)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        faults = self.faults
+        next_stall = faults.stall_every
+        for offset, data in self.source.frames(protocol, url, topics, time.time()):
+            if next_stall is not None and offset >= next_stall:
+                next_stall += faults.stall_every
+                await asyncio.sleep(faults.stall_seconds)
+            if (
+                faults.delay_probability
+                and self._rng.random() < faults.delay_probability
+            ):
+                await asyncio.sleep(faults.delay_seconds)
+            delay = started + offset - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if ws.closed:
+                return
+            try:
+                await ws.send_str(data)
+            except ConnectionError:
+                return
+            self.frames_sent += 1
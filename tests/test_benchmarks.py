@@ -0,0 +1,36 @@
+import pytest
+
+from tests.benchmarks.bench_pipeline import compare, measure
+from tests.benchmarks.feeds import FORMATTERS, SyntheticFeed
+
+
+@pytest.mark.parametrize("exchange", list(FORMATTERS))
+def test_synthetic_frames_parse_into_every_trade(exchange):
+    feed = SyntheticFeed(
+        exchange, rate=200, seconds=2, shape="burst", burst_factor=10, burst_ratio=0.05
+    )
+    trades = list(feed.trades())
+    assert trades == list(feed.trades())
+    # burst の区間とそれ以外で平均レートは rate のまま
+    assert abs(len(trades) - 400) <= 2
+
+    result = measure(feed, "end_to_end", repeat=1)
+    assert result["items"] == len(trades)
+    assert result["frames"] == len(list(feed.frames()))
+
+
+def test_compare_reports_throughput_and_p99_regressions():
+    feed = {"exchange": "bybit", "shape": "poisson", "per_sec": 1000.0, "p99_us": 10.0}
+    baseline = [
+        {**feed, "stage": "parse", "unit": "trades"},
+        {**feed, "stage": "serialize", "unit": "candles"},
+    ]
+    current = [
+        {**baseline[0], "per_sec": 950.0, "p99_us": 10.5},
+        {**baseline[1], "per_sec": 800.0, "p99_us": 12.0},
+    ]
+    regressions = compare(baseline, current, threshold=0.1)
+    assert len(regressions) == 2
+    assert all(
+        regression.startswith("bybit/poisson/serialize") for regression in regressions
+    )
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from pybotters import WebSocketQueue
+
+from src.libs.utils import book_features
+from src.libs.utils.book_features import BookFeatures
+from src.libs.utils.orderbook import OrderBook
+
+
+def test_features_are_sampled_once_per_bucket():
+    now = [1721396541.0]
+    book = OrderBook("BTCUSDT")
+    queue_out = WebSocketQueue()
+    features = BookFeatures(book, queue_out, freq=1, depth=2, clock=lambda: now[0])
+
+    book.apply_snapshot(
+        [(100.0, 1.0), (99.0, 2.0), (98.0, 5.0)], [(101.0, 3.0), (102.0, 1.0)]
+    )
+    now[0] += 0.25
+    book.apply_delta([(100.0, 0.0)], [])  # スプレッドが 1 -> 2
+    now[0] += 0.75
+    result = features.sample()
+
+    assert result["type"] == "book_features"
+    assert result["timestamp"] == "2024-07-19T22:42:21+09:00"
+    assert result["mid"] == 100.0
+    assert result["spread"] == 2.0
+    assert result["microprice"] == pytest.approx((99.0 * 3.0 + 101.0 * 2.0) / 5.0)
+    assert result["time_weighted_spread"] == pytest.approx(1.0 * 0.25 + 2.0 * 0.75)
+    assert (result["bid_depth"], result["ask_depth"]) == (7.0, 4.0)
+    assert result["imbalance"] == pytest.approx(3.0 / 11.0)
+    assert result["updates"] == 2
+
+    # 次の周期は更新がなくても、直前のスプレッドで時間加重する
+    now[0] += 1.0
+    assert features.sample()["time_weighted_spread"] == pytest.approx(2.0)
+
+
+def test_unsynced_book_is_not_sampled():
+    now = [1721396541.0]
+    book = OrderBook("BTCUSDT")
+    queue_out = WebSocketQueue()
+    features = BookFeatures(book, queue_out, clock=lambda: now[0])
+    assert features.sample() is None
+
+    book.apply_snapshot([(100.0, 1.0)], [(101.0, 1.0)])
+    now[0] += 0.5
+    book.invalidate()
+    now[0] += 0.5
+    assert features.sample() is None
+
+    # 未同期の間はスプレッドを積算しない
+    book.apply_snapshot([(100.0, 1.0)], [(104.0, 1.0)])
+    now[0] += 1.0
+    assert features.sample()["time_weighted_spread"] == pytest.approx(4.0)
+
+
+def test_generate_stamps_each_bucket_once_despite_sleep_jitter(monkeypatch):
+    now = [1721396540.5]
+    book = OrderBook("BTCUSDT")
+    queue_out = WebSocketQueue()
+    features = BookFeatures(book, queue_out, freq=1, clock=lambda: now[0])
+    book.apply_snapshot([(100.0, 1.0)], [(101.0, 1.0)])
+    # 待機が境界の少し前や少し後に終わる
+    jitters = iter([-0.001, 0.002, -0.002, 0.001])
+
+    async def sleep(delay):
+        jitter = next(jitters, None)
+        if jitter is None:
+            raise asyncio.CancelledError
+        now[0] += delay + jitter
+
+    monkeypatch.setattr(book_features.asyncio, "sleep", sleep)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(features.generate())
+
+    timestamps = []
+    while not queue_out.empty():
+        timestamps.append(queue_out.get_nowait()["timestamp"])
+    assert timestamps == [
+        "2024-07-19T22:42:20+09:00",
+        "2024-07-19T22:42:21+09:00",
+        "2024-07-19T22:42:22+09:00",
+        "2024-07-19T22:42:23+09:00",
+    ]
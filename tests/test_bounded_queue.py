@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from src.libs.utils.bounded_queue import BoundedQueue
+from src.libs.utils.candle import Candle
+
+
+def drain(queue: BoundedQueue) -> list:
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def test_drop_oldest_keeps_newest_items():
+    queue = BoundedQueue(2, "drop_oldest")
+    for i in range(5):
+        queue.put_nowait(i)
+    assert queue.dropped == 3
+    assert drain(queue) == [3, 4]
+
+
+def test_coalesce_replaces_in_place():
+    queue = BoundedQueue(3, "coalesce", key=lambda item: item[0])
+    queue.put_nowait(("a", 1))
+    queue.put_nowait(("b", 1))
+    queue.put_nowait(("a", 2))
+    assert queue.coalesced == 1
+    assert queue.depth == 2
+    assert drain(queue) == [("a", 2), ("b", 1)]
+
+    # 取り出した後の同じキーは新しい要素として追加する
+    queue.put_nowait(("a", 3))
+    assert drain(queue) == [("a", 3)]
+
+
+def test_block_put_waits_for_space():
+    async def run():
+        queue = BoundedQueue(1, "block")
+        queue.put_nowait(1)
+        with pytest.raises(asyncio.QueueFull):
+            queue.put_nowait(2)
+        task = asyncio.create_task(queue.put(2))
+        await asyncio.sleep(0)
+        assert not task.done()
+        assert queue.get_nowait() == 1
+        await task
+        assert drain(queue) == [2]
+
+    asyncio.run(run())
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        BoundedQueue(1, "drop_newest")
+    with pytest.raises(ValueError):
+        BoundedQueue(1, "coalesce")
+
+
+def test_candle_keeps_order_when_output_is_full():
+    async def run():
+        queue_out = BoundedQueue(1, "block")
+        candle = Candle(BoundedQueue(10), queue_out, freq=1)
+        base = 1721396541000
+        for i in range(4):
+            trade = {
+                "timestamp": base + i * 1000,
+                "side": "Buy",
+                "price": 100.0 + i,
+                "size": 1.0,
+            }
+            candle._update_candle([trade])
+        # 確定した3本のうち1本目はキューに入り、残りは出力待ちになる
+        assert queue_out.qsize() == 1
+        assert len(candle._outbox) == 2
+
+        drain_task = asyncio.create_task(candle._drain_outbox())
+        results = [await queue_out.get() for _ in range(3)]
+        await drain_task
+        assert not candle._outbox
+        return [result["open"] for result in results]
+
+    assert asyncio.run(run()) == [100.0, 101.0, 102.0]
@@ -0,0 +1,262 @@
+import random
+from typing import Any, Dict, List
+
+import pytest
+from pybotters import WebSocketQueue
+
+from src.libs.utils.candle import Candle
+from src.libs.utils.trade_batch import BUY, SELL, TradeBatch
+
+
+def make_trade(timestamp: int, side: str, price: float, size: float) -> Dict[str, Any]:
+    return {"timestamp": timestamp, "side": side, "price": price, "size": size}
+
+
+def drain(queue: WebSocketQueue) -> List[Dict[str, Any]]:
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+@pytest.fixture
+def queue_out() -> WebSocketQueue:
+    return WebSocketQueue()
+
+
+def test_candle_is_finalized_on_next_bucket(queue_out):
+    candle = Candle(WebSocketQueue(), queue_out, freq=1)
+    # 2024-07-19T13:42:21Z
+    base = 1721396541000
+    candle._update_candle(
+        [
+            make_trade(base + 100, "Buy", 100.0, 1.0),
+            make_trade(base + 200, "SELL", 102.0, 2.0),
+            make_trade(base + 300, "buy", 99.0, 0.5),
+        ]
+    )
+    assert drain(queue_out) == []
+
+    candle._update_candle([make_trade(base + 1000, "BUY", 101.0, 1.0)])
+    (result,) = drain(queue_out)
+    assert result == {
+        "timestamp": "2024-07-19T22:42:21+09:00",
+        "open": 100.0,
+        "high": 102.0,
+        "low": 99.0,
+        "close": 99.0,
+        "volume": 3.5,
+        "buy_volume": 1.5,
+        "sell_volume": 2.0,
+        "count": 3,
+        "buy_count": 2,
+        "sell_count": 1,
+        "value": 100.0 + 204.0 + 49.5,
+        "buy_value": 149.5,
+        "sell_value": 204.0,
+        "revision": 0,
+    }
+
+
+def test_candle_key_uses_frequency(queue_out):
+    candle = Candle(WebSocketQueue(), queue_out, freq=5)
+    base = 1721396540000
+    candle._update_candle(
+        [
+            make_trade(base, "BUY", 1.0, 1.0),
+            make_trade(base + 4999, "BUY", 2.0, 1.0),
+            make_trade(base + 5000, "BUY", 3.0, 1.0),
+        ]
+    )
+    (result,) = drain(queue_out)
+    assert result["timestamp"] == "2024-07-19T22:42:20+09:00"
+    assert result["count"] == 2
+
+
+def test_trade_batch_matches_dict_trades():
+    base = 1721396541000
+    trades = [
+        make_trade(base + i * 150, "BUY" if i % 3 else "SELL", 100.0 + i, 0.1 * i)
+        for i in range(40)
+    ]
+    batch = TradeBatch()
+    for trade in trades:
+        batch.append(
+            trade["timestamp"],
+            trade["price"],
+            trade["size"],
+            BUY if trade["side"] == "BUY" else SELL,
+        )
+
+    from_dicts, from_batch = WebSocketQueue(), WebSocketQueue()
+    Candle(WebSocketQueue(), from_dicts)._update_candle(trades)
+    Candle(WebSocketQueue(), from_batch)._update_candle(batch)
+    assert drain(from_batch) == drain(from_dicts)
+    assert batch.to_dicts() == trades
+
+
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_vectorized_path_matches_scalar(shuffle):
+    rng = random.Random(0)
+    base = 1721396541000
+    batches = []
+    timestamp = base
+    for _ in range(20):
+        batch = TradeBatch()
+        rows = []
+        for _ in range(rng.randint(1, 300)):
+            timestamp += rng.randint(0, 40)
+            rows.append(
+                (
+                    timestamp,
+                    rng.uniform(100, 101),
+                    rng.uniform(0, 1),
+                    rng.choice([BUY, SELL, 0]),
+                )
+            )
+        if shuffle:
+            rng.shuffle(rows)
+        for row in rows:
+            batch.append(*row)
+        batches.append(batch)
+
+    scalar, vectorized = WebSocketQueue(), WebSocketQueue()
+    scalar_candle = Candle(WebSocketQueue(), scalar, vectorize_threshold=10**9)
+    vectorized_candle = Candle(WebSocketQueue(), vectorized, vectorize_threshold=1)
+    for batch in batches:
+        scalar_candle._update_candle(batch)
+        vectorized_candle._update_candle(batch)
+
+    expected, actual = drain(scalar), drain(vectorized)
+    assert len(actual) == len(expected) > 0
+    for a, e in zip(actual, expected, strict=True):
+        assert a == pytest.approx(e)
+
+
+def test_watermark_finalizes_idle_candles(queue_out):
+    now = [1721396541.5]
+    candle = Candle(
+        WebSocketQueue(), queue_out, allowed_lateness=0.5, clock=lambda: now[0]
+    )
+    base = 1721396541000
+    candle._update_candle([make_trade(base + 100, "BUY", 100.0, 1.0)])
+
+    candle._advance_watermark()
+    assert drain(queue_out) == []
+
+    now[0] = 1721396542.5
+    candle._advance_watermark()
+    (result,) = drain(queue_out)
+    assert result["timestamp"] == "2024-07-19T22:42:21+09:00"
+
+    # 確定済みの足は新しい足の約定で再送されない
+    candle._update_candle([make_trade(base + 1500, "BUY", 101.0, 1.0)])
+    assert drain(queue_out) == []
+
+
+def test_watermark_emits_empty_candles(queue_out):
+    now = [1721396541.0]
+    candle = Candle(
+        WebSocketQueue(),
+        queue_out,
+        allowed_lateness=0.0,
+        emit_empty=True,
+        clock=lambda: now[0],
+    )
+    base = 1721396541000
+    candle._update_candle([make_trade(base + 100, "BUY", 100.0, 1.0)])
+
+    now[0] = 1721396545.0
+    candle._advance_watermark()
+    results = drain(queue_out)
+    assert [r["timestamp"][17:19] for r in results] == ["21", "22", "23", "24"]
+    assert results[0]["count"] == 1
+    for empty in results[1:]:
+        assert empty["open"] == empty["close"] == 100.0
+        assert empty["volume"] == 0.0 and empty["count"] == 0
+
+
+def test_late_trades_are_dropped_by_default(queue_out):
+    candle = Candle(WebSocketQueue(), queue_out)
+    base = 1721396541000
+    candle._update_candle(
+        [
+            make_trade(base + 100, "BUY", 100.0, 1.0),
+            make_trade(base + 1100, "BUY", 101.0, 1.0),
+        ]
+    )
+    (finalized,) = drain(queue_out)
+
+    candle._update_candle([make_trade(base + 200, "SELL", 90.0, 5.0)])
+    assert drain(queue_out) == []
+    assert candle.late_trades == 1
+    assert candle._candles[base // 1000].to_dict(finalized["timestamp"]) == finalized
+
+
+@pytest.mark.parametrize("vectorize_threshold", [1, 10**9])
+def test_late_trades_are_amended_once_per_burst(queue_out, vectorize_threshold):
+    now = [0.0]
+    candle = Candle(
+        WebSocketQueue(),
+        queue_out,
+        vectorize_threshold=vectorize_threshold,
+        late_policy="amend",
+        amend_delay=1.0,
+        clock=lambda: now[0],
+    )
+    base = 1721396541000
+    candle._update_candle(
+        [
+            make_trade(base + 100, "BUY", 100.0, 1.0),
+            make_trade(base + 1100, "BUY", 101.0, 1.0),
+        ]
+    )
+    drain(queue_out)
+
+    late = TradeBatch()
+    late.append(base + 200, 90.0, 5.0, SELL)
+    late.append(base + 300, 110.0, 1.0, BUY)
+    candle._update_candle(late)
+    candle._update_candle([make_trade(base + 400, "SELL", 95.0, 1.0)])
+    assert drain(queue_out) == []
+
+    now[0] = 1.0
+    candle._flush_amendments()
+    (amended,) = drain(queue_out)
+    assert amended["revision"] == 1
+    assert (amended["low"], amended["high"], amended["count"]) == (90.0, 110.0, 4)
+    assert amended["sell_volume"] == 6.0
+    assert candle.late_trades == 0
+
+
+@pytest.mark.parametrize("vectorize_threshold", [1, 10**9])
+def test_latency_fields_carry_event_receive_and_close_times(
+    queue_out, vectorize_threshold
+):
+    now = [1721396542.25]
+    candle = Candle(
+        WebSocketQueue(),
+        queue_out,
+        freq=1,
+        vectorize_threshold=vectorize_threshold,
+        clock=lambda: now[0],
+        latency_fields=True,
+    )
+    base = 1721396541000
+    batch = TradeBatch()
+    batch.append(base + 100, 100.0, 1.0, BUY)
+    batch.append(base + 900, 101.0, 1.0, SELL)
+    batch.received = 1721396541.95
+    candle._update_candle(batch)
+    batch = TradeBatch()
+    batch.append(base + 1000, 102.0, 1.0, BUY)
+    candle._update_candle(batch)
+
+    (result,) = drain(queue_out)
+    assert (result["t_event"], result["t_recv"], result["t_close"]) == (
+        base + 900,
+        1721396541950,
+        1721396542250,
+    )
+    assert result.event_time == pytest.approx((base + 900) / 1000)
+    assert result.closed_time == now[0]
@@ -0,0 +1,127 @@
+import json
+
+from pybotters import WebSocketQueue
+
+from src.libs.exchange import Exchange, load_exchanges
+from src.libs.utils import Instrument, LogManager
+from src.libs.utils.health_check import HealthCheck
+
+
+def test_instruments_share_connection_per_endpoint():
+    instruments = [
+        Instrument("bybit", "spot", "BTCUSDT"),
+        Instrument("bybit", "spot", "ETHUSDT"),
+        Instrument("bybit", "linear", "BTCUSDT"),
+        Instrument("bitflyer", "spot", "BTC_JPY"),
+        Instrument("bitflyer", "fx", "FX_BTC_JPY"),
+    ]
+    queues = {instrument.name: WebSocketQueue() for instrument in instruments}
+    exchanges = load_exchanges(instruments, queues)
+
+    assert [exchange.symbols for exchange in exchanges] == [
+        ["BTCUSDT", "ETHUSDT"],
+        ["BTCUSDT"],
+        ["BTC_JPY", "FX_BTC_JPY"],
+    ]
+    assert [instrument.name for instrument in exchanges[2].instruments] == [
+        "bitflyer-spot-btc_jpy",
+        "bitflyer-fx-fx_btc_jpy",
+    ]
+    assert exchanges[0].subscribe_message == [
+        {"op": "subscribe", "args": ["publicTrade.BTCUSDT", "publicTrade.ETHUSDT"]}
+    ]
+
+
+def test_one_exchange_is_built_per_connection(monkeypatch):
+    monkeypatch.setattr(HealthCheck, "instruments", {})
+    built = []
+    init = Exchange.__init__
+
+    def counting_init(self, *args, **kwargs):
+        built.append(type(self).__name__)
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(Exchange, "__init__", counting_init)
+    instruments = [
+        Instrument("bitflyer", "spot", "BTC_JPY"),
+        Instrument("bitflyer", "fx", "FX_BTC_JPY"),
+        Instrument("bybit", "spot", "BTCUSDT"),
+        Instrument("bybit", "spot", "ETHUSDT"),
+    ]
+    queues = {instrument.name: WebSocketQueue() for instrument in instruments}
+    exchanges = load_exchanges(instruments, queues, orderbook=True)
+
+    # 接続先が同じ銘柄のためにインスタンスを作って捨てない
+    assert built == ["Bitflyer", "Bybit"]
+    assert sorted(HealthCheck.instruments) == sorted(
+        instrument.name for instrument in instruments
+    )
+    assert [sorted(exchange.orderbooks) for exchange in exchanges] == [
+        ["BTC_JPY", "FX_BTC_JPY"],
+        ["BTCUSDT", "ETHUSDT"],
+    ]
+
+
+def test_messages_are_routed_by_topic():
+    instruments = [
+        Instrument("binance", "spot", "btcusdt"),
+        Instrument("binance", "spot", "ethusdt"),
+    ]
+    queues = {instrument.name: WebSocketQueue() for instrument in instruments}
+    (exchange,) = load_exchanges(instruments, queues)
+
+    exchange.on_message(
+        {
+            "stream": "ethusdt@trade",
+            "data": {"T": 1, "p": "3000.0", "q": "0.5", "m": False},
+        },
+        None,
+    )
+    exchange.on_message({"stream": "xrpusdt@trade", "data": {}}, None)
+
+    assert queues["binance-spot-btcusdt"].empty()
+    (trade,) = queues["binance-spot-ethusdt"].get_nowait().to_dicts()
+    assert trade == {"timestamp": 1, "side": "BUY", "price": 3000.0, "size": 0.5}
+
+
+def test_trade_batches_carry_receive_time(monkeypatch):
+    instrument = Instrument("bybit", "spot", "BTCUSDT")
+    queue = WebSocketQueue()
+    (exchange,) = load_exchanges([instrument], {instrument.name: queue})
+    monkeypatch.setattr(exchange, "clock", lambda: 1672304487.0)
+    frame = {
+        "topic": "publicTrade.BTCUSDT",
+        "type": "snapshot",
+        "ts": 1672304486868,
+        "data": [{"T": 1672304486865, "S": "Buy", "v": "0.1", "p": "100.0"}],
+    }
+    exchange.on_raw_message(json.dumps(frame), None)
+    assert queue.get_nowait().received == 1672304487.0
+
+
+def test_frames_are_handled_with_debug_tracing_enabled():
+    LogManager.configure_tracing(True)
+    try:
+        instrument = Instrument("bybit", "spot", "BTCUSDT")
+        queue = WebSocketQueue()
+        (exchange,) = load_exchanges([instrument], {instrument.name: queue})
+        frame = {
+            "topic": "publicTrade.BTCUSDT",
+            "type": "snapshot",
+            "ts": 1672304486868,
+            "data": [{"T": 1672304486865, "S": "Buy", "v": "0.1", "p": "100.0"}],
+        }
+        exchange.on_raw_message(json.dumps(frame), None)
+        assert queue.get_nowait().received is not None
+    finally:
+        LogManager.configure_tracing(False)
+
+
+def test_ws_base_url_overrides_connection_but_not_capture_source():
+    instrument = Instrument("binance", "spot", "btcusdt")
+    (exchange,) = load_exchanges([instrument], {instrument.name: WebSocketQueue()})
+    assert exchange.ws_url == "wss://stream.binance.com:9443/stream"
+
+    exchange.ws_base_url = "ws://127.0.0.1:8765/"
+    assert exchange.ws_url == "ws://127.0.0.1:8765/stream.binance.com:9443/stream"
+    assert exchange.public_ws_url == "wss://stream.binance.com:9443/stream"
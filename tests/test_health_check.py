@@ -0,0 +1,114 @@
+import json
+
+from pybotters import WebSocketQueue
+
+from src.libs.exchange import load_exchanges
+from src.libs.utils import Instrument
+from src.libs.utils.health_check import HealthCheck
+
+
+def test_stale_timestamps_are_unhealthy(monkeypatch):
+    monkeypatch.setattr(HealthCheck, "instruments", {})
+    health_check = HealthCheck(
+        {"frame": 10.0, "trade": None, "candle": 0, "publish": 60.0}
+    )
+    health = HealthCheck.instrument("bybit-spot-btcusdt")
+    now = health.started
+
+    # 一度も記録されていない間は登録からの経過で判定する
+    assert health_check.check(now + 5.0) == (True, {"bybit-spot-btcusdt": []})
+    assert health_check.check(now + 11.0) == (False, {"bybit-spot-btcusdt": ["frame"]})
+
+    health.last_frame = now + 10.0
+    # 送信待ちのローソク足がある間だけ、その出力からの経過で判定する
+    health.unpublished_since = now + 10.0
+    assert health_check.check(now + 15.0)[0]
+    # trade と candle は確認しないため、古くても正常
+    assert health_check.check(now + 71.0) == (
+        False,
+        {"bybit-spot-btcusdt": ["frame", "publish"]},
+    )
+
+
+def test_quiet_instruments_stay_healthy_by_default(monkeypatch):
+    monkeypatch.setattr(HealthCheck, "instruments", {})
+    health_check = HealthCheck()
+    health = HealthCheck.instrument("binance-spot-soljpy")
+    now = health.started
+
+    # フレームが届いていれば、約定やローソク足が途切れても正常
+    health.last_frame = now + 995.0
+    assert health_check.check(now + 1000.0) == (True, {"binance-spot-soljpy": []})
+
+    # 出力したローソク足が送信できないまま上限を超えた場合は異常
+    health.unpublished_since = now + 1000.0
+    health.last_frame = now + 1300.0
+    assert health_check.check(now + 1301.0) == (
+        False,
+        {"binance-spot-soljpy": ["publish"]},
+    )
+    health.unpublished_since = None
+    assert health_check.check(now + 1301.0)[0]
+
+
+def test_frames_and_trades_update_health(monkeypatch):
+    monkeypatch.setattr(HealthCheck, "instruments", {})
+    instruments = [
+        Instrument("bybit", "spot", "BTCUSDT"),
+        Instrument("bybit", "spot", "ETHUSDT"),
+    ]
+    queues = {instrument.name: WebSocketQueue() for instrument in instruments}
+    (exchange,) = load_exchanges(instruments, queues)
+    btc = HealthCheck.instrument("bybit-spot-btcusdt")
+    eth = HealthCheck.instrument("bybit-spot-ethusdt")
+
+    frame = {
+        "topic": "publicTrade.BTCUSDT",
+        "type": "snapshot",
+        "ts": 1,
+        "data": [{"T": 1, "S": "Buy", "v": "0.1", "p": "100.0"}],
+    }
+    exchange.on_raw_message(json.dumps(frame), None)
+
+    # フレームは接続を共有する全ての銘柄、約定はトピックの銘柄にだけ記録する
+    assert btc.last_frame is not None and btc.last_frame == eth.last_frame
+    assert btc.last_trade is not None
+    assert eth.last_trade is None
+
+
+def test_contracts_sharing_a_connection_keep_their_own_health(monkeypatch):
+    monkeypatch.setattr(HealthCheck, "instruments", {})
+    instruments = [
+        Instrument("bitflyer", "spot", "BTC_JPY"),
+        Instrument("bitflyer", "fx", "FX_BTC_JPY"),
+    ]
+    queues = {instrument.name: WebSocketQueue() for instrument in instruments}
+    (exchange,) = load_exchanges(instruments, queues)
+    fx = HealthCheck.instrument("bitflyer-fx-fx_btc_jpy")
+
+    frame = {
+        "jsonrpc": "2.0",
+        "method": "channelMessage",
+        "params": {
+            "channel": "lightning_executions_FX_BTC_JPY",
+            "message": [
+                {
+                    "id": 1,
+                    "side": "BUY",
+                    "price": 10000000,
+                    "size": 0.01,
+                    "exec_date": "2024-07-20T03:00:00.1234567Z",
+                    "buy_child_order_acceptance_id": "JRF20240720-030000-000001",
+                    "sell_child_order_acceptance_id": "JRF20240720-030000-000002",
+                }
+            ],
+        },
+    }
+    exchange.on_raw_message(json.dumps(frame), None)
+
+    assert sorted(HealthCheck.instruments) == [
+        "bitflyer-fx-fx_btc_jpy",
+        "bitflyer-spot-btc_jpy",
+    ]
+    assert fx.last_frame is not None and fx.last_trade is not None
+    assert not queues["bitflyer-fx-fx_btc_jpy"].empty()
@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import pytest
+
+from src.libs.utils.instrument import Instrument, load_instruments
+
+
+def test_load_instruments(tmp_path):
+    path = tmp_path / "instruments.toml"
+    path.write_text(
+        """
+[[instruments]]
+exchange = "bybit"
+contract = "spot"
+symbol = "BTCUSDT"
+
+[[instruments]]
+exchange = "binance"
+contract = "usdt_perpetual"
+symbol = "btcusdt"
+"""
+    )
+    instruments = load_instruments(str(path))
+    assert instruments == [
+        Instrument("bybit", "spot", "BTCUSDT"),
+        Instrument("binance", "usdt_perpetual", "btcusdt"),
+    ]
+    assert instruments[0].name == "bybit-spot-btcusdt"
+    assert instruments[0].tags == {
+        "exchange": "bybit",
+        "contract": "spot",
+        "symbol": "btcusdt",
+    }
+
+
+def test_load_instruments_rejects_duplicates(tmp_path):
+    path = tmp_path / "instruments.toml"
+    path.write_text(
+        """
+[[instruments]]
+exchange = "bybit"
+contract = "spot"
+symbol = "BTCUSDT"
+
+[[instruments]]
+exchange = "Bybit"
+contract = "spot"
+symbol = "btcusdt"
+"""
+    )
+    with pytest.raises(ValueError):
+        load_instruments(str(path))
+
+
+def test_repository_config_is_valid():
+    path = Path(__file__).parent.parent / "config" / "instruments.toml"
+    assert len(load_instruments(str(path))) == 21
@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import pytest
+from pybotters import WebSocketQueue
+
+from src.libs.exchange import load_exchanges
+from src.libs.utils import Instrument
+from src.libs.utils.json_decoder import JSON_DECODERS, load_json_decoder
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+INSTRUMENTS = {
+    "bybit": [("linear", "BTCUSDT"), ("linear", "ETHUSDT")],
+    "binance": [("usdt_perpetual", "btcusdt"), ("usdt_perpetual", "ethusdt")],
+    "bitflyer": [("fx", "FX_BTC_JPY"), ("spot", "BTC_JPY")],
+}
+
+
+def available_decoders():
+    decoders = []
+    for name in JSON_DECODERS:
+        try:
+            load_json_decoder(name, dict)
+        except ValueError:
+            continue
+        decoders.append(name)
+    return decoders
+
+
+def collect_trades(exchange, json_decoder):
+    instruments = [Instrument(exchange, c, s) for c, s in INSTRUMENTS[exchange]]
+    queues = {instrument.name: WebSocketQueue() for instrument in instruments}
+    (client,) = load_exchanges(instruments, queues, json_decoder)
+    for frame in (FIXTURES / f"{exchange}_trades.jsonl").read_text().splitlines():
+        client.on_raw_message(frame, None)
+        client.on_raw_message(frame.encode(), None)
+
+    trades = {}
+    for name, queue in queues.items():
+        trades[name] = []
+        while not queue.empty():
+            trades[name].extend(queue.get_nowait().to_dicts())
+    return trades
+
+
+@pytest.mark.parametrize("exchange", INSTRUMENTS)
+def test_decoders_produce_identical_trades(exchange):
+    expected = collect_trades(exchange, "json")
+    assert all(expected.values())
+    for json_decoder in available_decoders():
+        assert collect_trades(exchange, json_decoder) == expected, json_decoder
+
+
+def test_undecodable_frames_are_skipped():
+    instrument = Instrument("binance", "spot", "btcusdt")
+    queue = WebSocketQueue()
+    (client,) = load_exchanges([instrument], {instrument.name: queue})
+    client.on_raw_message("pong", None)
+    client.on_raw_message('{"stream": "btcusdt@trade", "data": ', None)
+    assert queue.empty()
+
+
+def test_unknown_decoder_is_rejected():
+    with pytest.raises(ValueError):
+        load_json_decoder("yaml")
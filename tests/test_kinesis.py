@@ -0,0 +1,304 @@
+import asyncio
+import threading
+import time
+import weakref
+from json import loads
+from typing import Any, Dict, List
+
+import pytest
+from pybotters import WebSocketQueue
+
+from src.libs.aws import kinesis as kinesis_module
+from src.libs.aws.kinesis import Kinesis
+from src.libs.utils.candle import CandleRecord
+from src.libs.utils.health_check import HealthCheck
+from src.libs.utils.metrics import PIPELINE_LATENCY
+from src.libs.utils.spool import HEADER, Spool
+
+
+class FakeClient:
+    """PutRecordsの呼び出しを記録し、指定回数だけ先頭レコードを失敗させる"""
+
+    def __init__(self, failures: int = 0) -> None:
+        self.calls: List[List[Dict[str, Any]]] = []
+        self.failures = failures
+        self.latency = 0.0
+        self.concurrency = 0
+        self.peak_concurrency = 0
+        self.down = False
+        self._lock = threading.Lock()
+
+    def put_records(self, StreamName: str, Records: List[Dict[str, Any]]):  # noqa: N803
+        if self.down:
+            raise ConnectionError("Kinesis is unavailable")
+        with self._lock:
+            self.concurrency += 1
+            self.peak_concurrency = max(self.peak_concurrency, self.concurrency)
+        time.sleep(self.latency)
+        with self._lock:
+            self.concurrency -= 1
+            self.calls.append(list(Records))
+        results: List[Dict[str, Any]] = [{"SequenceNumber": "1"} for _ in Records]
+        if self.failures > 0:
+            self.failures -= 1
+            results[0] = {"ErrorCode": "InternalFailure"}
+        return {
+            "FailedRecordCount": sum("ErrorCode" in r for r in results),
+            "Records": results,
+        }
+
+
+@pytest.fixture
+def client(monkeypatch) -> FakeClient:
+    fake = FakeClient()
+    monkeypatch.setattr(kinesis_module.boto3, "client", lambda *a, **k: fake)
+    return fake
+
+
+def test_flush_on_record_count(client):
+    async def run():
+        kinesis = Kinesis(WebSocketQueue(), max_batch_records=3, linger=60)
+        for _ in range(7):
+            await kinesis._append("stream", {"Data": b"x", "PartitionKey": "k"})
+        await kinesis.flush("stream")
+
+    asyncio.run(run())
+    assert [len(call) for call in client.calls] == [3, 3, 1]
+
+
+def test_flush_on_batch_bytes(client):
+    async def run():
+        kinesis = Kinesis(WebSocketQueue(), max_batch_bytes=25, linger=60)
+        for _ in range(4):
+            await kinesis._append(
+                "stream", {"Data": b"0123456789", "PartitionKey": "k"}
+            )
+        await kinesis.flush("stream")
+
+    asyncio.run(run())
+    assert [len(call) for call in client.calls] == [2, 2]
+
+
+def test_close_flushes_and_shuts_down_the_executor(client):
+    async def run() -> Kinesis:
+        kinesis = Kinesis(stream_name="stream", linger=60)
+        await kinesis.write({"close": 1.0}, {"symbol": "btcusdt"})
+        await kinesis.close()
+        return kinesis
+
+    kinesis = asyncio.run(run())
+    assert len(client.calls) == 1
+    with pytest.raises(RuntimeError):
+        kinesis._executor.submit(print)
+
+
+def test_flush_on_linger(client):
+    async def run():
+        queue = WebSocketQueue()
+        kinesis = Kinesis(queue, linger=0.05)
+        task = asyncio.create_task(kinesis.publish("stream", {"symbol": "btcusdt"}))
+        queue.put_nowait({"close": 1.0})
+        await asyncio.sleep(0.2)
+        task.cancel()
+
+    asyncio.run(run())
+    assert len(client.calls) == 1
+    assert loads(client.calls[0][0]["Data"]) == {"close": 1.0, "symbol": "btcusdt"}
+
+
+def test_publish_records_last_publish_time(client, monkeypatch):
+    monkeypatch.setattr(HealthCheck, "instruments", {})
+
+    async def run():
+        queue = WebSocketQueue()
+        kinesis = Kinesis(queue, linger=0.01)
+        task = asyncio.create_task(kinesis.publish("stream", {"symbol": "btcusdt"}))
+        await asyncio.sleep(0)
+        assert HealthCheck.instrument("btcusdt").last_publish is None
+        HealthCheck.instrument("btcusdt").unpublished_since = 1.0
+        queue.put_nowait({"close": 1.0})
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run())
+    assert HealthCheck.instrument("btcusdt").last_publish is not None
+    assert HealthCheck.instrument("btcusdt").unpublished_since is None
+
+
+def test_candle_latency_is_recorded_on_ack(client):
+    tags = {"exchange": "latencyex", "contract": "spot", "symbol": "btcusdt"}
+    record = CandleRecord({"close": 1.0})
+    record.closed_time = time.time() - 0.5
+    record.event_time = time.time() - 2.0
+
+    async def run():
+        queue = WebSocketQueue()
+        kinesis = Kinesis(queue, linger=0.01)
+        task = asyncio.create_task(kinesis.publish("stream", tags, queue))
+        queue.put_nowait(record)
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run())
+    assert loads(client.calls[0][0]["Data"]) == {"close": 1.0, **tags}
+    publish = PIPELINE_LATENCY.labels("latencyex", "spot", "btcusdt", "publish")
+    total = PIPELINE_LATENCY.labels("latencyex", "spot", "btcusdt", "total")
+    assert publish.count == 1 and 0.5 <= publish.sum < 1.0
+    assert total.count == 1 and 2.0 <= total.sum < 2.5
+
+
+def test_gauges_sum_over_kinesis_instances(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(kinesis_module, "_INSTANCES", weakref.WeakSet())
+
+    async def run():
+        first = Kinesis(stream_name="a", spool=Spool(str(tmp_path / "a")))
+        second = Kinesis(stream_name="b", spool=Spool(str(tmp_path / "b")))
+        first._spool.append(b"x")
+        second._spool.append(b"y")
+        second._spool.append(b"z")
+        assert kinesis_module.SPOOL_RECORDS.labels().get() == 3
+
+        # close したインスタンスは数えない
+        await second.close()
+        assert kinesis_module.SPOOL_RECORDS.labels().get() == 1
+        await first.close()
+        assert kinesis_module.IN_FLIGHT.labels().get() == 0
+
+    asyncio.run(run())
+
+
+def test_retry_only_failed_records(client):
+    client.failures = 1
+
+    async def run():
+        kinesis = Kinesis(WebSocketQueue(), linger=60, retry_backoff=0)
+        for i in range(3):
+            await kinesis._append(
+                "stream", {"Data": str(i).encode(), "PartitionKey": "k"}
+            )
+        await kinesis.flush("stream")
+
+    asyncio.run(run())
+    assert [len(call) for call in client.calls] == [3, 1]
+    assert client.calls[1][0]["Data"] == b"0"
+
+
+def test_order_preserved_per_partition_key(client):
+    client.latency = 0.01
+
+    async def run() -> Kinesis:
+        kinesis = Kinesis(
+            WebSocketQueue(), max_batch_records=1, linger=60, max_in_flight=2
+        )
+        for i in range(10):
+            key = "a" if i % 2 == 0 else "b"
+            await kinesis._append(
+                "stream", {"Data": str(i).encode(), "PartitionKey": key}
+            )
+        await kinesis.flush("stream")
+        return kinesis
+
+    kinesis = asyncio.run(run())
+    assert kinesis.in_flight == 0
+    assert client.peak_concurrency <= 2
+    for key in ("a", "b"):
+        sent = [int(c[0]["Data"]) for c in client.calls if c[0]["PartitionKey"] == key]
+        assert sent == sorted(sent)
+        assert len(sent) == 5
+
+
+def test_failed_records_are_spooled_and_replayed_in_order(client, tmp_path):
+    client.down = True
+
+    async def run() -> Spool:
+        spool = Spool(str(tmp_path), segment_bytes=4096, max_bytes=4096 * 4)
+        kinesis = Kinesis(
+            WebSocketQueue(),
+            linger=60,
+            max_retries=0,
+            spool=spool,
+            replay_interval=0.01,
+            replay_rate=10_000,
+        )
+        for i in range(3):
+            await kinesis._append(
+                "stream", {"Data": str(i).encode(), "PartitionKey": "k"}
+            )
+        await kinesis.flush("stream")
+        assert spool.records == 3
+
+        # スプールが空になるまでは、新しいレコードもスプールに追記する
+        client.down = False
+        for i in range(3, 5):
+            await kinesis._append(
+                "stream", {"Data": str(i).encode(), "PartitionKey": "k"}
+            )
+        await kinesis.flush("stream")
+        assert spool.records == 5 and client.calls == []
+
+        replay = asyncio.create_task(kinesis._replay_loop())
+        for _ in range(100):
+            if spool.is_empty:
+                break
+            await asyncio.sleep(0.01)
+        replay.cancel()
+
+        await kinesis._append("stream", {"Data": b"5", "PartitionKey": "k"})
+        await kinesis.flush("stream")
+        return spool
+
+    spool = asyncio.run(run())
+    assert spool.is_empty
+    sent = [int(record["Data"]) for call in client.calls for record in call]
+    assert sent == list(range(6))
+    assert client.calls[0][0]["PartitionKey"] == "k"
+
+
+def test_eviction_during_replay_keeps_unsent_records(client, tmp_path):
+    # 先頭の3件のうち2件だけ送信でき、その応答を待つ間に古いセグメントが削除される
+    def encode(i: int) -> bytes:
+        entry = {"Data": str(i).encode(), "PartitionKey": "k"}
+        return kinesis_module._encode_spooled("stream", entry, "btcusdt")
+
+    record_bytes = HEADER.size + len(encode(0))
+    spool = Spool(
+        str(tmp_path), segment_bytes=record_bytes * 4, max_bytes=record_bytes * 8
+    )
+    for i in range(6):
+        spool.append(encode(i))
+    put_records = client.put_records
+    client.latency = 0.05
+
+    def partial_put_records(StreamName, Records):  # noqa: N803
+        response = put_records(StreamName, Records)
+        if len(client.calls) == 1:
+            response["Records"][2] = {"ErrorCode": "InternalFailure"}
+            response["FailedRecordCount"] = 1
+        return response
+
+    client.put_records = partial_put_records
+
+    async def run():
+        kinesis = Kinesis(
+            WebSocketQueue(),
+            max_batch_records=3,
+            spool=spool,
+            replay_interval=0.01,
+            replay_rate=10_000,
+        )
+        replay = asyncio.create_task(kinesis._replay_loop())
+        while client.concurrency == 0:
+            await asyncio.sleep(0.001)
+        for i in range(6, 10):
+            spool.append(encode(i))
+        assert spool.evicted == 4
+        for _ in range(100):
+            if spool.is_empty:
+                break
+            await asyncio.sleep(0.01)
+        replay.cancel()
+
+    asyncio.run(run())
+    sent = [int(record["Data"]) for call in client.calls for record in call]
+    assert sent[:3] == [0, 1, 2]
+    assert sent[3:] == [4, 5, 6, 7, 8, 9]
@@ -0,0 +1,205 @@
+import asyncio
+from json import loads
+
+import pytest
+from botocore.exceptions import ClientError
+from pybotters import WebSocketQueue
+
+from src.libs.aws import Kinesis, LocalKinesisClient
+from src.libs.aws.local_kinesis import MAX_HASH_KEY, THROTTLED, hash_key
+from src.libs.utils.spool import Spool
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def entries(count: int, key: str = "k"):
+    return [
+        {"Data": f'{{"i":{i}}}'.encode(), "PartitionKey": key} for i in range(count)
+    ]
+
+
+def read_stream(client: LocalKinesisClient, stream_name: str):
+    records = []
+    for shard in client.list_shards(StreamName=stream_name)["Shards"]:
+        iterator = client.get_shard_iterator(
+            StreamName=stream_name,
+            ShardId=shard["ShardId"],
+            ShardIteratorType="TRIM_HORIZON",
+        )["ShardIterator"]
+        records += [
+            loads(r["Data"])
+            for r in client.get_records(ShardIterator=iterator)["Records"]
+        ]
+    return records
+
+
+def test_shard_limit_throttles_until_tokens_refill():
+    clock = FakeClock()
+    client = LocalKinesisClient(records_per_second=5, clock=clock)
+
+    response = client.put_records(StreamName="s", Records=entries(8))
+    assert response["FailedRecordCount"] == 3
+    codes = [record.get("ErrorCode") for record in response["Records"]]
+    assert codes == [None] * 5 + [THROTTLED] * 3
+    with pytest.raises(ClientError) as e:
+        client.put_record(StreamName="s", Data=b"x", PartitionKey="k")
+    assert e.value.response["Error"]["Code"] == THROTTLED
+
+    clock.now = 0.4
+    response = client.put_records(StreamName="s", Records=entries(3))
+    assert response["FailedRecordCount"] == 1
+    assert client.stats() == (3, 7, 5)
+
+
+def test_records_are_routed_by_hash_key_range():
+    client = LocalKinesisClient(shards=4)
+    shards = client.list_shards(StreamName="s")["Shards"]
+    assert shards[0]["HashKeyRange"]["StartingHashKey"] == "0"
+    assert shards[-1]["HashKeyRange"]["EndingHashKey"] == str(MAX_HASH_KEY)
+
+    for key in ("btcusdt", "ethusdt", "xrpusdt"):
+        (result,) = client.put_records(StreamName="s", Records=entries(1, key))[
+            "Records"
+        ]
+        (shard,) = [
+            s
+            for s in shards
+            if int(s["HashKeyRange"]["StartingHashKey"])
+            <= hash_key(key)
+            <= int(s["HashKeyRange"]["EndingHashKey"])
+        ]
+        assert result["ShardId"] == shard["ShardId"]
+
+
+def test_kinesis_sink_retries_throttled_records_into_the_stand_in():
+    client = LocalKinesisClient(records_per_second=20)
+
+    async def run():
+        kinesis = Kinesis(
+            client=client,
+            stream_name="s",
+            max_batch_records=50,
+            linger=60,
+            retry_backoff=0.5,
+        )
+        for i in range(30):
+            await kinesis.write({"i": i}, {"symbol": "btcusdt"})
+        await kinesis.close()
+
+    asyncio.run(run())
+    assert client.throttled >= 10
+    iterator = client.get_shard_iterator(
+        StreamName="s", ShardId="shardId-000000000000", ShardIteratorType="TRIM_HORIZON"
+    )["ShardIterator"]
+    records = client.get_records(ShardIterator=iterator)["Records"]
+    assert sorted(loads(r["Data"])["i"] for r in records) == list(range(30))
+    assert loads(records[0]["Data"])["symbol"] == "btcusdt"
+
+
+def test_partition_keys_keep_each_instrument_on_one_shard_in_order():
+    client = LocalKinesisClient(shards=2)
+    instruments = [
+        {"exchange": "bybit", "contract": "linear", "symbol": symbol}
+        for symbol in ("btcusdt", "ethusdt", "solusdt", "xrpusdt")
+    ]
+
+    async def run():
+        kinesis = Kinesis(
+            client=client, stream_name="s", max_batch_records=7, linger=60
+        )
+        for i in range(20):
+            for tags in instruments:
+                await kinesis.write({"i": i}, dict(tags))
+        await kinesis.close()
+
+    asyncio.run(run())
+    by_key = {}
+    for shard in client.list_shards(StreamName="s")["Shards"]:
+        iterator = client.get_shard_iterator(
+            StreamName="s", ShardId=shard["ShardId"], ShardIteratorType="TRIM_HORIZON"
+        )["ShardIterator"]
+        for record in client.get_records(ShardIterator=iterator)["Records"]:
+            shards, values = by_key.setdefault(record["PartitionKey"], (set(), []))
+            shards.add(shard["ShardId"])
+            values.append(loads(record["Data"])["i"])
+    assert sorted(by_key) == sorted(f"bybit-linear-{t['symbol']}" for t in instruments)
+    assert all(len(shards) == 1 for shards, _ in by_key.values())
+    assert all(values == list(range(20)) for _, values in by_key.values())
+    assert len({next(iter(shards)) for shards, _ in by_key.values()}) == 2
+
+
+def test_throttled_records_are_not_dropped_when_retries_run_out():
+    client = LocalKinesisClient(records_per_second=50)
+
+    async def run():
+        kinesis = Kinesis(
+            client=client,
+            stream_name="s",
+            max_batch_records=100,
+            linger=60,
+            max_retries=0,
+        )
+        for i in range(150):
+            await kinesis.write({"i": i}, {"symbol": "btcusdt"})
+        await kinesis.close()
+
+    asyncio.run(run())
+    assert client.throttled > 0
+    assert client.stats()[1] == 150
+
+
+def test_throttled_records_are_spooled_when_throttle_retries_run_out(tmp_path):
+    # 時刻を進めないため、上限を超えたレコードはずっと拒否される
+    client = LocalKinesisClient(records_per_second=5, clock=FakeClock())
+
+    async def run():
+        spool = Spool(str(tmp_path), segment_bytes=4096, max_bytes=4096 * 4)
+        kinesis = Kinesis(
+            client=client,
+            stream_name="s",
+            max_batch_records=8,
+            linger=60,
+            spool=spool,
+            max_throttled_retries=3,
+        )
+        for i in range(8):
+            await kinesis.write({"i": i}, {"symbol": "btcusdt"})
+        await kinesis.flush()
+        return spool
+
+    spool = asyncio.run(asyncio.wait_for(run(), timeout=5))
+    # 最初の送信と3回の再送の後、拒否され続けた3件をスプールに保存する
+    assert client.stats() == (4, 5, 3 * 4)
+    assert spool.records == 3
+
+
+def test_linger_sends_each_lane_to_its_own_stream():
+    client = LocalKinesisClient()
+
+    async def run():
+        kinesis = Kinesis(client=client, linger=0.05, max_in_flight=1)
+        queues = {"a": WebSocketQueue(), "b": WebSocketQueue()}
+        tasks = [
+            asyncio.create_task(kinesis.publish(stream, {"symbol": stream}, queue))
+            for stream, queue in queues.items()
+        ]
+        await asyncio.sleep(0)
+        queues["a"].put_nowait({"i": 0})
+        queues["b"].put_nowait({"i": 1})
+        await asyncio.sleep(0.3)
+        # 滞留時間で送信されたレコードを、publish の終了時の flush より前に読む
+        received = {stream: read_stream(client, stream) for stream in queues}
+        for task in tasks:
+            task.cancel()
+        return received
+
+    assert asyncio.run(run()) == {
+        "a": [{"i": 0, "symbol": "a"}],
+        "b": [{"i": 1, "symbol": "b"}],
+    }
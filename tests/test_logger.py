@@ -0,0 +1,82 @@
+import logging
+
+import pytest
+
+from src.libs.utils.logger import LogManager, add_logging, trace
+
+
+@add_logging
+class Traced:
+    def hot(self, value):
+        return value
+
+    def cold(self, value):
+        return value
+
+    @staticmethod
+    def static(value):
+        return value
+
+    @classmethod
+    def klass(cls, value):
+        return cls, value
+
+    @property
+    def prop(self):
+        return 1
+
+
+@pytest.fixture(autouse=True)
+def reset_tracing():
+    yield
+    LogManager.configure_tracing(False)
+
+
+@trace
+def traced_function(value):
+    return value
+
+
+def test_no_wrapper_when_debug_disabled(caplog):
+    LogManager.configure_tracing(False)
+    assert Traced.hot is Traced._untraced_methods["hot"]
+    with caplog.at_level(logging.DEBUG):
+        assert traced_function(1) == 1
+    assert "Entering" not in caplog.text
+
+
+def test_functions_follow_tracing_configured_after_import(caplog):
+    # デコレート時（import 時）は無効でも、後から有効にすればトレースする
+    LogManager.configure_tracing(True, methods=["traced_function"])
+    with caplog.at_level(logging.DEBUG):
+        assert traced_function(2) == 2
+    assert "Entering: traced_function" in caplog.text
+
+
+def test_wrapper_when_debug_enabled(caplog):
+    LogManager.configure_tracing(True)
+    assert Traced.hot is not Traced._untraced_methods["hot"]
+    with caplog.at_level(logging.DEBUG):
+        assert Traced().hot(1) == 1
+    assert "Entering: hot" in caplog.text
+
+
+def test_allowlist_and_sampling(caplog):
+    LogManager.configure_tracing(True, sample_rate=3, methods=["Traced.hot"])
+    assert Traced.cold is Traced._untraced_methods["cold"]
+    with caplog.at_level(logging.DEBUG):
+        for i in range(6):
+            Traced().hot(i)
+    assert caplog.text.count("Entering: hot") == 2
+
+
+def test_static_and_class_methods_keep_their_descriptor(caplog):
+    LogManager.configure_tracing(True)
+    assert isinstance(Traced.__dict__["static"], staticmethod)
+    assert isinstance(Traced.__dict__["klass"], classmethod)
+    assert isinstance(Traced.__dict__["prop"], property)
+    with caplog.at_level(logging.DEBUG):
+        assert Traced().static(1) == 1
+        assert Traced().klass(2) == (Traced, 2)
+        assert Traced().prop == 1
+    assert "Entering: static" in caplog.text
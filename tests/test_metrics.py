@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pytest
+from pybotters import WebSocketQueue
+
+from src.libs.exchange import load_exchanges
+from src.libs.utils import Instrument
+from src.libs.utils.candle import Candle
+from src.libs.utils.health_check import HealthCheck
+from src.libs.utils.metrics import REGISTRY, Counter, Gauge, Histogram, Registry
+
+
+def test_counter_and_gauge_exposition():
+    registry = Registry()
+    counter = Counter("test_total", "Test counter", ("symbol",), registry=registry)
+    gauge = Gauge("test_depth", "Test gauge", registry=registry)
+    counter.labels("btc").inc()
+    counter.labels(symbol='a"b').inc(2.5)
+    gauge.labels().set_function(lambda: 3)
+
+    assert registry.expose() == (
+        "# HELP test_total Test counter\n"
+        "# TYPE test_total counter\n"
+        'test_total{symbol="btc"} 1\n'
+        'test_total{symbol="a\\"b"} 2.5\n'
+        "# HELP test_depth Test gauge\n"
+        "# TYPE test_depth gauge\n"
+        "test_depth 3\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = Histogram(
+        "test_seconds", "Test", ("symbol",), buckets=(0.1, 1.0), registry=registry
+    )
+    child = histogram.labels("btc")
+    for value in (0.05, 0.1, 0.5, 2.0):
+        child.observe(value)
+
+    lines = registry.expose().splitlines()[2:]
+    assert lines == [
+        'test_seconds_bucket{symbol="btc",le="0.1"} 2',
+        'test_seconds_bucket{symbol="btc",le="1"} 3',
+        'test_seconds_bucket{symbol="btc",le="+Inf"} 4',
+        'test_seconds_sum{symbol="btc"} 2.65',
+        'test_seconds_count{symbol="btc"} 4',
+    ]
+
+
+def test_registry_rejects_duplicates_and_wrong_labels():
+    registry = Registry()
+    counter = Counter("test_total", "Test", ("symbol",), registry=registry)
+    with pytest.raises(ValueError):
+        Counter("test_total", "Test", registry=registry)
+    with pytest.raises(ValueError):
+        counter.labels("btc", "spot")
+
+
+def test_candle_metrics_are_labelled_by_instrument():
+    tags = {"exchange": "testex", "contract": "spot", "symbol": "btcusdt"}
+    candle = Candle(asyncio.Queue(), asyncio.Queue(), freq=1, tags=tags)
+    base = 1721396541000
+    trade = {"timestamp": base, "side": "Buy", "price": 100.0, "size": 1.0}
+    candle._update_candle([trade, dict(trade, timestamp=base + 1)])
+    candle._update_candle([dict(trade, timestamp=base + 1000)])
+    candle._update_candle([dict(trade, timestamp=base + 2)])  # 遅延約定
+
+    text = REGISTRY.expose()
+    labels = 'exchange="testex",contract="spot",symbol="btcusdt"'
+    assert f"collector_candles_total{{{labels}}} 1" in text
+    assert f'collector_candle_trades_bucket{{{labels},le="1"}} 0' in text
+    assert f'collector_candle_trades_bucket{{{labels},le="5"}} 1' in text
+    assert f"collector_late_trades_total{{{labels}}} 1" in text
+
+
+def test_exchange_metrics_use_the_configured_contract():
+    instruments = [
+        Instrument("bitflyer", "spot", "BTC_JPY"),
+        Instrument("bitflyer", "fx", "FX_BTC_JPY"),
+    ]
+    queues = {instrument.name: WebSocketQueue() for instrument in instruments}
+    (exchange,) = load_exchanges(instruments, queues)
+    message = {
+        "id": 1,
+        "side": "SELL",
+        "price": 10000000,
+        "size": 0.01,
+        "exec_date": "2024-07-20T03:00:00.1234567Z",
+        "buy_child_order_acceptance_id": "JRF20240720-030000-000001",
+        "sell_child_order_acceptance_id": "JRF20240720-030000-000002",
+    }
+    frame = {
+        "jsonrpc": "2.0",
+        "method": "channelMessage",
+        "params": {"channel": "lightning_executions_FX_BTC_JPY", "message": [message]},
+    }
+    exchange.on_raw_message(json.dumps(frame), None)
+
+    text = REGISTRY.expose()
+    assert (
+        'collector_trades_total{exchange="bitflyer",contract="fx",symbol="fx_btc_jpy"}'
+        in text
+    )
+    assert 'contract="spot",symbol="fx_btc_jpy"' not in text
+    assert 'collector_frames_total{exchange="bitflyer",contract="spot+fx"}' in text
+    assert 'collector_frames_total{exchange="bitflyer",contract="spot"}' not in text
+
+
+def test_metrics_endpoint_serves_registry():
+    app = HealthCheck().app
+    endpoint = next(route.endpoint for route in app.routes if route.path == "/metrics")
+    response = asyncio.run(endpoint())
+    assert response.media_type.startswith("text/plain")
+    assert b"# TYPE collector_candles_total counter" in response.body
@@ -0,0 +1,209 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from pybotters import WebSocketQueue
+
+from src.collector.__main__ import build_orderbooks
+from src.libs.exchange import load_exchanges
+from src.libs.utils import Instrument
+from src.libs.utils.orderbook import OrderBook
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def load_frames(name):
+    return (FIXTURES / name).read_text().splitlines()
+
+
+def reference_book(updates):
+    """差分を辞書に順番に適用した、検証用の板"""
+    bids, asks = {}, {}
+    for side, levels in updates:
+        book = bids if side == "b" else asks
+        for price, size in levels:
+            if float(size) == 0:
+                book.pop(float(price), None)
+            else:
+                book[float(price)] = float(size)
+    return (
+        sorted(bids.items(), reverse=True)[:10],
+        sorted(asks.items())[:10],
+    )
+
+
+def load_exchange(exchange, contract, symbol):
+    instrument = Instrument(exchange, contract, symbol)
+    queue = WebSocketQueue()
+    (client,) = load_exchanges([instrument], {instrument.name: queue}, orderbook=True)
+    resubscribed = []
+    client._resubscribe = resubscribed.extend
+    return client, queue, resubscribed
+
+
+def test_book_side_keeps_best_levels_sorted():
+    book = OrderBook("BTCUSDT")
+    book.apply_snapshot([(100.0, 1.0), (99.0, 2.0)], [(101.0, 1.0), (103.0, 3.0)])
+    book.apply_delta([(100.5, 0.5), (100.0, 0.0)], [(102.0, 2.0), (101.0, 0.0)])
+
+    assert book.best_bid == (100.5, 0.5)
+    assert book.best_ask == (102.0, 2.0)
+    assert book.bids.top(5) == [(100.5, 0.5), (99.0, 2.0)]
+    assert book.asks.top(2) == [(102.0, 2.0), (103.0, 3.0)]
+    assert not book.is_crossed()
+
+    book.apply_delta([(102.5, 1.0)], [])
+    assert book.is_crossed()
+
+
+def test_bybit_orderbook_snapshot_and_deltas():
+    client, queue, resubscribed = load_exchange("bybit", "linear", "BTCUSDT")
+    frames = load_frames("bybit_orderbook.jsonl")
+    updates = []
+    for frame in frames:
+        client.on_raw_message(frame, None)
+        msg = json.loads(frame)
+        if "data" in msg:
+            updates += [("b", msg["data"]["b"]), ("a", msg["data"]["a"])]
+
+    book = client.orderbooks["BTCUSDT"]
+    assert book.is_synced and queue.empty() and resubscribed == []
+    assert (book.bids.top(10), book.asks.top(10)) == reference_book(updates)
+    assert book.sequence == json.loads(frames[-1])["data"]["u"]
+
+    # 更新IDが飛んだ差分は適用せず、購読し直す
+    gap = json.loads(frames[-1])
+    gap["data"]["u"] += 2
+    gap["data"]["b"] = [["1.00", "1.000"]]
+    client.on_raw_message(json.dumps(gap), None)
+    assert not book.is_synced and book.resyncs == 1
+    assert resubscribed == [
+        {"op": "unsubscribe", "args": ["orderbook.50.BTCUSDT"]},
+        {"op": "subscribe", "args": ["orderbook.50.BTCUSDT"]},
+    ]
+    assert book.bids.size_at(1.0) == 0.0
+
+    client.on_raw_message(frames[1], None)
+    assert book.is_synced
+
+
+@pytest.mark.parametrize("contract", ["usdt_perpetual", "spot"])
+def test_binance_orderbook_syncs_with_rest_snapshot(contract):
+    client, queue, _ = load_exchange("binance", contract, "btcusdt")
+    snapshot = json.loads((FIXTURES / "binance_depth_snapshot.json").read_text())
+    frames = [json.loads(frame) for frame in load_frames("binance_orderbook.jsonl")[1:]]
+    if contract == "spot":
+        for frame in frames:
+            frame["data"].pop("pu")
+    fetched = []
+
+    snapshots = [snapshot]
+
+    async def fetch_depth_snapshot(symbol):
+        fetched.append(symbol)
+        return snapshots[-1]
+
+    client._fetch_depth_snapshot = fetch_depth_snapshot
+
+    async def run():
+        # スナップショットの取得中に届いた差分はバッファに溜まる
+        for frame in frames[:12]:
+            client.on_raw_message(json.dumps(frame), None)
+        await asyncio.sleep(0)
+        for frame in frames[12:]:
+            client.on_raw_message(json.dumps(frame), None)
+
+    asyncio.run(run())
+
+    book = client.orderbooks["BTCUSDT"]
+    assert fetched == ["BTCUSDT"] and book.is_synced and queue.empty()
+    applied = [
+        frame["data"]
+        for frame in frames
+        if frame["data"]["u"] > snapshot["lastUpdateId"]
+    ]
+    updates = [("b", snapshot["bids"]), ("a", snapshot["asks"])]
+    for data in applied:
+        updates += [("b", data["b"]), ("a", data["a"])]
+    assert (book.bids.top(10), book.asks.top(10)) == reference_book(updates)
+    assert book.sequence == frames[-1]["data"]["u"]
+
+    # 連続しない差分で未同期になり、スナップショットを取り直す
+    gap = dict(frames[-1]["data"], U=book.sequence + 5, u=book.sequence + 9)
+    gap["pu"] = book.sequence + 4
+    if contract == "spot":
+        gap.pop("pu")
+    snapshots.append(
+        {"lastUpdateId": gap["u"] - 1, "bids": [["100.0", "1.0"]], "asks": []}
+    )
+
+    async def run_gap():
+        client.on_raw_message(
+            json.dumps({"stream": "btcusdt@depth@100ms", "data": gap}), None
+        )
+        assert not book.is_synced
+        await asyncio.sleep(0)
+
+    asyncio.run(run_gap())
+    assert fetched == ["BTCUSDT", "BTCUSDT"]
+    assert book.is_synced and book.resyncs == 1
+    assert book.sequence == gap["u"]
+
+
+def test_bitflyer_board_snapshot_and_deltas():
+    client, queue, resubscribed = load_exchange("bitflyer", "fx", "FX_BTC_JPY")
+    frames = load_frames("bitflyer_orderbook.jsonl")
+    updates = []
+    for frame in frames:
+        client.on_raw_message(frame, None)
+        msg = json.loads(frame)
+        if "params" not in msg:
+            continue
+        if msg["params"]["channel"].startswith("lightning_board_snapshot_"):
+            updates = []
+        board = msg["params"]["message"]
+        updates += [
+            ("b", [(level["price"], level["size"]) for level in board["bids"]]),
+            ("a", [(level["price"], level["size"]) for level in board["asks"]]),
+        ]
+
+    book = client.orderbooks["FX_BTC_JPY"]
+    assert book.is_synced and queue.empty() and resubscribed == []
+    assert (book.bids.top(10), book.asks.top(10)) == reference_book(updates)
+
+    # 交差した板は欠落とみなしてスナップショットを購読し直す
+    best_ask = book.best_ask[0]
+    crossed = {
+        "jsonrpc": "2.0",
+        "method": "channelMessage",
+        "params": {
+            "channel": "lightning_board_FX_BTC_JPY",
+            "message": {
+                "mid_price": best_ask,
+                "bids": [{"price": best_ask, "size": 1.0}],
+                "asks": [],
+            },
+        },
+    }
+    client.on_raw_message(json.dumps(crossed), None)
+    assert not book.is_synced
+    assert resubscribed[-1] == {
+        "method": "subscribe",
+        "params": {"channel": "lightning_board_snapshot_FX_BTC_JPY"},
+    }
+
+
+def test_orderbooks_are_mapped_to_configured_instruments():
+    instruments = [
+        Instrument("bitflyer", "spot", "BTC_JPY"),
+        Instrument("bitflyer", "fx", "FX_BTC_JPY"),
+    ]
+    queues = {instrument.name: WebSocketQueue() for instrument in instruments}
+    (exchange,) = load_exchanges(instruments, queues, orderbook=True)
+
+    orderbooks = build_orderbooks(instruments, [exchange])
+    assert orderbooks == {
+        "bitflyer-spot-btc_jpy": exchange.orderbooks["BTC_JPY"],
+        "bitflyer-fx-fx_btc_jpy": exchange.orderbooks["FX_BTC_JPY"],
+    }
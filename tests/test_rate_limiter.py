@@ -0,0 +1,70 @@
+import asyncio
+
+from src.libs.aws import LocalKinesisClient, ShardRateLimiter
+from src.libs.aws.rate_limiter import THROTTLED, UNKNOWN_SHARD, AdaptiveTokenBucket
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket_reserves_ahead_and_reports_the_wait():
+    bucket = AdaptiveTokenBucket(max_rate=10, min_rate=1, now=0.0)
+    assert bucket.reserve(10, now=0.0) == 0.0
+    assert bucket.reserve(5, now=0.0) == 0.5
+    assert bucket.reserve(5, now=1.0) == 0.0
+
+    bucket.decrease(0.5)
+    assert bucket.rate == 5
+    assert bucket.reserve(5, now=1.0) == 1.0
+    bucket.increase(100)
+    assert bucket.rate == 10
+    for _ in range(10):
+        bucket.decrease(0.5)
+    assert bucket.rate == 1
+
+
+def test_limiter_maps_partition_keys_to_listed_shards():
+    client = LocalKinesisClient(shards=4)
+    limiter = ShardRateLimiter("s")
+    assert limiter.shard_for("bybit-linear-btcusdt") == UNKNOWN_SHARD
+
+    limiter.set_shards(client.list_shards(StreamName="s")["Shards"])
+    for key in (
+        "bybit-linear-btcusdt",
+        "binance-usdt_perpetual-btcusdt",
+        "bitflyer-fx-fx_btc_jpy",
+    ):
+        records = [{"Data": b"{}", "PartitionKey": key}]
+        (result,) = client.put_records(StreamName="s", Records=records)["Records"]
+        assert limiter.shard_for(key) == result["ShardId"]
+
+
+def test_throttling_lowers_only_the_throttled_shard():
+    clock = FakeClock()
+    limiter = ShardRateLimiter("s", records_per_second=100, clock=clock)
+    limiter.set_shards(
+        LocalKinesisClient(shards=2).list_shards(StreamName="s")["Shards"]
+    )
+    keys = ["a", "b", "c", "d"]
+    by_shard = {}
+    for key in keys:
+        by_shard.setdefault(limiter.shard_for(key), key)
+    (hot, hot_key), (cold, cold_key) = sorted(by_shard.items())
+    entries = [
+        {"Data": b"x", "PartitionKey": hot_key},
+        {"Data": b"x", "PartitionKey": cold_key},
+    ]
+
+    shard_ids = asyncio.run(limiter.acquire(entries))
+    assert shard_ids == [hot, cold]
+    assert limiter.record_results(shard_ids, [{"ErrorCode": THROTTLED}, {}]) == 1
+    assert limiter._buckets[hot].records.rate == 50
+    assert limiter._buckets[cold].records.rate == 100
+
+    limiter.record_results([hot], [{}])
+    assert limiter._buckets[hot].records.rate == 55
@@ -0,0 +1,106 @@
+import asyncio
+from json import loads
+
+import pytest
+
+from src.libs.aws import Kinesis, LocalKinesisClient, RecordCodec
+from src.libs.aws.record_codec import MAGIC, decode_record
+from src.libs.utils.candle import CandleRecord
+
+TAGS = {"exchange": "bybit", "contract": "linear", "symbol": "btcusdt"}
+
+
+def candle(**extra):
+    record = CandleRecord(
+        {
+            "timestamp": "2024-07-20T12:00:01+09:00",
+            "open": 66913.5,
+            "high": 66920.1,
+            "low": 66900.0,
+            "close": 66910.25,
+            "volume": 1.234,
+            "buy_volume": 0.734,
+            "sell_volume": 0.5,
+            "count": 12,
+            "buy_count": 7,
+            "sell_count": 5,
+            "value": 82571.123456789,
+            "buy_value": 49100.0,
+            "sell_value": 33471.123456789,
+            "revision": 0,
+            **extra,
+        }
+    )
+    record.closed_time = 1721444402.0
+    return record
+
+
+@pytest.mark.parametrize(
+    "record_format, compression",
+    [("json", "none"), ("json", "zlib"), ("struct", "none"), ("struct", "zlib")],
+)
+def test_round_trip_keeps_fields_and_adds_tags(record_format, compression):
+    encode = RecordCodec(record_format, compression).encoder(TAGS)
+    record = candle(t_event=1721444401234, spread=0.5)
+
+    data = encode(record)
+
+    assert decode_record(data) == {**record, **TAGS}
+    assert "symbol" not in record
+
+
+def test_json_without_compression_stays_plain_json():
+    data = RecordCodec().encoder(TAGS)(candle())
+    assert data[0] != MAGIC
+    assert loads(data) == {**candle(), **TAGS}
+    assert RecordCodec().encoder({})({}) == b"{}"
+
+
+def test_struct_is_smaller_and_keeps_empty_candles():
+    json_size = len(RecordCodec().encoder(TAGS)(candle()))
+    encode = RecordCodec("struct").encoder(TAGS)
+    assert len(encode(candle())) < json_size / 2
+
+    empty = candle(open=None, close=None, high=float("-inf"), low=float("inf"))
+    assert decode_record(encode(empty)) == {**empty, **TAGS}
+
+
+def test_struct_falls_back_to_json_for_other_records():
+    encode = RecordCodec("struct", "zlib").encoder(TAGS)
+    record = {"timestamp": "2024-07-20T12:00:01+09:00", "bid": 1.0}
+    assert decode_record(encode(record)) == {**record, **TAGS}
+
+
+def test_unknown_schema_version_is_rejected():
+    data = bytearray(RecordCodec("struct").encoder(TAGS)(candle()))
+    data[1] += 1
+    with pytest.raises(ValueError):
+        decode_record(bytes(data))
+
+
+def test_optional_codecs():
+    pytest.importorskip("msgpack")
+    pytest.importorskip("zstandard")
+    for record_format in ("msgpack", "struct"):
+        encode = RecordCodec(record_format, "zstd").encoder(TAGS)
+        assert decode_record(encode(candle())) == {**candle(), **TAGS}
+
+
+def test_subscribe_decodes_what_publish_wrote():
+    client = LocalKinesisClient()
+
+    async def run():
+        kinesis = Kinesis(
+            client=client,
+            stream_name="s",
+            linger=60,
+            codec=RecordCodec("struct", "zlib"),
+        )
+        await kinesis.write(candle(), dict(TAGS))
+        await kinesis.close()
+        return kinesis
+
+    kinesis = asyncio.run(run())
+    (record,) = kinesis.subscribe("s", "shardId-000000000000", "TRIM_HORIZON")
+    assert record["Data"] == {**candle(), **TAGS}
+    assert record["PartitionKey"] == "bybit-linear-btcusdt"
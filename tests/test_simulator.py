@@ -0,0 +1,76 @@
+import asyncio
+
+from pybotters import WebSocketQueue
+
+from src.libs.exchange import load_exchanges
+from src.libs.replay import FrameRecorder
+from src.libs.utils import Instrument
+from tests.simulator.server import (
+    CaptureSource,
+    FaultPlan,
+    SimulatorServer,
+    SyntheticSource,
+)
+
+INSTRUMENTS = [
+    Instrument("bybit", "linear", "BTCUSDT"),
+    Instrument("bybit", "linear", "ETHUSDT"),
+    Instrument("binance", "usdt_perpetual", "btcusdt"),
+    Instrument("bitflyer", "fx", "FX_BTC_JPY"),
+    Instrument("bitflyer", "spot", "BTC_JPY"),
+]
+
+
+async def collect(server: SimulatorServer, seconds: float) -> dict:
+    queues = {instrument.name: WebSocketQueue() for instrument in INSTRUMENTS}
+    exchanges = load_exchanges(INSTRUMENTS, queues)
+    await server.start()
+    tasks = []
+    for exchange in exchanges:
+        exchange.ws_base_url = server.url
+        tasks.append(asyncio.create_task(exchange.subscribe()))
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        for task in tasks:
+            task.cancel()
+        for exchange in exchanges:
+            await exchange._client.close()
+        await server.close()
+    trades = {}
+    for name, queue in queues.items():
+        trades[name] = 0
+        while not queue.empty():
+            trades[name] += len(queue.get_nowait())
+    return trades
+
+
+def test_exchanges_subscribe_and_reconnect_through_simulator():
+    server = SimulatorServer(
+        SyntheticSource(rate=200), FaultPlan(disconnect_after=0.5), port=0
+    )
+    trades = asyncio.run(collect(server, 1.5))
+
+    assert all(count > 0 for count in trades.values()), trades
+    # 3接続がそれぞれ少なくとも1回切断されて再接続する
+    assert server.disconnects >= 3
+    assert server.connections >= 6
+
+
+def test_captured_frames_are_served_to_matching_subscriptions(tmp_path):
+    recorder = FrameRecorder(str(tmp_path))
+    for i in range(5):
+        frame = (
+            '{"topic":"publicTrade.BTCUSDT","type":"snapshot","ts":1,'
+            f'"data":[{{"T":{i},"s":"BTCUSDT","S":"Buy","v":"1","p":"100","i":"x","BT":false}}]}}'
+        )
+        recorder.write(i * 0.01, "wss://stream.bybit.com/v5/public/linear", frame)
+        recorder.write(i * 0.01, "wss://stream.bybit.com/v5/public/spot", frame)
+    recorder.close()
+
+    server = SimulatorServer(CaptureSource([str(tmp_path)], speed=10), port=0)
+    trades = asyncio.run(collect(server, 0.5))
+
+    assert trades["bybit-linear-btcusdt"] == 5
+    assert trades["bybit-linear-ethusdt"] == 0
+    assert server.frames_sent == 5
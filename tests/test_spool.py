@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+from src.libs.utils.spool import HEADER, Spool
+
+SEGMENT_BYTES = 256
+
+
+def payloads(n, size=20):
+    return [f"{i:0{size}d}".encode() for i in range(n)]
+
+
+def test_records_are_read_in_order_across_segments(tmp_path):
+    spool = Spool(
+        str(tmp_path), segment_bytes=SEGMENT_BYTES, max_bytes=SEGMENT_BYTES * 16
+    )
+    records = payloads(30)
+    for record in records:
+        spool.append(record)
+    assert spool.records == 30
+    assert len(os.listdir(tmp_path)) > 2
+
+    read = []
+    while not spool.is_empty:
+        batch, position = spool.peek(7)
+        read.extend(batch)
+        spool.commit(position)
+    assert read == records
+    # 読み終えたセグメントは削除される
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".seg")]) == 1
+
+
+def test_cursor_and_records_survive_restart(tmp_path):
+    spool = Spool(
+        str(tmp_path), segment_bytes=SEGMENT_BYTES, max_bytes=SEGMENT_BYTES * 16
+    )
+    records = payloads(20)
+    for record in records:
+        spool.append(record)
+    spool.commit(spool.position_after(5))
+    spool.close()
+
+    reopened = Spool(
+        str(tmp_path), segment_bytes=SEGMENT_BYTES, max_bytes=SEGMENT_BYTES * 16
+    )
+    assert reopened.records == 15
+    batch, _ = reopened.peek(100)
+    assert batch == records[5:]
+
+    reopened.append(b"after restart")
+    assert reopened.peek(100)[0] == records[5:] + [b"after restart"]
+
+
+def test_torn_write_is_discarded_on_restart(tmp_path):
+    spool = Spool(
+        str(tmp_path), segment_bytes=SEGMENT_BYTES, max_bytes=SEGMENT_BYTES * 4
+    )
+    spool.append(b"complete")
+    segment, offset = spool._write
+    # ヘッダだけ書かれてペイロードが壊れた状態
+    spool._map(segment)[offset : offset + HEADER.size] = HEADER.pack(5, 12345)
+    spool.close()
+
+    reopened = Spool(
+        str(tmp_path), segment_bytes=SEGMENT_BYTES, max_bytes=SEGMENT_BYTES * 4
+    )
+    assert reopened.records == 1
+    reopened.append(b"next")
+    assert reopened.peek(10)[0] == [b"complete", b"next"]
+
+
+def test_oldest_segments_are_evicted_at_capacity(tmp_path):
+    spool = Spool(
+        str(tmp_path), segment_bytes=SEGMENT_BYTES, max_bytes=SEGMENT_BYTES * 3
+    )
+    records = payloads(60)
+    for record in records:
+        spool.append(record)
+
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".seg")]) == 3
+    assert spool.evicted > 0
+    assert spool.records + spool.evicted == 60
+    batch, _ = spool.peek(100)
+    assert batch == records[spool.evicted :]
+
+
+def test_commit_after_eviction_does_not_double_count(tmp_path):
+    spool = Spool(
+        str(tmp_path), segment_bytes=SEGMENT_BYTES, max_bytes=SEGMENT_BYTES * 2
+    )
+    for record in payloads(5):
+        spool.append(record)
+    _, position = spool.peek(5)
+    for record in payloads(20):
+        spool.append(record)
+
+    records = spool.records
+    spool.commit(position)
+    assert spool.records == records
+    assert len(spool.peek(100)[0]) == records
+
+
+def test_rejects_records_larger_than_a_segment(tmp_path):
+    spool = Spool(
+        str(tmp_path), segment_bytes=SEGMENT_BYTES, max_bytes=SEGMENT_BYTES * 2
+    )
+    with pytest.raises(ValueError):
+        spool.append(b"x" * SEGMENT_BYTES)
@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from src.libs.utils.timestamp import TimestampParser, iso8601_to_ms
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2024-07-19T13:42:21.8333232Z", datetime(2024, 7, 19, 13, 42, 21, 833000)),
+        ("2024-07-19T13:42:21.8Z", datetime(2024, 7, 19, 13, 42, 21, 800000)),
+        ("2024-07-19T13:42:21Z", datetime(2024, 7, 19, 13, 42, 21)),
+        ("2024-02-29T23:59:59.999Z", datetime(2024, 2, 29, 23, 59, 59, 999000)),
+        ("1970-01-01T00:00:00Z", datetime(1970, 1, 1)),
+        ("2000-01-01T09:00:00.123+09:00", datetime(2000, 1, 1, 0, 0, 0, 123000)),
+    ],
+)
+def test_iso8601_to_ms(value, expected):
+    expected_ms = int(expected.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    assert iso8601_to_ms(value) == expected_ms
+
+
+def test_iso8601_to_ms_rejects_garbage():
+    with pytest.raises(ValueError):
+        iso8601_to_ms("not a timestamp")
+
+
+def test_parser_is_independent_of_local_timezone(monkeypatch):
+    import time
+
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    time.tzset()
+    try:
+        parser = TimestampParser()
+        assert parser("2024-07-19T13:42:21.8333232Z") == 1721396541833
+        assert parser("2024-07-19T13:42:21.8333232Z") == 1721396541833
+        assert parser("2024-07-19T13:42:22Z") == 1721396542000
+    finally:
+        monkeypatch.delenv("TZ")
+        time.tzset()